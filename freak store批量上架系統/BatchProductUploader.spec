@@ -5,8 +5,8 @@ a = Analysis(
     ['batch_run_gui_improved.py'],
     pathex=[],
     binaries=[],
-    datas=[('api_direct_processor.py', '.'), ('html_parser.py', '.'), ('selenium_fetcher.py', '.'), ('config.py', '.')],
-    hiddenimports=['requests', 'selenium', 'pandas', 'openpyxl', 'tkinter', 'concurrent.futures'],
+    datas=[('api_direct_processor.py', '.'), ('html_parser.py', '.'), ('selenium_fetcher.py', '.'), ('browser_pool.py', '.'), ('page_readiness.py', '.'), ('page_fetcher.py', '.'), ('batch_pipeline.py', '.'), ('http_pool.py', '.'), ('image_downloader.py', '.'), ('image_cache.py', '.'), ('retry_policy.py', '.'), ('easystore_client.py', '.'), ('product_page.py', '.'), ('page_cache.py', '.'), ('job_journal.py', '.'), ('config.py', '.')],
+    hiddenimports=['requests', 'selenium', 'pandas', 'openpyxl', 'tkinter', 'concurrent.futures', 'lxml.etree', 'lxml.html'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,37 +1,51 @@
 import os
 import re
 import time
-import requests
-import httpx
 import pandas as pd
 from datetime import datetime
 import hashlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 
-# 匯入現有模組
-try:
-    from config import BASE_API, API_HEADERS
-except ImportError as e:
-    print(f"⚠️ 模組匯入警告: {e}")
+from http_pool import get_shared_pool
+from retry_policy import RetryPolicy
+from easystore_client import get_easystore_client
+from image_downloader import stream_download, DownloadRejected, build_image_headers, get_image_downloader
 
 class APIDirectProcessor:
     def __init__(self):
         self.processed_count = 0
         self.failed_count = 0
         self.created_products = []  # 儲存成功創建的商品
-        # 創建共享的 httpx client（支援 HTTP/2）
-        self.http_client = None
-        
-    def get_http_client(self):
-        """獲取或創建 HTTP/2 client"""
-        if self.http_client is None:
-            self.http_client = httpx.Client(
-                http2=True,
-                timeout=60.0,
-                follow_redirects=True
-            )
-        return self.http_client
+        # 依主機共用的 httpx 連線池（支援 HTTP/2）
+        self.http_pool = get_shared_pool()
+        # 全域共用的 asyncio 圖片下載引擎
+        self.image_downloader = get_image_downloader()
+        # 全域共用的 EasyStore API 客戶端
+        self.easystore = get_easystore_client()
+        
+    def get_http_client(self, url="https://www.daytona-park.com/"):
+        """獲取該主機共用的 HTTP/2 client"""
+        return self.http_pool.get_client(url)
+    
+    def get_pool_stats(self):
+        """獲取連線池統計（各主機請求數、回應狀態、目前連線數）"""
+        stats = self.http_pool.get_stats()
+        for host, image_stats in self.image_downloader.get_stats().items():
+            entry = stats.setdefault(host, {'requests': 0, 'responses': {}, 'errors': 0, 'connections': None})
+            entry['requests'] += image_stats['requests']
+            entry['errors'] += image_stats['errors']
+            for bucket, count in image_stats['responses'].items():
+                entry['responses'][bucket] = entry['responses'].get(bucket, 0) + count
+        return stats
+        
+    def get_api_stats(self):
+        """獲取 EasyStore API 統計（請求數、429 次數、限流等待秒數）"""
+        return self.easystore.get_stats()
+        
+    def get_image_cache_stats(self):
+        """獲取圖片快取統計，未啟用快取時回傳 None"""
+        cache = self.image_downloader.cache
+        return cache.get_stats() if cache else None
         
     def sanitize_filename(self, name):
         """清理檔案名稱"""
@@ -55,41 +69,40 @@ class APIDirectProcessor:
         
         return html_template.format(size_table=size_table)
         
-    def download_image_fast(self, url, save_path, referer="https://www.daytona-park.com/", retries=3, timeout=60):
+    def download_image_fast(self, url, save_path, referer="https://www.daytona-park.com/", retries=None, timeout=60):
         """使用 httpx HTTP/2 快速下載單張圖片"""
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "image/jpeg,image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5",
-            "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Referer": referer,
-            "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"macOS"',
-            "sec-fetch-dest": "image",
-            "sec-fetch-mode": "no-cors",
-            "sec-fetch-site": "same-site",
-        }
+        headers = build_image_headers(referer)
         
-        for attempt in range(retries):
+        # 共用同一主機的連線，不再每次嘗試都新建 client
+        client = self.get_http_client(url)
+        policy = RetryPolicy(attempts=retries)
+        
+        for attempt in range(policy.attempts):
+            retry_after = None
             try:
-                # 使用 httpx with HTTP/2
-                with httpx.Client(http2=True, timeout=timeout, follow_redirects=True) as client:
-                    response = client.get(url, headers=headers)
-                    if response.status_code == 200 and len(response.content) > 1000:
-                        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                        with open(save_path, "wb") as f:
-                            f.write(response.content)
-                        return True
-                    else:
-                        print(f"   ⚠️ 第 {attempt+1} 次嘗試: HTTP {response.status_code}, 大小 {len(response.content)}")
+                # 串流寫入暫存檔，完成後才改名，超過大小上限會提早中止
+                success, status_code, retry_after = stream_download(client, url, save_path, headers=headers, timeout=timeout,
+                                                                    cache=self.image_downloader.cache)
+                if success:
+                    return True
+                print(f"   ⚠️ 第 {attempt+1} 次嘗試: HTTP {status_code}")
+                retryable = policy.should_retry_status(status_code)
+            except DownloadRejected as e:
+                # 格式或大小不符，重試也不會改變結果
+                print(f"   ⚠️ 略過圖片: {url[:50]}... - {e}")
+                return False
             except Exception as e:
-                if attempt == retries - 1:
-                    print(f"❌ 圖片下載失敗: {url[:50]}... - {e}")
+                self.http_pool.record_error(url)
+                print(f"   ⚠️ 第 {attempt+1} 次嘗試失敗: {url[:50]}... - {e}")
+                retryable = policy.should_retry_exception(e)
+            if not retryable or attempt == policy.attempts - 1:
+                break
+            policy.sleep(attempt, retry_after)
+        print(f"❌ 圖片下載失敗: {url[:50]}...")
         return False
     
     def download_images_to_custom_folder(self, images, custom_name, referer="https://www.daytona-park.com/"):
-        """下載圖片到自定義名稱的資料夾（使用 httpx HTTP/2）"""
+        """下載圖片到自定義名稱的資料夾（使用共用的 asyncio HTTP/2 下載引擎）"""
         result = {
             'downloaded_count': 0,
             'failed_count': 0,
@@ -112,29 +125,26 @@ class APIDirectProcessor:
         print(f"📁 創建圖片資料夾: {image_folder}")
         print(f"📸 開始下載 {len(images)} 張圖片（使用 HTTP/2）...")
         
-        # 使用多線程快速下載
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            futures = {}
-            for i, img_url in enumerate(images):
-                ext = os.path.splitext(img_url)[1].split("?")[0] or '.jpg'
-                filename = os.path.join(image_folder, f"{custom_name}_{i+1}{ext}")
-                future = executor.submit(self.download_image_fast, img_url, filename, referer)
-                futures[future] = (i+1, img_url, filename)
-            
-            for future in as_completed(futures):
-                i, img_url, filename = futures[future]
-                try:
-                    success = future.result()
-                    if success:
-                        result['downloaded_count'] += 1
-                        print(f"✅ 第 {i} 張圖片下載成功: {filename}")
-                    else:
-                        result['failed_count'] += 1
-                        result['errors'].append(f"第{i}張圖片下載失敗")
-                except Exception as e:
-                    result['failed_count'] += 1
-                    result['errors'].append(f"第{i}張圖片下載異常: {str(e)}")
-                    print(f"❌ 圖片下載錯誤: {e}")
+        # 交給全域 asyncio 下載引擎，並發數由整個程式共用的上限控制
+        items = []
+        for i, img_url in enumerate(images):
+            ext = os.path.splitext(img_url)[1].split("?")[0] or '.jpg'
+            filename = os.path.join(image_folder, f"{custom_name}_{i+1}{ext}")
+            items.append((img_url, filename))
+        
+        try:
+            downloads = self.image_downloader.download_many(items, headers=build_image_headers(referer))
+        except Exception as e:
+            downloads = [{'url': url, 'path': path, 'success': False, 'error': str(e)} for url, path in items]
+            print(f"❌ 圖片下載錯誤: {e}")
+        
+        for i, download in enumerate(downloads, 1):
+            if download['success']:
+                result['downloaded_count'] += 1
+                print(f"✅ 第 {i} 張圖片下載成功: {download['path']}")
+            else:
+                result['failed_count'] += 1
+                result['errors'].append(f"第{i}張圖片下載失敗: {download['error']}")
                     
         print(f"📊 圖片下載完成: 成功 {result['downloaded_count']}, 失敗 {result['failed_count']}")
         return result
@@ -305,7 +315,7 @@ class APIDirectProcessor:
 
     def _send_api_request(self, api_payload):
         """發送API請求並處理回應"""
-        endpoint = f"{BASE_API}/products.json"
+        endpoint = self.easystore.url("products.json")
         print(f"📤 發送API請求到: {endpoint}")
         
         # 顯示關鍵部分的 payload
@@ -316,12 +326,8 @@ class APIDirectProcessor:
             print(f"   options: {api_payload['product']['options']}")
 
         try:
-            response = requests.post(
-                endpoint,
-                headers=API_HEADERS,
-                json=api_payload,
-                timeout=30
-            )
+            # 共用連線與限流；建立商品只在 429 或連線根本沒建立時重試，避免重複建立
+            response = self.easystore.create_product(api_payload)
             
             return {
                 'success': response.status_code in [200, 201],
@@ -0,0 +1,113 @@
+# batch_pipeline.py - 多商品分段並行處理管線（抓取 → 解析 → 圖片 → API）
+
+import queue
+import threading
+
+try:
+    from config import PIPELINE_SETTINGS
+except ImportError:
+    PIPELINE_SETTINGS = {}
+
+_STOP = object()  # 通知工作執行緒結束的標記
+
+
+class PipelineStage:
+    """管線中的一段：名稱、處理函式與工作執行緒數量
+
+    handler(job) 直接修改 job（dict），拋出例外代表該商品失敗、略過後續階段
+    """
+
+    def __init__(self, name, handler, workers=1):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+
+
+class BatchPipeline:
+    """分段管線：每段有自己的工作執行緒與有上限的佇列
+
+    商品 N+1 在抓取時，商品 N 可以同時下載圖片、商品 N-1 同時在上架。
+    佇列有上限，前段太快時會自動等待，不會一次把所有頁面抓進記憶體。
+    """
+
+    def __init__(self, stages, queue_size=None, on_stage=None, on_complete=None):
+        self.stages = stages
+        self.queue_size = queue_size or PIPELINE_SETTINGS.get("queue_size", 2)
+        self.on_stage = on_stage          # on_stage(job, stage_name)：商品進入某階段
+        self.on_complete = on_complete    # on_complete(job)：商品完成（成功或失敗）
+
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        self._remaining_workers = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+
+    def _finish(self, job):
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                print(f"⚠️ 完成回調錯誤: {e}")
+
+    def _notify_stage(self, job, stage_name):
+        # 回調出錯不能讓工作執行緒結束，否則 run() 會一直等不到這個商品
+        if self.on_stage:
+            try:
+                self.on_stage(job, stage_name)
+            except Exception as e:
+                print(f"⚠️ 階段回調錯誤: {e}")
+
+    def _worker(self, stage_index):
+        stage = self.stages[stage_index]
+        in_queue = self._queues[stage_index]
+        is_last = stage_index == len(self.stages) - 1
+
+        while True:
+            job = in_queue.get()
+            if job is _STOP:
+                break
+
+            self._notify_stage(job, stage.name)
+
+            try:
+                stage.handler(job)
+            except Exception as e:
+                job['error'] = str(e)
+                job['failed_stage'] = stage.name
+                self._finish(job)
+                continue
+
+            if is_last:
+                self._finish(job)
+            else:
+                self._queues[stage_index + 1].put(job)
+
+        # 本段最後一個結束的執行緒，負責通知下一段結束
+        with self._lock:
+            self._remaining_workers[stage_index] -= 1
+            last_worker = self._remaining_workers[stage_index] == 0
+        if last_worker and not is_last:
+            for _ in range(self.stages[stage_index + 1].workers):
+                self._queues[stage_index + 1].put(_STOP)
+
+    def run(self, jobs):
+        """處理所有商品，全部完成後才返回"""
+        threads = []
+        for stage_index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage_index,),
+                    name=f"pipeline-{stage.name}-{n + 1}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        for job in jobs:
+            job.setdefault('error', None)
+            job.setdefault('failed_stage', None)
+            self._queues[0].put(job)
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_STOP)
+
+        for thread in threads:
+            thread.join()
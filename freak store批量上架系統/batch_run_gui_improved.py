@@ -13,8 +13,15 @@ if hasattr(sys, '_MEIPASS'):
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # 匯入現有模組
-from html_parser import parse_html_to_data
-from selenium_fetcher import fetch_html_from_url
+from html_parser import page_to_data
+from page_fetcher import fetch_product_page, parse_fetched_page, shutdown_fetchers
+from batch_pipeline import BatchPipeline, PipelineStage
+from job_journal import get_job_journal, job_key
+
+try:
+    from config import PIPELINE_SETTINGS
+except ImportError:
+    PIPELINE_SETTINGS = {}
 from api_direct_processor import APIDirectProcessor
 
 class ImprovedBatchProductGUI:
@@ -30,6 +37,9 @@ class ImprovedBatchProductGUI:
         # 商品數據儲存
         self.products_data = []
         
+        # 批次進度日誌（程式中斷後可續傳）
+        self.journal = get_job_journal()
+        
         # 建立介面
         self.create_widgets()
         
@@ -312,6 +322,11 @@ class ImprovedBatchProductGUI:
         if not products_to_process:
             messagebox.showerror("錯誤", "請至少填入一個完整的商品資訊（名稱、網址、價格）")
             return
+        
+        # 上次中斷的進度
+        resume_states = self.ask_resume(products_to_process)
+        if resume_states is None:
+            return
             
         # 確認開始處理
         confirm = messagebox.askyesno(
@@ -337,73 +352,202 @@ class ImprovedBatchProductGUI:
         # 在新線程中開始處理
         threading.Thread(
             target=self.process_api_upload_thread,
-            args=(products_to_process,),
+            args=(products_to_process, resume_states),
             daemon=True
         ).start()
-        
-    def process_api_upload_thread(self, products_to_process):
-        """在後台線程中處理API上架"""
+    
+    def ask_resume(self, products_to_process):
+        """檢查進度日誌中是否有這些商品上次未完成的進度
+        
+        Returns:
+            續傳用的 {key: state}；沒有進度時為 {}，取消時為 None
+            選擇重新處理時只重置未上架的商品，已上架的商品仍會略過
+        """
+        if self.journal is None:
+            return {}
+        try:
+            self.journal.compact()
+            states = self.journal.load_states([job_key(p) for p in products_to_process])
+        except Exception as e:
+            self.log_message(f"⚠️ 無法讀取進度日誌: {e}")
+            return {}
+        if not states:
+            return {}
+        
+        created = sum(1 for state in states.values() if state['stage'] == 'created')
+        uncertain = sum(1 for state in states.values() if state['stage'] == 'api_started')
+        in_progress = len(states) - created - uncertain
+        answer = messagebox.askyesnocancel(
+            "發現未完成的批次",
+            f"上次處理這些商品時中斷：\n"
+            f"   已上架：{created} 個（將略過）\n"
+            f"   處理到一半：{in_progress} 個（從完成的階段繼續）\n"
+            f"   上架結果不明：{uncertain} 個（不會自動重送，請到 EasyStore 後台確認）\n\n"
+            f"是：從中斷處繼續\n"
+            f"否：未上架的商品全部重新處理（結果不明的商品會重新送出，請先確認後台沒有建立；已上架的商品仍會略過）\n"
+            f"取消：不開始"
+        )
+        if answer is None:
+            return None
+        if answer:
+            return states
+        unfinished = [key for key, state in states.items() if state['stage'] != 'created']
+        self.journal.reset(unfinished)
+        return {key: state for key, state in states.items() if state['stage'] == 'created'}
+        
+    def process_api_upload_thread(self, products_to_process, resume_states=None):
+        """在後台線程中以分段管線處理API上架（抓取 → 解析 → 圖片 → API）"""
         try:
             self.products_data = []
             failed_products = []
+            total = len(products_to_process)
+            completed = [0]
+            counter_lock = threading.Lock()
             
-            for i, product in enumerate(products_to_process):
-                # 更新進度
-                self.root.after(0, self.update_progress, i+1, len(products_to_process), f"處理商品 {i+1}: {product['name']}")
-                
-                # 更新狀態
-                self.root.after(0, self.update_product_status, product['entry_ref'], "處理中...", "blue")
+            stage_labels = {
+                'fetch': ("抓取中...", "🔄 開始爬取商品"),
+                'parse': ("解析中...", "🧩 解析商品數據"),
+                'images': ("下載圖片...", "📁 下載圖片到資料夾"),
+                'api': ("上架中...", "🚀 透過API創建商品")
+            }
+            
+            def on_stage(job, stage_name):
+                product = job['product']
+                status, message = stage_labels[stage_name]
+                self.root.after(0, self.update_product_status, product['entry_ref'], status, "blue")
+                self.root.after(0, self.log_message, f"{message} {job['number']}: {product['name']}")
+            
+            def on_complete(job):
+                product = job['product']
+                with counter_lock:
+                    completed[0] += 1
+                    done = completed[0]
+                self.root.after(0, self.update_progress, done, total, f"完成商品 {job['number']}: {product['name']}")
                 
-                try:
-                    # 爬取商品數據
-                    self.root.after(0, self.log_message, f"🔄 開始爬取商品 {i+1}: {product['name']}")
-                    
-                    html = fetch_html_from_url(product['url'])
-                    if not html:
-                        raise Exception("無法獲取網頁內容")
-                        
-                    parsed_data = parse_html_to_data(html)
-                    if not parsed_data:
-                        raise Exception("無法解析商品數據")
-                    
-                    # 下載圖片到自定義名稱的資料夾
-                    self.root.after(0, self.log_message, f"📁 下載圖片到資料夾: {product['name']}")
-                    images = parsed_data.get("images", [])
-                    if images:
-                        image_result = self.api_processor.download_images_to_custom_folder(images, product['name'])
-                        self.root.after(0, self.log_message, f"📸 圖片下載完成: {image_result['downloaded_count']} 張成功")
-                    
-                    # 透過API創建商品
-                    self.root.after(0, self.log_message, f"🚀 透過API創建商品...")
-                    
-                    product_data = {
-                        'custom_name': product['name'],
-                        'price': product['price'],
-                        'parsed_data': parsed_data
-                    }
-                    
-                    api_result = self.api_processor.create_product_via_api(product_data)
-                    
-                    if api_result['success']:
-                        # 更新成功狀態
-                        self.root.after(0, self.update_product_status, product['entry_ref'], "✅ 已上架", "green")
-                        self.root.after(0, self.log_message, f"✅ 商品 {i+1} 上架成功: {api_result['message']}")
-                    else:
-                        raise Exception(api_result['error'])
-                    
-                except Exception as e:
-                    # 處理失敗
-                    error_msg = str(e)
-                    failed_products.append(f"商品 {i+1} ({product['name']}): {error_msg}")
-                    
+                if job['error'] is None:
+                    self.root.after(0, self.update_product_status, product['entry_ref'], "✅ 已上架", "green")
+                    self.root.after(0, self.log_message, f"✅ 商品 {job['number']} 上架成功: {job['api_result']['message']}")
+                else:
+                    failed_products.append((job['number'], f"商品 {job['number']} ({product['name']}): {job['error']}"))
                     self.root.after(0, self.update_product_status, product['entry_ref'], "❌ 失敗", "red")
-                    self.root.after(0, self.log_message, f"❌ 商品 {i+1} 處理失敗: {error_msg}")
-                    
-            # 處理完成
-            self.root.after(0, self.api_upload_completed, len(products_to_process), len(failed_products), failed_products)
+                    self.root.after(0, self.log_message, f"❌ 商品 {job['number']} 處理失敗: {job['error']}")
+            
+            pipeline = BatchPipeline(
+                [
+                    PipelineStage('fetch', self.pipeline_fetch, PIPELINE_SETTINGS.get("fetch_workers", 2)),
+                    PipelineStage('parse', self.pipeline_parse, PIPELINE_SETTINGS.get("parse_workers", 1)),
+                    PipelineStage('images', self.pipeline_download_images, PIPELINE_SETTINGS.get("image_workers", 2)),
+                    PipelineStage('api', self.pipeline_create_product, PIPELINE_SETTINGS.get("api_workers", 1)),
+                ],
+                on_stage=on_stage,
+                on_complete=on_complete
+            )
+            
+            jobs = []
+            for i, product in enumerate(products_to_process):
+                job = {'number': i + 1, 'product': product, 'key': job_key(product)}
+                state = (resume_states or {}).get(job['key'])
+                if state is None:
+                    jobs.append(job)
+                elif state['stage'] == 'created':
+                    # 上次已上架：還原結果供匯出使用，不再送出
+                    created = state['created']
+                    if created.get('created_product'):
+                        self.api_processor.created_products.append(created['created_product'])
+                    completed[0] += 1
+                    self.root.after(0, self.update_product_status, product['entry_ref'], "✅ 已上架", "green")
+                    self.root.after(0, self.log_message, f"⏭️ 商品 {job['number']} 上次已上架 (ID: {created.get('product_id')})，略過")
+                elif state['stage'] == 'api_started':
+                    completed[0] += 1
+                    failed_products.append((job['number'], f"商品 {job['number']} ({product['name']}): 上次上架中斷，請到 EasyStore 後台確認是否已建立"))
+                    self.root.after(0, self.update_product_status, product['entry_ref'], "⚠️ 需確認", "orange")
+                    self.root.after(0, self.log_message, f"⚠️ 商品 {job['number']} 上次送出上架請求後中斷，結果不明，請手動確認")
+                else:
+                    job['resume_stage'] = state['stage']
+                    if 'parsed_data' in state:
+                        job['parsed_data'] = state['parsed_data']
+                    self.root.after(0, self.log_message, f"↩️ 商品 {job['number']} 從上次的進度繼續（{state['stage']}）")
+                    jobs.append(job)
+            
+            self.root.after(0, self.update_progress, completed[0], total, "開始分段處理")
+            pipeline.run(jobs)
+            
+            # 處理完成（失敗清單依商品順序排列）
+            failed_list = [message for _, message in sorted(failed_products)]
+            self.root.after(0, self.api_upload_completed, total, len(failed_list), failed_list)
             
         except Exception as e:
             self.root.after(0, self.processing_error, str(e))
+        finally:
+            # 批次結束後關閉瀏覽器池中的瀏覽器
+            shutdown_fetchers()
+    
+    def record_stage(self, job, stage, **data):
+        """寫入進度日誌（日誌寫入失敗不影響上架）"""
+        if self.journal is None:
+            return
+        try:
+            self.journal.record(job['key'], stage, **data)
+        except Exception as e:
+            self.root.after(0, self.log_message, f"⚠️ 進度日誌寫入失敗: {e}")
+    
+    def pipeline_fetch(self, job):
+        """管線：爬取商品頁"""
+        if 'parsed_data' in job:
+            return  # 續傳：上次已解析
+        product = job['product']
+        os.makedirs("page_sources", exist_ok=True)
+        save_path = os.path.join("page_sources", f"page_source_{product['index']:02d}.html")
+        fetched = fetch_product_page(product['url'], save_path=save_path)
+        if not fetched:
+            raise Exception("無法獲取網頁內容")
+        job['fetched'] = fetched
+        self.record_stage(job, 'fetched')
+    
+    def pipeline_parse(self, job):
+        """管線：解析商品數據（瀏覽器端已擷取或內容未變時只需轉換格式）"""
+        if 'parsed_data' in job:
+            return  # 續傳：上次已解析
+        parsed_data = page_to_data(parse_fetched_page(job['product']['url'], job.pop('fetched')))
+        if not parsed_data:
+            raise Exception("無法解析商品數據")
+        job['parsed_data'] = parsed_data
+        self.record_stage(job, 'parsed', parsed_data=parsed_data)
+    
+    def pipeline_download_images(self, job):
+        """管線：下載圖片到自定義名稱的資料夾"""
+        if job.get('resume_stage') == 'images_done':
+            return  # 續傳：上次已下載
+        images = job['parsed_data'].get("images", [])
+        if images:
+            image_result = self.api_processor.download_images_to_custom_folder(images, job['product']['name'])
+            self.root.after(0, self.log_message, f"📸 商品 {job['number']} 圖片下載完成: {image_result['downloaded_count']} 張成功")
+        self.record_stage(job, 'images_done')
+    
+    def pipeline_create_product(self, job):
+        """管線：透過API創建商品"""
+        product = job['product']
+        product_data = {
+            'custom_name': product['name'],
+            'price': product['price'],
+            'parsed_data': job['parsed_data']
+        }
+        # 先記錄已送出：若在回應前中斷，續傳時不會自動重送造成重複商品
+        self.record_stage(job, 'api_started')
+        api_result = self.api_processor.create_product_via_api(product_data)
+        if not api_result['success']:
+            # 只有 4xx 代表請求被拒絕、商品沒有建立，可以重試；
+            # 5xx 與逾時等沒有回應的錯誤，EasyStore 可能已建立商品，維持 api_started 待確認
+            status_code = (api_result.get('error_details') or {}).get('status_code')
+            if status_code and 400 <= status_code < 500:
+                self.record_stage(job, 'api_failed', error=api_result['error'])
+            raise Exception(api_result['error'])
+        job['api_result'] = api_result
+        created_product = next(
+            (p for p in self.api_processor.created_products if p['product_id'] == api_result['product_id']), None
+        )
+        self.record_stage(job, 'created', product_id=api_result['product_id'], title=api_result['title'],
+                          created_product=created_product)
             
     def api_upload_completed(self, total_count, failed_count, failed_list):
         """API上架完成回調"""
@@ -424,6 +568,17 @@ class ImprovedBatchProductGUI:
         self.log_message(f"   ✅ 成功上架: {stats['processed_count']} 個商品")
         self.log_message(f"   ❌ 失敗: {stats['failed_count']} 個商品")
         
+        # 連線池統計
+        for host, pool_stats in self.api_processor.get_pool_stats().items():
+            self.log_message(f"   🌐 {host}: {pool_stats['requests']} 次請求，回應 {pool_stats['responses']}，錯誤 {pool_stats['errors']}")
+        api_stats = self.api_processor.get_api_stats()
+        self.log_message(f"   🛒 EasyStore API: {api_stats['requests']} 次請求，429 {api_stats['throttled']} 次，"
+                         f"限流等待 {api_stats['waited_seconds']} 秒")
+        cache_stats = self.api_processor.get_image_cache_stats()
+        if cache_stats:
+            self.log_message(f"   🗃️ 圖片快取: 命中 {cache_stats['hits']} 張，新下載 {cache_stats['misses']} 張，"
+                             f"共 {cache_stats['files']} 個檔案 ({cache_stats['size_bytes'] / 1024 / 1024:.1f} MB)")
+        
         if stats['created_products']:
             self.log_message(f"\n🔗 成功創建的商品：")
             for product in stats['created_products']:
@@ -0,0 +1,253 @@
+# browser_pool.py - 可重複使用的 Firefox WebDriver 池
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from contextlib import contextmanager
+import threading
+import time
+
+try:
+    from config import BROWSER_POOL_SETTINGS
+except ImportError:
+    BROWSER_POOL_SETTINGS = {}
+
+WARMUP_URL = "https://www.daytona-park.com/"
+
+# Cookie 同意按鈕（暖機時點一次即可，之後同一個 session 不會再出現）
+COOKIE_SELECTORS = [
+    "#consentButton",
+    ".consent-button",
+    "[data-consent]",
+    "button[class*='consent']",
+    "button[class*='cookie']",
+    "button[class*='agree']"
+]
+
+
+def build_firefox_options():
+    """建立與原本 selenium_fetcher 相同的 Firefox 選項"""
+    options = Options()
+    #options.add_argument("--headless")  # 如果需要看到瀏覽器，註釋這行
+
+    # 反反爬蟲設定
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--window-size=1920,1080")
+
+    # 模擬真實瀏覽器
+    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+    # 禁用一些可能干擾的功能
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-plugins")
+    options.add_argument("--disable-images")  # 加快載入速度
+
+    # 設定偏好
+    options.set_preference("dom.webdriver.enabled", False)
+    options.set_preference("useAutomationExtension", False)
+    options.set_preference("javascript.enabled", True)
+    return options
+
+
+def accept_cookie_consent(driver, timeout=3):
+    """點擊 Cookie 同意按鈕，找不到就略過"""
+    try:
+        consent_button = WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, ", ".join(COOKIE_SELECTORS)))
+        )
+        driver.execute_script("arguments[0].click();", consent_button)
+        print("✅ Cookie按鈕點擊成功")
+        return True
+    except Exception:
+        print("🍪 未找到Cookie按鈕，繼續...")
+        return False
+
+
+class WebDriverPool:
+    """有上限的 WebDriver 池
+
+    - 最多同時存在 pool_size 個瀏覽器，用完歸還後給下一個商品使用
+    - 新建的瀏覽器會先暖機（載入首頁、點擊 Cookie 同意）
+    - 借出前做健康檢查，壞掉的瀏覽器直接丟棄重建
+    - 每個瀏覽器處理 max_pages 頁後自動回收，避免記憶體累積
+    """
+
+    def __init__(self, pool_size=None, max_pages=None, acquire_timeout=None, page_load_timeout=None):
+        self.pool_size = pool_size or BROWSER_POOL_SETTINGS.get("pool_size", 2)
+        self.max_pages = max_pages or BROWSER_POOL_SETTINGS.get("max_pages_per_driver", 20)
+        self.acquire_timeout = acquire_timeout or BROWSER_POOL_SETTINGS.get("acquire_timeout", 120)
+        self.page_load_timeout = page_load_timeout or BROWSER_POOL_SETTINGS.get("page_load_timeout", 45)
+
+        self._idle = []           # 閒置中的瀏覽器
+        self._page_counts = {}    # id(driver) -> 已處理頁數
+        self._total = 0           # 目前存在（含借出）的瀏覽器數量
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.created_count = 0
+        self.recycled_count = 0
+
+    def _create_driver(self):
+        """啟動並暖機一個新的瀏覽器"""
+        print("🔧 初始化 Firefox WebDriver（瀏覽器池）...")
+        driver = webdriver.Firefox(options=build_firefox_options())
+        try:
+            # 隱藏webdriver特徵
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            driver.set_page_load_timeout(self.page_load_timeout)
+            # 不使用隱式等待，改由 page_readiness 以條件等待各區塊
+            driver.implicitly_wait(0)
+
+            print(f"🔥 暖機瀏覽器: {WARMUP_URL}")
+            driver.get(WARMUP_URL)
+            accept_cookie_consent(driver)
+        except Exception as e:
+            # 暖機失敗不影響使用，頁面抓取時還會再處理
+            print(f"⚠️ 瀏覽器暖機失敗: {e}")
+
+        self.created_count += 1
+        return driver
+
+    def _is_healthy(self, driver):
+        """確認瀏覽器還活著"""
+        try:
+            driver.execute_script("return 1;")
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        self._page_counts.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        """借出一個可用的瀏覽器（必要時新建）"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("瀏覽器池已關閉")
+
+                driver = None
+                create_new = False
+                while driver is None and not create_new:
+                    if self._idle:
+                        driver = self._idle.pop()
+                    elif self._total < self.pool_size:
+                        self._total += 1
+                        create_new = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"等待可用瀏覽器超時（{timeout} 秒）")
+                        self._cond.wait(remaining)
+                        if self._closed:
+                            raise RuntimeError("瀏覽器池已關閉")
+
+            if create_new:
+                try:
+                    driver = self._create_driver()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                self._page_counts[id(driver)] = 0
+                return driver
+
+            # 健康檢查在鎖外做，避免卡住其他執行緒
+            if self._is_healthy(driver):
+                return driver
+
+            print("♻️ 偵測到失效的瀏覽器，丟棄並重建")
+            self._quit(driver)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+
+    def release(self, driver, discard=False):
+        """歸還瀏覽器；出錯或超過頁數上限時直接關閉"""
+        count = self._page_counts.get(id(driver), 0) + 1
+        self._page_counts[id(driver)] = count
+
+        if discard or count >= self.max_pages or self._closed:
+            if not discard and count >= self.max_pages:
+                print(f"♻️ 瀏覽器已處理 {count} 頁，回收重建")
+                self.recycled_count += 1
+            self._quit(driver)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """with pool.session() as driver: ... 的便利寫法"""
+        driver = self.acquire(timeout)
+        discard = False
+        try:
+            yield driver
+        except Exception:
+            # 發生錯誤的瀏覽器狀態不明，直接丟棄
+            discard = True
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def close_all(self):
+        """關閉所有閒置中的瀏覽器，借出中的會在歸還時關閉"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for driver in idle:
+            self._quit(driver)
+        if idle:
+            print(f"🛑 已關閉瀏覽器池中的 {len(idle)} 個瀏覽器")
+
+    def get_stats(self):
+        """取得瀏覽器池統計"""
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'alive': self._total,
+                'idle': len(self._idle),
+                'created': self.created_count,
+                'recycled': self.recycled_count
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """取得全域共用的瀏覽器池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = WebDriverPool()
+        return _pool
+
+
+def shutdown_browser_pool():
+    """批次結束時關閉全域瀏覽器池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
@@ -29,6 +29,56 @@ BATCH_SETTINGS = {
     "timeout": 30                 # 請求超時時間（秒）
 }
 
+# 重試設定（指數退避 + 隨機抖動，伺服器有 Retry-After 時以它為準）
+RETRY_SETTINGS = {
+    "attempts": BATCH_SETTINGS["retry_attempts"],  # 總嘗試次數
+    "base_delay": 1.0,            # 第一次重試前最多等待秒數，之後每次加倍
+    "max_delay": 30.0,            # 單次等待上限（秒）
+    "max_retry_after": 120.0      # Retry-After 等待上限（秒）
+}
+
+# EasyStore API 設定（共用連線 + 令牌桶限流）
+EASYSTORE_API_SETTINGS = {
+    "requests_per_second": 4,     # 平均每秒請求數
+    "burst": 8,                   # 允許的突發請求數
+    "low_remaining": 2,           # 剩餘額度低於此值時主動等待重置
+    "pool_size": 10,              # 連線池大小
+    "timeout": 30                 # 請求超時（秒）
+}
+
+# HTTP 連線池設定（同一主機共用連線與 HTTP/2 多工）
+HTTP_POOL_SETTINGS = {
+    "http2": True,
+    "max_connections": 20,            # 每個主機最多連線數
+    "max_keepalive_connections": 10,  # 保持存活的閒置連線數
+    "keepalive_expiry": 30,           # 閒置連線保留秒數
+    "timeout": 60                     # 預設請求超時（秒）
+}
+
+# 分段管線設定（抓取 → 解析 → 圖片 → API 同時進行）
+PIPELINE_SETTINGS = {
+    "fetch_workers": 2,           # 抓取頁面執行緒數（建議與瀏覽器池大小相同）
+    "parse_workers": 1,           # 解析執行緒數
+    "image_workers": 2,           # 同時下載圖片的商品數
+    "api_workers": 1,             # 上架執行緒數（保持 1 以免統計數字競爭）
+    "queue_size": 2               # 每段之間的佇列上限
+}
+
+# 商品頁抓取設定（HTTP 優先，靜態HTML不完整才用瀏覽器）
+PAGE_FETCH_SETTINGS = {
+    "http_first": True,           # 是否先嘗試 HTTP 抓取
+    "http_timeout": 15,           # HTTP 抓取超時（秒）
+    "min_quality_score": 4        # 內容質量評分門檻（滿分5）
+}
+
+# 瀏覽器池設定（selenium_fetcher 重複使用已暖機的瀏覽器）
+BROWSER_POOL_SETTINGS = {
+    "pool_size": 2,               # 最多同時保留的瀏覽器數量
+    "max_pages_per_driver": 20,   # 每個瀏覽器處理幾頁後回收重建
+    "acquire_timeout": 120,       # 等待可用瀏覽器的最長秒數
+    "page_load_timeout": 45       # 單頁載入超時（秒）
+}
+
 # Excel匯出設定
 EXCEL_SETTINGS = {
     "default_published": "TRUE",
@@ -45,7 +95,39 @@ IMAGE_SETTINGS = {
     "download_timeout": 20,       # 圖片下載超時
     "max_file_size": 10 * 1024 * 1024,  # 最大檔案大小 10MB
     "allowed_formats": ['.jpg', '.jpeg', '.png', '.webp'],
-    "quality": 85                 # 壓縮品質
+    "quality": 85,                # 壓縮品質
+    "stream_chunk_size": 64 * 1024,  # 串流下載每次寫入的大小
+    "global_concurrency": 16,     # 整個程式同時下載的圖片上限
+    "per_host_concurrency": 8     # 單一主機同時下載的圖片上限
+}
+
+# 圖片快取設定（以內容雜湊儲存，重跑批次時用條件式請求避免重新下載）
+IMAGE_CACHE_SETTINGS = {
+    "enabled": True,
+    "cache_dir": "image_cache",   # 快取資料夾
+    "max_size_mb": 2048           # 超過此大小依最後使用時間淘汰
+}
+
+# 商品頁解析（product_page.py）
+PARSER_SETTINGS = {
+    "backend": "lxml",            # lxml（較快）或 html.parser；未安裝 lxml 時自動改用 html.parser
+    "trim": True,                 # 只解析圖片列表與商品資訊區塊，找不到時解析整頁
+    "browser_extract": True       # 瀏覽器抓取時直接在頁面中擷取商品資料，不傳回整頁 HTML
+}
+
+# 商品頁快取（page_cache.py，兩個工具共用同一個資料夾）
+PAGE_CACHE_SETTINGS = {
+    "enabled": True,
+    "cache_dir": "~/.freak_store_cache",
+    "ttl_hours": 12,              # 抓過的頁面在此時間內直接使用快取（只有批量上架系統使用）
+    "max_age_days": 7             # 超過此天數沒有更新的快取檔自動刪除
+}
+
+# 批次進度日誌（job_journal.py，程式中斷後可從中斷處繼續）
+JOB_JOURNAL_SETTINGS = {
+    "enabled": True,
+    "path": "job_journal.jsonl",
+    "max_age_hours": 72           # 超過此時間的進度不再提供續傳
 }
 
 # 日誌設定
@@ -0,0 +1,219 @@
+# easystore_client.py - EasyStore API 共用客戶端（連線重用 + 限流 + 重試）
+#
+# 批量上架系統與折扣同步工具各有一份相同的檔案，修改時請兩邊一起更新。
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from retry_policy import RetryPolicy, parse_retry_after
+from config import BASE_API, API_HEADERS
+
+try:
+    from config import EASYSTORE_API_SETTINGS
+except ImportError:
+    EASYSTORE_API_SETTINGS = {}
+
+# 限流標頭的 reset 大於此值時視為 epoch 時間（秒數形式不可能這麼大）
+EPOCH_THRESHOLD = 1e9
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 個請求，最多累積 capacity 個突發"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取得一個令牌，不足時等待；回傳實際等待秒數"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """伺服器表示額度用盡時，所有執行緒一起暫停"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(str(value).split(",")[0].strip())
+        except ValueError:
+            continue
+    return None
+
+
+class EasyStoreClient:
+    """EasyStore API 客戶端
+
+    - 共用一個 requests.Session，連線池大小可設定，同一主機的連線重複使用
+    - 令牌桶控制送出速率，讀取回應中的限流標頭，額度快用完時主動放慢
+    - 429 / 暫時性錯誤依 RetryPolicy 重試；建立商品（POST）不重送可能已成功的請求
+    """
+
+    def __init__(self, base_api=None, headers=None, requests_per_second=None, burst=None,
+                 pool_size=None, timeout=None):
+        self.base_api = (base_api or BASE_API).rstrip("/")
+        self.timeout = timeout or EASYSTORE_API_SETTINGS.get("timeout", 30)
+        self.low_remaining = EASYSTORE_API_SETTINGS.get("low_remaining", 2)
+
+        pool_size = pool_size or EASYSTORE_API_SETTINGS.get("pool_size", 10)
+        self.session = requests.Session()
+        self.session.headers.update(headers or API_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = TokenBucket(
+            requests_per_second or EASYSTORE_API_SETTINGS.get("requests_per_second", 4),
+            burst or EASYSTORE_API_SETTINGS.get("burst", 8)
+        )
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'throttled': 0, 'waited_seconds': 0.0, 'responses': {}}
+        self.rate_limit = {'limit': None, 'remaining': None}
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_api}/{path.lstrip('/')}"
+
+    def _observe(self, response):
+        """記錄統計並依限流標頭調整送出速度"""
+        headers = response.headers
+        limit = _header_number(headers, "X-RateLimit-Limit", "RateLimit-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        reset = _header_number(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+
+        # 部分 API 用「已用/上限」格式，例如 "38/40"
+        call_limit = headers.get("X-EasyStore-Api-Call-Limit") or headers.get("X-Api-Call-Limit")
+        if call_limit and "/" in call_limit:
+            try:
+                used, total = (float(x) for x in call_limit.split("/", 1))
+                limit, remaining = total, total - used
+            except ValueError:
+                pass
+
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            bucket = f"{response.status_code // 100}xx"
+            self.stats['responses'][bucket] = self.stats['responses'].get(bucket, 0) + 1
+            if limit is not None:
+                self.rate_limit['limit'] = limit
+            if remaining is not None:
+                self.rate_limit['remaining'] = remaining
+
+        if response.status_code == 429:
+            with self._stats_lock:
+                self.stats['throttled'] += 1
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.bucket.pause(retry_after if retry_after is not None else 1.0 / self.bucket.rate)
+        elif remaining is not None and remaining <= self.low_remaining:
+            # reset 可能是秒數或 epoch 時間（已經過去的 epoch 代表不必等待）
+            if reset is not None and reset >= EPOCH_THRESHOLD:
+                reset = max(0.0, reset - time.time())
+            self.bucket.pause(min(reset, 60.0) if reset is not None else 1.0 / self.bucket.rate)
+
+    def request(self, method, path, idempotent=None, description=None, **kwargs):
+        """送出請求（含限流與重試），回傳 requests.Response"""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method != "POST"
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.url(path)
+
+        def send():
+            waited = self.bucket.acquire()
+            if waited:
+                with self._stats_lock:
+                    self.stats['waited_seconds'] += waited
+            response = self.session.request(method, url, **kwargs)
+            self._observe(response)
+            return response
+
+        policy = RetryPolicy(idempotent=idempotent)
+        return policy.call(send, description=description or f"EasyStore {method} {path}")
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    # ---------- 常用端點 ----------
+
+    def get_product(self, product_id):
+        """取得單一商品（含 variants）"""
+        response = self.get(f"products/{product_id}.json", description=f"獲取商品 {product_id}")
+        response.raise_for_status()
+        return response.json().get("product", {})
+
+    def update_variant_price(self, product_id, variant_id, price):
+        """更新單一變體價格"""
+        response = self.put(
+            f"products/{product_id}/variants/{variant_id}.json",
+            json={"variant": {"price": price}},
+            description=f"更新變體 {variant_id} 價格"
+        )
+        response.raise_for_status()
+        return response
+
+    def create_product(self, payload):
+        """建立商品（不重送可能已成功的請求）"""
+        return self.post("products.json", json=payload, description="建立商品")
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'requests': self.stats['requests'],
+                'throttled': self.stats['throttled'],
+                'waited_seconds': round(self.stats['waited_seconds'], 1),
+                'responses': dict(self.stats['responses']),
+                'rate_limit': dict(self.rate_limit),
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_easystore_client():
+    """取得全域共用的 EasyStore 客戶端"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = EasyStoreClient()
+        return _shared_client
@@ -7,11 +7,14 @@ import re
 from collections import defaultdict, OrderedDict
 import warnings
 import requests
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 import hashlib
 import pandas as pd
 
+from retry_policy import RetryPolicy
+from product_page import parse_product_page, read_size_table, MISSING_STOCK
+from image_downloader import check_response_headers, write_stream_atomically, get_chunk_size, DownloadRejected, get_image_downloader
+
 warnings.filterwarnings("ignore", category=UserWarning)
 
 if hasattr(sys, '_MEIPASS'):
@@ -34,6 +37,31 @@ def fetch_html_from_url(url):
         print(f"[ERROR] 無法載入網頁：{e}")
         return ""
 
+# 靜態HTML必須包含這些區塊，才算拿到完整的規格／庫存資訊
+REQUIRED_PRODUCT_MARKERS = [
+    "block-goods-name",
+    "block-goods-color-variation-box",
+    "block-goods-stockstatus",
+]
+
+def evaluate_page_quality(html):
+    """計算頁面內容質量評分（0-5）與各項指標"""
+    lowered = (html or "").lower()
+    quality_indicators = {
+        'daytona': 'daytona' in lowered,
+        'product/item': any(word in lowered for word in ['product', 'item', 'goods']),
+        'price/cost': any(word in lowered for word in ['price', 'cost', 'yen', '円']),
+        'size': any(word in lowered for word in ['size', 'サイズ', 'cm']),
+        'image': 'img' in lowered
+    }
+    return sum(quality_indicators.values()), quality_indicators
+
+def has_product_blocks(html):
+    """檢查HTML是否已包含商品規格與庫存區塊"""
+    if not html:
+        return False
+    return all(marker in html for marker in REQUIRED_PRODUCT_MARKERS)
+
 stock_status_map = {
     "残りわずか": 2,
     "在庫あり": 10,
@@ -71,18 +99,6 @@ COLOR_MAP = {
     "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN"
 }
 
-# 新增：日文顏色 → 中文顏色
-COLOR_DISPLAY_MAP = {
-    "ブラック": "黑色", "ホワイト": "白色", "グレー": "灰色", "チャコールグレー": "鐵灰",
-    "ネイビー": "深藍", "ブルー": "藍色", "ライトブルー": "天空藍", "ベージュ": "奶茶",
-    "ブラウン": "棕色", "カーキ": "卡其", "オリーブ": "軍綠", "グリーン": "綠色",
-    "ダークグリーン": "深綠", "イエロー": "黃色", "マスタード": "奶黃", "オレンジ": "橘色",
-    "レッド": "紅色", "ピンク": "淡粉", "パープル": "紫色", "ワイン": "酒紅",
-    "アイボリー": "象牙白", "シルバー": "銀色", "ゴールド": "金色", "ミント": "薄荷綠",
-    "サックス": "丹寧藍", "モカ": "摩卡", "テラコッタ": "TER", "ラベンダー": "薰衣草紫",
-    "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN",
-    "ライトグレー": "亮灰", "ワインレッド": "酒紅", "サックスブルー": "靛藍"
-}
 
 def simplify_product_name(name):
     return ''.join([c[0].upper() for c in name if '\u4e00' <= c <= '\u9fff' or c.isalpha()])
@@ -106,111 +122,90 @@ def sort_sizes(sizes):
     order = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
     return sorted(sizes, key=lambda x: order.index(x) if x in order else len(order))
 
-def parse_size_table_html(html):
-    soup = BeautifulSoup(html, "html.parser")
-    table = soup.select_one("table")
-    if not table:
-        return ""
-    rows = table.select("tr")
-    if not rows:
+def format_size_table(headers, rows):
+    """把尺寸表的表頭與各列轉成「S：衣長 63 / 肩寬 51cm」格式的文字"""
+    if not headers and not rows:
         return ""
-    headers = [th.get_text(strip=True) for th in rows[0].select("th")]
     converted_headers = []
     for h in headers[1:]:
         conv = DIMENSION_LABEL_MAP.get(h, h)  # 新增：若有映射則替換，否則保留原日文
         converted_headers.append(conv)
         
     result = []
-    for row in rows[1:]:
-        cols = [td.get_text(strip=True) for td in row.select("td")]
-        if not cols:
-            continue
+    for cols in rows:
         size = cols[0]
         values = cols[1:]
         parts = [f"{h} {v}" for h, v in zip(converted_headers, values)]
         result.append(f"{size}：{' / '.join(parts)}cm")
     return "\n".join(result)
 
-def download_image(url, save_path, retries=5, timeout=20):
-    for attempt in range(retries):
+def parse_size_table_html(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return format_size_table(*read_size_table(soup.select_one("table")))
+
+def download_image(url, save_path, retries=None, timeout=20):
+    policy = RetryPolicy(attempts=retries)
+    for attempt in range(policy.attempts):
+        retry_after = None
         try:
-            response = requests.get(url, timeout=timeout)
-            if response.status_code == 200:
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                with open(save_path, "wb") as f:
-                    f.write(response.content)
-                print(f"✅ 圖片下載成功：{url}")
-                return True
+            with requests.get(url, timeout=timeout, stream=True) as response:
+                if response.status_code == 200:
+                    check_response_headers(url, response.headers)
+                    write_stream_atomically(response.iter_content(get_chunk_size()), save_path, min_size=1)
+                    print(f"✅ 圖片下載成功：{url}")
+                    return True
+                retry_after = response.headers.get("Retry-After")
+                retryable = policy.should_retry_status(response.status_code)
+        except DownloadRejected as e:
+            print(f"⚠️ 略過圖片：{url} | {e}")
+            return False
         except Exception as e:
             print(f"❌ 圖片下載錯誤：{url} | {e}")
+            retryable = policy.should_retry_exception(e)
+        if not retryable or attempt == policy.attempts - 1:
+            break
+        policy.sleep(attempt, retry_after)
     return False
 
 def download_all_images(image_urls, folder_name="images", product_name="商品"):
     safe_name = re.sub(r'[\\/*?:"<>|]', "_", product_name.strip()) or "unknown"
     save_folder = os.path.join(folder_name, safe_name)
-    results = []
-    with ThreadPoolExecutor(max_workers=6) as executor:
-        futures = {
-            executor.submit(download_image, url, os.path.join(save_folder, os.path.basename(url))): url
-            for url in image_urls
-        }
-        for future in as_completed(futures):
-            url = futures[future]
-            success = future.result()
-            results.append({"url": url, "success": success})
-    return results
+    # 與批次上架共用同一個下載引擎與並發上限
+    items = [(url, os.path.join(save_folder, os.path.basename(url))) for url in image_urls]
+    downloads = get_image_downloader().download_many(items)
+    return [{"url": d["url"], "success": d["success"]} for d in downloads]
 
 def parse_html_to_data(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
-    data = {}
+    # 共用解析器只解析一次 HTML，這裡只負責轉成建檔系統使用的格式
+    return page_to_data(parse_product_page(html))
 
-    name_tag = soup.select_one(".block-goods-name h1")
-    data["name"] = name_tag.get_text(strip=True) if name_tag else ""
 
-    brand_tag = soup.select_one(".block-goods-brand-name a")
-    data["brand"] = brand_tag.get_text(strip=True) if brand_tag else ""
-
-    price_tag = soup.select_one(".block-goods-price--price.price.js-enhanced-ecommerce-goods-price")
-    default_price_tag = soup.select_one(".block-goods-price--default-price")
-    discount_tag = soup.select_one(".block-goods-price--sale-dratio")
-
-    def extract_price(text): return re.sub(r"[^\d]", "", text) if text else ""
+def page_to_data(page: dict) -> dict:
+    """把 parse_product_page / 瀏覽器端擷取的結果轉成建檔系統使用的格式"""
+    data = {}
 
-    data["price"] = extract_price(price_tag.get_text(strip=True)) if price_tag else ""
-    data["default_price"] = extract_price(default_price_tag.get_text(strip=True)) if default_price_tag else ""
-    data["discount_ratio"] = discount_tag.get_text(strip=True) if discount_tag else ""
+    data["name"] = page["name"]
+    data["brand"] = page["brand"]
+    data["price"] = page["price"]
+    data["default_price"] = page["default_price"]
+    data["discount_ratio"] = page["discount_text"]
 
     stock_list = []
     stock_qty_list = []
     stock_dict = defaultdict(dict)
     stock_qty = {}
-    raw_colors = {}  # 新增：存储每个中文颜色对应的原始日文颜色
-
-    color_blocks = soup.select(".block-goods-color-variation-box")
-    for color_block in color_blocks:
-        color_tag = color_block.select_one(".block-goods-color-variation-name-text")
-        # 先讀出原始日文顏色
-        raw_color = color_tag.get_text(strip=True) if color_tag else ""
-        # 再對照映射表轉成中文，找不到就保留原文
-        display_color = COLOR_DISPLAY_MAP.get(raw_color, raw_color)
-        # 最終用 display_color 作為後續所有 stock 與 sku 的「顏色」
-        raw_colors[display_color] = raw_color
-        # 最終用 display_color 作為後續所有 stock 的「顏色」
-        color = display_color
-        size_boxes = color_block.select(".block-goods-color-variation-size-stock-box")
-        for box in size_boxes:
-            size_tag = box.select_one(".block-goods-color-variation-size-value")
-            stock_tag = box.select_one('[class^="block-goods-stockstatus"]')
-            size = size_tag.get_text(strip=True) if size_tag else ""
-            stock_status = stock_tag.get_text(strip=True) if stock_tag else "尚未擷取到資料"
-            stock_dict[color][size] = stock_status
-            qty = stock_status_map.get(stock_status, "")
-            stock_qty[(size, color)] = qty
+    # 每个中文颜色对应的原始日文颜色
+    raw_colors = page["raw_colors"]
+
+    # 用中文顯示顏色作為後續所有 stock 與 sku 的「顏色」
+    for size, color, stock_status in page["stocks"]:
+        stock_dict[color][size] = stock_status
+        stock_qty[(size, color)] = stock_status_map.get(stock_status, "")
 
     size_order = sort_sizes(list({size for sizes in stock_dict.values() for size in sizes}))
     for color, sizes in sorted(stock_dict.items()):
         for size in size_order:
-            stock = stock_dict[color].get(size, '尚未擷取到資料')
+            stock = stock_dict[color].get(size, MISSING_STOCK)
             qty = stock_qty.get((size, color), '')
             stock_list.append([size, color, stock])
             stock_qty_list.append(qty)
@@ -219,25 +214,19 @@ def parse_html_to_data(html: str) -> dict:
     data["stocks_qty"] = stock_qty_list
     data["sizes"] = size_order
 
-    image_tags = soup.select("div.image-list img")
-    image_urls = [urljoin(BASE_URL, img.get("src")) for img in image_tags if img.get("src")]
-    data["images"] = image_urls
-    main_img_tag = soup.select_one(".block-goods-color-variation-img img")
-    data["main_image"] = urljoin(BASE_URL, main_img_tag.get("src")) if main_img_tag else ""
+    data["images"] = page["images"]
+    data["main_image"] = page["main_image"]
 
     # 移除自動下載，改由API處理器控制
 
-    size_table_tag = soup.select_one(".block-goods-product-size-table")
-    if size_table_tag:
-        html = str(size_table_tag)
-        data["size_table_html"] = html
+    data["size_table_html"] = page["size_table_html"]
+    if page["size_table_html"]:
         try:
-            data["parsed_size_table"] = parse_size_table_html(html)
+            data["parsed_size_table"] = format_size_table(page["size_table_headers"], page["size_table_rows"])
         except Exception as e:
             print(f"⚠️ 尺寸表解析錯誤：{e}")
             data["parsed_size_table"] = ""
     else:
-        data["size_table_html"] = ""
         data["parsed_size_table"] = ""
 
     generated_skus = []
@@ -0,0 +1,120 @@
+# http_pool.py - 依主機共用的 HTTP/2 連線池
+
+import threading
+from urllib.parse import urlparse
+import httpx
+
+try:
+    from config import HTTP_POOL_SETTINGS
+except ImportError:
+    HTTP_POOL_SETTINGS = {}
+
+
+class HostClientPool:
+    """每個主機一個長期存在的 httpx.Client
+
+    httpx.Client 本身是執行緒安全的，同一主機的所有請求共用連線與
+    HTTP/2 多工，避免每張圖片都重新 TLS 握手。
+    """
+
+    def __init__(self, max_connections=None, max_keepalive_connections=None,
+                 keepalive_expiry=None, timeout=None, http2=None):
+        self.max_connections = max_connections or HTTP_POOL_SETTINGS.get("max_connections", 20)
+        self.max_keepalive_connections = max_keepalive_connections or HTTP_POOL_SETTINGS.get("max_keepalive_connections", 10)
+        self.keepalive_expiry = keepalive_expiry or HTTP_POOL_SETTINGS.get("keepalive_expiry", 30)
+        self.timeout = timeout or HTTP_POOL_SETTINGS.get("timeout", 60)
+        self.http2 = HTTP_POOL_SETTINGS.get("http2", True) if http2 is None else http2
+
+        self._clients = {}   # "https://host" -> httpx.Client
+        self._stats = {}     # "https://host" -> 統計
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_key(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def _make_hooks(self, key):
+        stats = self._stats[key]
+        lock = self._lock
+
+        def on_request(request):
+            with lock:
+                stats['requests'] += 1
+
+        def on_response(response):
+            with lock:
+                bucket = f"{response.status_code // 100}xx"
+                stats['responses'][bucket] = stats['responses'].get(bucket, 0) + 1
+
+        return {'request': [on_request], 'response': [on_response]}
+
+    def get_client(self, url):
+        """取得該 URL 主機的共用 client（不存在時建立）"""
+        key = self.host_key(url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                self._stats[key] = {'requests': 0, 'responses': {}, 'errors': 0}
+                client = httpx.Client(
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections,
+                        keepalive_expiry=self.keepalive_expiry
+                    ),
+                    event_hooks=self._make_hooks(key)
+                )
+                self._clients[key] = client
+            return client
+
+    def record_error(self, url):
+        """記錄連線層級的錯誤（逾時、連線中斷等）"""
+        key = self.host_key(url)
+        with self._lock:
+            if key in self._stats:
+                self._stats[key]['errors'] += 1
+
+    def get_stats(self):
+        """取得各主機的請求統計與目前連線數"""
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                entry = {
+                    'requests': stats['requests'],
+                    'responses': dict(stats['responses']),
+                    'errors': stats['errors'],
+                    'connections': None
+                }
+                try:
+                    # httpx 未公開連線池資訊，取不到時保持 None
+                    entry['connections'] = len(self._clients[key]._transport._pool.connections)
+                except Exception:
+                    pass
+                result[key] = entry
+            return result
+
+    def close_all(self):
+        """關閉所有 client"""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """取得全域共用的連線池"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HostClientPool()
+        return _shared_pool
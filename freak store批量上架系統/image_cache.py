@@ -0,0 +1,199 @@
+# image_cache.py - 以內容雜湊儲存的圖片快取（重跑批次時不必重新下載）
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+try:
+    from config import IMAGE_CACHE_SETTINGS
+except ImportError:
+    IMAGE_CACHE_SETTINGS = {}
+
+
+class ImageCache:
+    """內容定址的圖片快取
+
+    - 圖片依 sha256 存在 objects/ab/abcdef... ，相同內容只存一份
+    - sqlite 索引記錄 URL → sha256 以及 ETag / Last-Modified，供條件式請求使用
+    - 放進商品資料夾時優先用硬連結，不支援時才複製
+    - 總大小超過上限時，依最後使用時間淘汰最舊的檔案（LRU）
+    """
+
+    def __init__(self, cache_dir=None, max_size_mb=None):
+        self.cache_dir = cache_dir or IMAGE_CACHE_SETTINGS.get("cache_dir", "image_cache")
+        max_size_mb = max_size_mb or IMAGE_CACHE_SETTINGS.get("max_size_mb", 2048)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.cache_dir, "index.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS objects (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_urls_sha256 ON urls(sha256);
+        """)
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """查詢 URL 的快取紀錄，檔案已遺失時視為沒有快取
+
+        Returns:
+            dict 或 None: {'sha256', 'etag', 'last_modified'}
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256, etag, last_modified FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        sha256, etag, last_modified = row
+        if not os.path.exists(self.object_path(sha256)):
+            self._forget_object(sha256)
+            return None
+        return {'sha256': sha256, 'etag': etag, 'last_modified': last_modified}
+
+    @staticmethod
+    def conditional_headers(entry):
+        """依快取紀錄產生 If-None-Match / If-Modified-Since 標頭"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers["If-None-Match"] = entry['etag']
+            if entry.get('last_modified'):
+                headers["If-Modified-Since"] = entry['last_modified']
+        return headers
+
+    def add(self, url, file_path, sha256, etag=None, last_modified=None):
+        """把剛下載完成的檔案收進快取（以硬連結共用同一份內容）"""
+        object_path = self.object_path(sha256)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            _link_or_copy(file_path, object_path)
+        size = os.path.getsize(object_path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, sha256, etag, last_modified, now)
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO objects (sha256, size, last_access) VALUES (?, ?, ?)",
+                (sha256, size, now)
+            )
+            self._db.commit()
+            self.misses += 1
+
+    def materialize(self, entry, save_path):
+        """把快取中的圖片放到商品資料夾（快取命中時使用）"""
+        _link_or_copy(self.object_path(entry['sha256']), save_path)
+        with self._lock:
+            self._db.execute(
+                "UPDATE objects SET last_access = ? WHERE sha256 = ?", (time.time(), entry['sha256'])
+            )
+            self._db.commit()
+            self.hits += 1
+
+    def _forget_object(self, sha256):
+        with self._lock:
+            self._db.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            self._db.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+            self._db.commit()
+
+    def evict(self):
+        """總大小超過上限時，淘汰最久沒用到的圖片
+
+        Returns:
+            int: 淘汰的檔案數
+        """
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            removed = []
+            for sha256, size in self._db.execute("SELECT sha256, size FROM objects ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                removed.append(sha256)
+                total -= size
+            for sha256 in removed:
+                self._db.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+                self._db.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+            self._db.commit()
+
+        # 商品資料夾中的硬連結不受影響，只刪除快取這一份
+        for sha256 in removed:
+            try:
+                os.remove(self.object_path(sha256))
+            except OSError:
+                pass
+        if removed:
+            print(f"🧹 圖片快取超過上限，已淘汰 {len(removed)} 個檔案")
+        return len(removed)
+
+    def get_stats(self):
+        """取得快取命中統計與目前大小"""
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'files': count, 'size_bytes': total}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _link_or_copy(src, dest):
+    """以硬連結（不支援時改為複製）建立 dest，先寫暫存名再改名，避免半個檔案"""
+    folder = os.path.dirname(dest) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+    os.close(fd)
+    os.remove(temp_path)
+    try:
+        try:
+            os.link(src, temp_path)
+        except OSError:
+            shutil.copy2(src, temp_path)
+        os.replace(temp_path, dest)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """取得全域共用的圖片快取，設定停用時回傳 None"""
+    global _shared_cache
+    if not IMAGE_CACHE_SETTINGS.get("enabled", True):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ImageCache()
+        return _shared_cache
@@ -0,0 +1,407 @@
+# image_downloader.py - 圖片串流下載（邊收邊寫入暫存檔，超過上限提早中止）
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from urllib.parse import urlparse
+import httpx
+
+from image_cache import get_image_cache
+from retry_policy import RetryPolicy
+
+try:
+    from config import IMAGE_SETTINGS, HTTP_POOL_SETTINGS
+except ImportError:
+    IMAGE_SETTINGS = {}
+    HTTP_POOL_SETTINGS = {}
+
+# 副檔名 → Content-Type
+FORMAT_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+}
+
+# 伺服器沒給明確類型時，改用 URL 副檔名判斷
+GENERIC_CONTENT_TYPES = {"", "application/octet-stream", "binary/octet-stream"}
+
+MIN_IMAGE_SIZE = 1000  # 小於此大小視為錯誤頁或佔位圖
+
+DEFAULT_REFERER = "https://www.daytona-park.com/"
+
+
+def build_image_headers(referer=DEFAULT_REFERER):
+    """模擬瀏覽器載入圖片時的請求標頭"""
+    return {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "image/jpeg,image/png,image/svg+xml,image/*;q=0.8,*/*;q=0.5",
+        "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+        "Accept-Encoding": "gzip, deflate, br",
+        "Referer": referer,
+        "sec-ch-ua": '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"macOS"',
+        "sec-fetch-dest": "image",
+        "sec-fetch-mode": "no-cors",
+        "sec-fetch-site": "same-site",
+    }
+
+
+class DownloadRejected(Exception):
+    """圖片不符合大小或格式限制"""
+
+
+def get_max_file_size():
+    return IMAGE_SETTINGS.get("max_file_size", 10 * 1024 * 1024)
+
+
+def get_allowed_formats():
+    return [fmt.lower() for fmt in IMAGE_SETTINGS.get("allowed_formats", ['.jpg', '.jpeg', '.png', '.webp'])]
+
+
+def get_chunk_size():
+    return IMAGE_SETTINGS.get("stream_chunk_size", 64 * 1024)
+
+
+def check_response_headers(url, headers, max_size=None, allowed_formats=None):
+    """下載前先檢查 Content-Type / Content-Length，不符合就拋出 DownloadRejected"""
+    max_size = get_max_file_size() if max_size is None else max_size
+    allowed_formats = get_allowed_formats() if allowed_formats is None else allowed_formats
+
+    content_type = (headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type in GENERIC_CONTENT_TYPES:
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        if ext not in allowed_formats:
+            raise DownloadRejected(f"不允許的圖片格式: {ext or '未知'}")
+    else:
+        allowed_types = {FORMAT_CONTENT_TYPES[fmt] for fmt in allowed_formats if fmt in FORMAT_CONTENT_TYPES}
+        if content_type not in allowed_types:
+            raise DownloadRejected(f"不允許的 Content-Type: {content_type}")
+
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size:
+        raise DownloadRejected(f"檔案過大: {int(content_length):,} bytes（上限 {max_size:,}）")
+
+
+class PartFile:
+    """寫入同資料夾的 .part 暫存檔，commit() 時才原子性改名成正式檔名
+
+    超過 max_size 立即拋出 DownloadRejected；未 commit 的暫存檔在 abort() 時刪除，
+    不會留下半個檔案。
+    """
+
+    def __init__(self, save_path, max_size=None, min_size=MIN_IMAGE_SIZE):
+        self.save_path = save_path
+        self.max_size = get_max_file_size() if max_size is None else max_size
+        self.min_size = min_size
+        self.written = 0
+        self.sha256 = hashlib.sha256()  # 邊寫邊算，供圖片快取使用
+
+        folder = os.path.dirname(save_path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self.written += len(chunk)
+        if self.written > self.max_size:
+            raise DownloadRejected(f"檔案超過上限 {self.max_size:,} bytes，已中止")
+        self.sha256.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        self._file.close()
+        if self.written < self.min_size:
+            raise DownloadRejected(f"檔案過小: {self.written} bytes")
+        os.replace(self.temp_path, self.save_path)
+        return self.written
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+def write_stream_atomically(chunks, save_path, max_size=None, min_size=MIN_IMAGE_SIZE):
+    """把串流分段寫入暫存檔，完成後才改名成正式檔名
+
+    Returns:
+        int: 寫入的位元組數
+    """
+    part = PartFile(save_path, max_size, min_size)
+    try:
+        for chunk in chunks:
+            part.write(chunk)
+        return part.commit()
+    except BaseException:
+        part.abort()
+        raise
+
+
+def stream_download(client, url, save_path, headers=None, timeout=None, max_size=None, allowed_formats=None, cache=None):
+    """使用 httpx client 串流下載單張圖片
+
+    有快取紀錄時帶上條件式標頭，伺服器回 304 就直接從快取取用。
+
+    Returns:
+        tuple: (成功與否, HTTP 狀態碼, Retry-After 標頭)
+    """
+    entry = cache.lookup(url) if cache else None
+    request_headers = dict(headers or {})
+    request_headers.update(cache.conditional_headers(entry) if entry else {})
+
+    with client.stream("GET", url, headers=request_headers, timeout=timeout) as response:
+        if response.status_code == 304 and entry:
+            cache.materialize(entry, save_path)
+            return True, response.status_code, None
+        if response.status_code != 200:
+            return False, response.status_code, response.headers.get("retry-after")
+        check_response_headers(url, response.headers, max_size, allowed_formats)
+        part = PartFile(save_path, max_size)
+        try:
+            for chunk in response.iter_bytes(get_chunk_size()):
+                part.write(chunk)
+            part.commit()
+        except BaseException:
+            part.abort()
+            raise
+        if cache:
+            _add_to_cache(cache, url, save_path, part, response.headers)
+        return True, response.status_code, None
+
+
+def _add_to_cache(cache, url, save_path, part, headers):
+    """快取寫入失敗不影響下載結果"""
+    try:
+        cache.add(url, save_path, part.sha256.hexdigest(),
+                  headers.get("etag"), headers.get("last-modified"))
+    except Exception as e:
+        print(f"⚠️ 圖片快取寫入失敗: {e}")
+
+
+class AsyncImageDownloader:
+    """整個程式共用的 asyncio 圖片下載引擎
+
+    - 背景執行緒跑一個事件迴圈，所有商品的圖片都丟進同一個迴圈
+    - 全域 semaphore 限制同時下載總數，各主機另有自己的上限
+    - 每個主機一個 httpx.AsyncClient（HTTP/2），連線在商品之間重複使用
+    - 有圖片快取時送出條件式請求，304 直接從快取放到商品資料夾
+    - 呼叫端維持同步介面：download_many() 會等這批圖片全部完成才返回
+    """
+
+    def __init__(self, global_concurrency=None, per_host_concurrency=None, timeout=None, cache=None):
+        self.cache = get_image_cache() if cache is None else cache
+        self.global_concurrency = global_concurrency or IMAGE_SETTINGS.get("global_concurrency", 16)
+        self.per_host_concurrency = per_host_concurrency or IMAGE_SETTINGS.get("per_host_concurrency", 8)
+        self.timeout = timeout or HTTP_POOL_SETTINGS.get("timeout", 60)
+
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # 以下只在事件迴圈執行緒內存取
+        self._global_semaphore = None
+        self._host_semaphores = {}
+        self._clients = {}
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    # ---------- 事件迴圈 ----------
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+            ready = threading.Event()
+
+            def run():
+                self._loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self._loop)
+                ready.set()
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="image-downloader-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+            return self._loop
+
+    @staticmethod
+    def host_key(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def _get_client(self, key):
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                http2=HTTP_POOL_SETTINGS.get("http2", True),
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.per_host_concurrency,
+                    max_keepalive_connections=self.per_host_concurrency,
+                    keepalive_expiry=HTTP_POOL_SETTINGS.get("keepalive_expiry", 30)
+                )
+            )
+            self._clients[key] = client
+        return client
+
+    def _get_semaphores(self, key):
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.global_concurrency)
+        host_semaphore = self._host_semaphores.get(key)
+        if host_semaphore is None:
+            host_semaphore = self._host_semaphores[key] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._global_semaphore, host_semaphore
+
+    def _record(self, key, status_code=None, error=False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(key, {'requests': 0, 'responses': {}, 'errors': 0})
+            if error:
+                stats['errors'] += 1
+                return
+            stats['requests'] += 1
+            bucket = f"{status_code // 100}xx"
+            stats['responses'][bucket] = stats['responses'].get(bucket, 0) + 1
+
+    # ---------- 下載 ----------
+
+    async def _fetch_once(self, client, url, save_path, headers, timeout):
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry:
+            headers = dict(headers, **self.cache.conditional_headers(entry))
+
+        async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            self._record(self.host_key(url), response.status_code)
+            if response.status_code == 304 and entry:
+                self.cache.materialize(entry, save_path)
+                return True, response.status_code, None
+            if response.status_code != 200:
+                return False, response.status_code, response.headers.get("retry-after")
+            check_response_headers(url, response.headers)
+            part = PartFile(save_path)
+            try:
+                async for chunk in response.aiter_bytes(get_chunk_size()):
+                    part.write(chunk)
+                part.commit()
+            except BaseException:
+                part.abort()
+                raise
+            if self.cache:
+                _add_to_cache(self.cache, url, save_path, part, response.headers)
+            return True, response.status_code, None
+
+    async def _download_one(self, url, save_path, headers, timeout, retries):
+        key = self.host_key(url)
+        global_semaphore, host_semaphore = self._get_semaphores(key)
+        client = self._get_client(key)
+        policy = RetryPolicy(attempts=retries)
+
+        error = None
+        for attempt in range(policy.attempts):
+            retry_after = None
+            # 退避等待時不佔用並發名額
+            async with global_semaphore, host_semaphore:
+                try:
+                    success, status_code, retry_after = await self._fetch_once(client, url, save_path, headers, timeout)
+                    if success:
+                        return {'url': url, 'path': save_path, 'success': True, 'error': None}
+                    error = f"HTTP {status_code}"
+                    print(f"   ⚠️ 第 {attempt+1} 次嘗試: {error} - {url[:50]}...")
+                    retryable = policy.should_retry_status(status_code)
+                except DownloadRejected as e:
+                    # 格式或大小不符，重試也不會改變結果
+                    print(f"   ⚠️ 略過圖片: {url[:50]}... - {e}")
+                    return {'url': url, 'path': save_path, 'success': False, 'error': str(e)}
+                except Exception as e:
+                    self._record(key, error=True)
+                    error = str(e) or type(e).__name__
+                    retryable = policy.should_retry_exception(e)
+            if not retryable or attempt == policy.attempts - 1:
+                break
+            await policy.async_sleep(attempt, retry_after)
+        print(f"❌ 圖片下載失敗: {url[:50]}... - {error}")
+        return {'url': url, 'path': save_path, 'success': False, 'error': error}
+
+    async def _download_all(self, items, headers, timeout, retries, on_result):
+        async def run(url, save_path):
+            result = await self._download_one(url, save_path, headers, timeout, retries)
+            if on_result:
+                on_result(result)
+            return result
+
+        return await asyncio.gather(*(run(url, save_path) for url, save_path in items))
+
+    def download_many(self, items, headers=None, timeout=None, retries=None, on_result=None):
+        """下載一批圖片，全部完成後依輸入順序返回結果
+
+        Args:
+            items: [(url, save_path), ...]
+            retries: 嘗試次數，預設依 RETRY_SETTINGS
+            on_result: 每張圖片完成時呼叫（在事件迴圈執行緒上）
+
+        Returns:
+            list: [{'url', 'path', 'success', 'error'}, ...]
+        """
+        if not items:
+            return []
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._download_all(list(items), headers or build_image_headers(), timeout or self.timeout, retries, on_result),
+            loop
+        )
+        results = future.result()
+        if self.cache:
+            self.cache.evict()
+        return results
+
+    def get_stats(self):
+        """取得各主機的請求統計（與 HostClientPool.get_stats 相同格式）"""
+        with self._stats_lock:
+            return {
+                key: {'requests': s['requests'], 'responses': dict(s['responses']), 'errors': s['errors'], 'connections': None}
+                for key, s in self._stats.items()
+            }
+
+    def close(self):
+        """關閉所有 client 並停止事件迴圈"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def close_clients():
+            clients, self._clients = list(self._clients.values()), {}
+            for client in clients:
+                try:
+                    await client.aclose()
+                except Exception:
+                    pass
+
+        asyncio.run_coroutine_threadsafe(close_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        self._global_semaphore = None
+        self._host_semaphores = {}
+
+
+_shared_downloader = None
+_shared_downloader_lock = threading.Lock()
+
+
+def get_image_downloader():
+    """取得全域共用的圖片下載引擎"""
+    global _shared_downloader
+    with _shared_downloader_lock:
+        if _shared_downloader is None:
+            _shared_downloader = AsyncImageDownloader()
+        return _shared_downloader
@@ -0,0 +1,164 @@
+# job_journal.py - 批次上架的進度日誌（append-only JSONL），程式中斷後可從各商品完成的階段繼續
+#
+# 每個商品每完成一個階段寫一行並 fsync：
+#   fetched       已抓取商品頁（內容在 page_cache，續傳時直接命中快取）
+#   parsed        已解析（記錄 parsed_data，續傳時不必重新抓取/解析）
+#   images_done   圖片已下載
+#   api_started   已送出建立商品的 API 請求
+#   created       EasyStore 已建立商品（記錄 product_id）
+#   api_failed    API 明確回傳失敗，可以安全重試
+#   reset         使用者選擇重新處理，忽略之前的紀錄
+#
+# 只有 api_started 而沒有 created 的商品，無法確定 EasyStore 是否已建立，續傳時不會自動重送。
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from config import JOB_JOURNAL_SETTINGS
+except ImportError:
+    JOB_JOURNAL_SETTINGS = {}
+
+STAGE_ORDER = ('fetched', 'parsed', 'images_done', 'api_started', 'created')
+
+
+def job_key(product):
+    """同一個商品（網址、名稱、價格都相同）在不同次執行時得到相同的鍵"""
+    raw = f"{product['url'].strip()}|{product['name'].strip()}|{str(product['price']).strip()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class JobJournal:
+    """批次進度日誌
+
+    紀錄只會附加在檔尾；讀取時依序套用，每個商品取最後的狀態。
+    超過 max_age_hours 的進度視為過期，不再提供續傳。
+    """
+
+    def __init__(self, path=None, max_age_hours=None):
+        self.path = path or JOB_JOURNAL_SETTINGS.get("path", "job_journal.jsonl")
+        max_age_hours = JOB_JOURNAL_SETTINGS.get("max_age_hours", 72) if max_age_hours is None else max_age_hours
+        self.max_age = max_age_hours * 3600
+        self._lock = threading.Lock()
+        self._tail_checked = False
+
+    def _ensure_line_start(self, f):
+        """上次寫到一半中斷時檔尾沒有換行，先補上，避免新紀錄接在壞掉的那行後面"""
+        if self._tail_checked:
+            return
+        self._tail_checked = True
+        try:
+            with open(self.path, "rb") as existing:
+                existing.seek(0, os.SEEK_END)
+                if existing.tell() == 0:
+                    return
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    f.write("\n")
+        except OSError:
+            pass
+
+    def record(self, key, stage, **data):
+        """寫入一筆紀錄，確實寫到磁碟後才返回"""
+        entry = {'ts': time.time(), 'key': key, 'stage': stage}
+        entry.update(data)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                self._ensure_line_start(f)
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reset(self, keys):
+        for key in keys:
+            self.record(key, 'reset')
+
+    def _read_entries(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # 寫到一半中斷的最後一行
+                continue
+        return entries
+
+    def load_states(self, keys=None):
+        """各商品目前的進度
+
+        Returns:
+            {key: {'stage', 'updated_at', 'parsed_data'?, 'created'?}}，不含已重置、已過期或沒有紀錄的商品
+        """
+        wanted = set(keys) if keys is not None else None
+        states = {}
+        for entry in self._read_entries():
+            key = entry.get('key')
+            if wanted is not None and key not in wanted:
+                continue
+            stage = entry.get('stage')
+            if stage not in STAGE_ORDER and stage not in ('api_failed', 'reset'):
+                continue
+            if stage == 'reset':
+                states.pop(key, None)
+                continue
+            state = states.setdefault(key, {})
+            if stage == 'api_failed':
+                # API 明確失敗：商品沒有建立，回到圖片完成的狀態重試
+                state['stage'] = 'images_done'
+            elif stage in STAGE_ORDER:
+                state['stage'] = stage
+            if 'parsed_data' in entry:
+                state['parsed_data'] = entry['parsed_data']
+            if stage == 'created':
+                state['created'] = {
+                    k: v for k, v in entry.items() if k not in ('ts', 'key', 'stage', 'parsed_data')
+                }
+            state['updated_at'] = entry.get('ts', 0)
+
+        if self.max_age:
+            cutoff = time.time() - self.max_age
+            states = {key: state for key, state in states.items() if state.get('updated_at', 0) >= cutoff}
+        return states
+
+    def compact(self):
+        """只保留未過期商品的最後狀態，避免日誌無限增長（批次開始前呼叫）"""
+        with self._lock:
+            states = self.load_states()
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for key, state in states.items():
+                    entry = {'ts': state['updated_at'], 'key': key, 'stage': state['stage']}
+                    if 'parsed_data' in state:
+                        entry['parsed_data'] = state['parsed_data']
+                    if 'created' in state:
+                        entry.update(state['created'])
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._tail_checked = True
+        return len(states)
+
+
+_shared_journal = None
+_shared_journal_lock = threading.Lock()
+
+
+def get_job_journal():
+    """取得全域共用的進度日誌，設定停用時回傳 None"""
+    global _shared_journal
+    if not JOB_JOURNAL_SETTINGS.get("enabled", True):
+        return None
+    with _shared_journal_lock:
+        if _shared_journal is None:
+            _shared_journal = JobJournal()
+        return _shared_journal
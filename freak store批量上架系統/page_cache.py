@@ -0,0 +1,194 @@
+# page_cache.py - 商品頁 HTML 與解析結果的本地快取，重跑批次或兩個工具處理同一商品時不必重新抓取/解析
+#
+# 批量上架系統與折扣同步工具各有一份相同的檔案，修改時請兩邊一起更新。
+#
+# 兩層快取：
+#   pages/   每個 URL 最後抓到的內容（HTML 或瀏覽器端擷取的結果），超過 ttl_hours 視為過期
+#   parsed/  以 URL + 內容雜湊為鍵的解析結果；內容相同就沿用，不受 TTL 影響
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from product_page import parse_product_page
+
+try:
+    from config import PAGE_CACHE_SETTINGS
+except ImportError:
+    PAGE_CACHE_SETTINGS = {}
+
+# 快取內容格式或 parse_product_page 的輸出改變時加一，舊快取自動失效
+CACHE_VERSION = 2
+
+
+def content_hash(html):
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _page_hash(page):
+    """瀏覽器端擷取的結果沒有 HTML，以資料本身的雜湊代替"""
+    return hashlib.sha256(pickle.dumps(sorted(page.items()), protocol=4)).hexdigest()
+
+
+def _read_pickle(path):
+    try:
+        with open(path, "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _write_pickle(path, cached):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class PageCache:
+    """商品頁快取（多個執行緒、兩個工具可同時使用，寫入皆為原子替換）"""
+
+    def __init__(self, cache_dir=None, ttl_hours=None, max_age_days=None):
+        cache_dir = cache_dir or PAGE_CACHE_SETTINGS.get("cache_dir", "~/.freak_store_cache")
+        self.cache_dir = os.path.expanduser(cache_dir)
+        ttl_hours = PAGE_CACHE_SETTINGS.get("ttl_hours", 12) if ttl_hours is None else ttl_hours
+        self.ttl = ttl_hours * 3600
+        max_age_days = PAGE_CACHE_SETTINGS.get("max_age_days", 7) if max_age_days is None else max_age_days
+        self.max_age = max_age_days * 86400
+        self._prune_lock = threading.Lock()
+        self._pruned = False
+
+    def _page_path(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "pages", f"{key}.pickle")
+
+    def _parsed_path(self, url, digest):
+        key = hashlib.sha1(f"{url}|{digest}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "parsed", f"{key}.pickle")
+
+    # ---------- 抓取結果（有 TTL） ----------
+
+    def load(self, url):
+        """TTL 內抓過的 URL 回傳 {'html': HTML} 或 {'page': 擷取結果}，否則回傳 None"""
+        self._prune_once()
+        entry = _read_pickle(self._page_path(url))
+        if entry is None or entry.get('url') != url:
+            return None
+        if self.ttl and time.time() - entry.get('fetched_at', 0) > self.ttl:
+            return None
+        if entry.get('html'):
+            return {'html': entry['html']}
+        parsed = _read_pickle(self._parsed_path(url, entry['content_hash']))
+        if parsed is None:
+            return None
+        return {'page': parsed['page']}
+
+    def store_html(self, url, html):
+        """記錄抓到的 HTML，回傳內容雜湊"""
+        digest = content_hash(html)
+        self._write_entry(url, digest, html)
+        return digest
+
+    def store_page(self, url, page):
+        """記錄瀏覽器端擷取的結果（沒有 HTML）"""
+        digest = _page_hash(page)
+        self._write_parsed(url, digest, page)
+        self._write_entry(url, digest, None)
+
+    def forget(self, url):
+        try:
+            os.remove(self._page_path(url))
+        except OSError:
+            pass
+
+    def _write_entry(self, url, digest, html):
+        try:
+            _write_pickle(self._page_path(url), {
+                'version': CACHE_VERSION,
+                'url': url,
+                'fetched_at': time.time(),
+                'content_hash': digest,
+                'html': html,
+            })
+        except OSError as e:
+            print(f"⚠️ 無法寫入頁面快取: {e}")
+
+    # ---------- 解析結果（以內容雜湊為鍵） ----------
+
+    def parse(self, url, html):
+        """解析商品頁；同一 URL 內容相同時直接沿用上次的解析結果"""
+        digest = content_hash(html)
+        parsed = _read_pickle(self._parsed_path(url, digest))
+        if parsed is not None:
+            print("♻️ 頁面內容未變，沿用快取的解析結果")
+            return parsed['page']
+        page = parse_product_page(html, url)
+        self._write_parsed(url, digest, page)
+        return page
+
+    def _write_parsed(self, url, digest, page):
+        try:
+            _write_pickle(self._parsed_path(url, digest), {'version': CACHE_VERSION, 'page': page})
+        except OSError as e:
+            print(f"⚠️ 無法寫入解析快取: {e}")
+
+    # ---------- 清理 ----------
+
+    def _prune_once(self):
+        with self._prune_lock:
+            if self._pruned:
+                return
+            self._pruned = True
+        self.prune()
+
+    def prune(self):
+        """刪除超過 max_age_days 沒有更新的快取檔"""
+        if not self.max_age:
+            return 0
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for sub in ("pages", "parsed"):
+            folder = os.path.join(self.cache_dir, sub)
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """取得全域共用的頁面快取，設定停用時回傳 None"""
+    global _shared_cache
+    if not PAGE_CACHE_SETTINGS.get("enabled", True):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = PageCache()
+        return _shared_cache
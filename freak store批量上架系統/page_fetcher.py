@@ -0,0 +1,113 @@
+# page_fetcher.py - 先用 HTTP 抓商品頁，靜態HTML不完整時才改用瀏覽器
+
+import sys
+import time
+
+from html_parser import evaluate_page_quality, has_product_blocks
+from product_page import parse_product_page
+from http_pool import get_shared_pool
+from page_cache import get_page_cache
+
+try:
+    from config import PAGE_FETCH_SETTINGS
+except ImportError:
+    PAGE_FETCH_SETTINGS = {}
+
+try:
+    from config import PARSER_SETTINGS
+except ImportError:
+    PARSER_SETTINGS = {}
+
+PAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+}
+
+
+def fetch_html_via_http(url):
+    """使用 HTTP/2 直接抓取商品頁，失敗時回傳空字串"""
+    try:
+        started = time.monotonic()
+        response = get_shared_pool().get_client(url).get(
+            url, headers=PAGE_HEADERS, timeout=PAGE_FETCH_SETTINGS.get("http_timeout", 15)
+        )
+        response.raise_for_status()
+        print(f"⚡ HTTP 取得頁面: {len(response.text):,} 字符，耗時 {time.monotonic() - started:.2f} 秒")
+        return response.text
+    except Exception as e:
+        print(f"⚠️ HTTP 抓取失敗: {e}")
+        return ""
+
+
+def is_complete_product_page(html):
+    """以與 selenium_fetcher 相同的質量指標判斷靜態HTML是否可直接解析"""
+    if not html:
+        return False
+    quality_score, _ = evaluate_page_quality(html)
+    if quality_score < PAGE_FETCH_SETTINGS.get("min_quality_score", 4):
+        return False
+    return has_product_blocks(html)
+
+
+def fetch_product_page(url, save_path="page_source.html"):
+    """分層抓取商品頁：HTTP 優先，缺少規格/庫存區塊時改用瀏覽器，並直接在頁面中擷取商品資料
+
+    Returns:
+        {'html': 商品頁 HTML}（HTTP 或 page_source）、{'page': parse_product_page 格式的資料}（頁面內擷取），
+        抓取失敗時回傳 None；頁面快取（page_cache）TTL 內抓過的 URL 直接回傳快取內容
+    """
+    cache = get_page_cache()
+    if cache is not None:
+        cached = cache.load(url)
+        if cached is not None:
+            print(f"♻️ 使用頁面快取：{url}")
+            return cached
+
+    if PAGE_FETCH_SETTINGS.get("http_first", True):
+        print("🧭 開始載入頁面：", url)
+        html = fetch_html_via_http(url)
+        if is_complete_product_page(html):
+            with open(save_path, "w", encoding="utf-8") as f:
+                f.write(html)
+            print(f"💾 HTML已儲存至: {save_path}")
+            if cache is not None:
+                cache.store_html(url, html)
+            return {'html': html}
+        print("↪️ 靜態HTML缺少規格/庫存區塊，改用瀏覽器抓取")
+
+    # 只有需要時才載入 selenium
+    if PARSER_SETTINGS.get("browser_extract", True):
+        from selenium_fetcher import fetch_page_from_url
+        fetched = fetch_page_from_url(url, save_path)
+    else:
+        from selenium_fetcher import fetch_html_from_url as fetch_html_via_browser
+        html = fetch_html_via_browser(url, save_path)
+        fetched = {'html': html} if html else None
+    if fetched is None:
+        return None
+
+    if cache is not None:
+        if 'page' in fetched:
+            cache.store_page(url, fetched['page'])
+        elif has_product_blocks(fetched['html']):
+            # 品質不足（例如錯誤頁）的 HTML 不放入快取，下次重新抓取
+            cache.store_html(url, fetched['html'])
+    return fetched
+
+
+def parse_fetched_page(url, fetched):
+    """把 fetch_product_page 的結果轉成 parse_product_page 格式（HTML 的解析結果經由頁面快取沿用）"""
+    if 'page' in fetched:
+        return fetched['page']
+    cache = get_page_cache()
+    if cache is not None:
+        return cache.parse(url, fetched['html'])
+    return parse_product_page(fetched['html'], url)
+
+
+def shutdown_fetchers():
+    """批次結束時關閉瀏覽器池（只有實際用到瀏覽器時才會載入）"""
+    browser_pool = sys.modules.get("browser_pool")
+    if browser_pool is not None:
+        browser_pool.shutdown_browser_pool()
@@ -0,0 +1,75 @@
+# page_readiness.py - 以條件等待取代固定 sleep 的頁面就緒判斷
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import time
+
+# parse_html_to_data 需要的區塊：(CSS selector, 最長等待秒數, 是否必要)
+# 商品名稱出現代表主要內容已渲染，其餘區塊通常同時出現，找不到就用較短的時間放棄
+PRODUCT_READY_CONDITIONS = [
+    (".block-goods-name h1", 15, True),
+    (".block-goods-color-variation-box", 5, False),
+    ("div.image-list img", 5, False),
+    (".block-goods-product-size-table", 3, False),
+]
+
+POLL_INTERVAL = 0.2
+
+
+def wait_for_selectors(driver, conditions=None, poll_interval=POLL_INTERVAL):
+    """依序等待每個 selector 出現，出現就立刻往下一個
+
+    Returns:
+        dict: {selector: 是否出現}；必要的 selector 超時會拋出 TimeoutError
+    """
+    conditions = conditions or PRODUCT_READY_CONDITIONS
+    results = {}
+    started = time.monotonic()
+
+    for selector, timeout, required in conditions:
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+            results[selector] = True
+        except Exception:
+            results[selector] = False
+            if required:
+                raise TimeoutError(f"等待必要區塊超時（{timeout} 秒）: {selector}")
+            print(f"⚠️ 區塊未出現（略過）: {selector}")
+
+    elapsed = time.monotonic() - started
+    found = sum(results.values())
+    print(f"✅ 頁面就緒: {found}/{len(results)} 個區塊，耗時 {elapsed:.1f} 秒")
+    return results
+
+
+def wait_for_images(driver, selector="div.image-list img", timeout=5, poll_interval=POLL_INTERVAL):
+    """等待圖片清單的 src 都已填入（lazy load 完成）"""
+    script = """
+        const imgs = document.querySelectorAll(arguments[0]);
+        if (!imgs.length) return false;
+        return Array.from(imgs).every(img => img.getAttribute('src'));
+    """
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll_interval).until(
+            lambda d: d.execute_script(script, selector)
+        )
+        return True
+    except Exception:
+        print("⚠️ 部分圖片 src 尚未載入，使用目前內容")
+        return False
+
+
+def wait_for_product_page(driver, conditions=None):
+    """商品頁完整就緒：必要區塊出現 + 觸發一次 lazy load 並等待圖片 src"""
+    results = wait_for_selectors(driver, conditions)
+
+    if results.get("div.image-list img"):
+        # 捲到底觸發 lazy load，再等圖片 src 填入，不做固定秒數的逐段捲動
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        wait_for_images(driver)
+        driver.execute_script("window.scrollTo(0, 0);")
+
+    return results
@@ -0,0 +1,539 @@
+# product_page.py - Daytona Park 商品頁共用解析器（HTML 只解析一次，同時取出所有欄位）
+#
+# 批量上架系統與折扣同步工具各有一份相同的檔案，修改時請兩邊一起更新。
+
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:
+    etree = None
+
+try:
+    from config import PARSER_SETTINGS
+except ImportError:
+    PARSER_SETTINGS = {}
+
+BASE_URL = "https://www.daytona-park.com"
+
+# 讀不到庫存狀態時的顯示文字
+MISSING_STOCK = "尚未擷取到資料"
+
+# 日文顏色 → 中文顏色（建檔系統與折扣同步共用）
+COLOR_DISPLAY_MAP = {
+    "ブラック": "黑色", "ホワイト": "白色", "グレー": "灰色", "チャコールグレー": "鐵灰",
+    "ネイビー": "深藍", "ブルー": "藍色", "ライトブルー": "天空藍", "ベージュ": "奶茶",
+    "ブラウン": "棕色", "カーキ": "卡其", "オリーブ": "軍綠", "グリーン": "綠色",
+    "ダークグリーン": "深綠", "イエロー": "黃色", "マスタード": "奶黃", "オレンジ": "橘色",
+    "レッド": "紅色", "ピンク": "淡粉", "パープル": "紫色", "ワイン": "酒紅",
+    "アイボリー": "象牙白", "シルバー": "銀色", "ゴールド": "金色", "ミント": "薄荷綠",
+    "サックス": "丹寧藍", "モカ": "摩卡", "テラコッタ": "TER", "ラベンダー": "薰衣草紫",
+    "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN",
+    "ライトグレー": "亮灰", "ワインレッド": "酒紅", "サックスブルー": "靛藍"
+}
+
+ITEM_ID_PATTERN = re.compile(r"/item/(\d+)")
+YEN_PATTERN = re.compile(r"([0-9,]+)\s*円")
+DISCOUNT_PATTERN = re.compile(r"(\d+)%\s*OFF")
+
+
+def _text(tag):
+    return tag.get_text(strip=True) if tag else ""
+
+
+def digits_only(text):
+    """「6,296円税込」→「6296」"""
+    return re.sub(r"[^\d]", "", text) if text else ""
+
+
+def yen_amount(text):
+    """「6,296円税込」→ 6296，沒有金額時回傳 0"""
+    match = YEN_PATTERN.search(text or "")
+    return int(match.group(1).replace(",", "")) if match else 0
+
+
+def discount_percent(text):
+    """「10%OFF」→ 10，沒有折扣時回傳 0"""
+    match = DISCOUNT_PATTERN.search(text or "")
+    return int(match.group(1)) if match else 0
+
+
+def extract_item_id(url):
+    """從商品頁 URL 取出商品編號"""
+    match = ITEM_ID_PATTERN.search(str(url or ""))
+    return match.group(1) if match else None
+
+
+def get_parser_backend(backend=None):
+    """實際使用的解析後端：lxml（較快）或 html.parser；沒有安裝 lxml 時改用 html.parser"""
+    backend = backend or PARSER_SETTINGS.get("backend", "lxml")
+    if backend == "lxml" and etree is None:
+        return "html.parser"
+    return backend
+
+
+# ---------- html.parser（BeautifulSoup）後端 ----------
+
+def read_size_table(container):
+    """讀出尺寸表的表頭與各列（container 為尺寸表區塊或其中的 table）
+
+    Returns:
+        (headers, rows)：headers 為第一列的 th 文字，rows 為其後各列的 td 文字（略過空列）
+    """
+    table = container if container is not None and container.name == "table" else (
+        container.select_one("table") if container is not None else None
+    )
+    if table is None:
+        return [], []
+    trs = table.select("tr")
+    if not trs:
+        return [], []
+    headers = [_text(th) for th in trs[0].select("th")]
+    rows = []
+    for tr in trs[1:]:
+        cols = [_text(td) for td in tr.select("td")]
+        if cols:
+            rows.append(cols)
+    return headers, rows
+
+
+def _extract_with_soup(html):
+    soup = BeautifulSoup(html or "", "html.parser")
+    raw = {}
+
+    raw["name"] = _text(soup.select_one(".block-goods-name h1"))
+    raw["heading"] = raw["name"] or _text(soup.find("h1"))
+    raw["brand"] = _text(soup.select_one(".block-goods-brand-name a"))
+    raw["price_text"] = _text(
+        soup.select_one(".block-goods-price--price.price.js-enhanced-ecommerce-goods-price")
+        or soup.select_one(".block-goods-price--price")
+    )
+    raw["default_price_text"] = _text(soup.select_one(".block-goods-price--default-price"))
+    raw["discount_text"] = _text(soup.select_one(".block-goods-price--sale-dratio"))
+
+    variations = []
+    for color_block in soup.select(".block-goods-color-variation-box"):
+        raw_color = _text(color_block.select_one(".block-goods-color-variation-name-text"))
+        sizes = []
+        for box in color_block.select(".block-goods-color-variation-size-stock-box"):
+            size = _text(box.select_one(".block-goods-color-variation-size-value"))
+            stock_tag = box.select_one('[class^="block-goods-stockstatus"]')
+            sizes.append((size, _text(stock_tag) if stock_tag else MISSING_STOCK))
+        variations.append((raw_color, sizes))
+    raw["variations"] = variations
+
+    raw["image_srcs"] = [img.get("src") for img in soup.select("div.image-list img")]
+    main_img_tag = soup.select_one(".block-goods-color-variation-img img")
+    raw["has_main_image"] = main_img_tag is not None
+    raw["main_image_src"] = main_img_tag.get("src") if main_img_tag else None
+
+    size_table_tag = soup.select_one(".block-goods-product-size-table")
+    raw["size_table_html"] = str(size_table_tag) if size_table_tag else ""
+    raw["size_table_headers"], raw["size_table_rows"] = read_size_table(size_table_tag)
+    return raw
+
+
+# ---------- lxml 後端（預先編譯的 XPath） ----------
+
+def _class_test(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if etree is not None:
+    _X_NAME = etree.XPath(f"//*[{_class_test('block-goods-name')}]//h1")
+    _X_FIRST_H1 = etree.XPath("//h1")
+    _X_BRAND = etree.XPath(f"//*[{_class_test('block-goods-brand-name')}]//a")
+    _X_PRICE = etree.XPath(
+        f"//*[{_class_test('block-goods-price--price')} and {_class_test('price')}"
+        f" and {_class_test('js-enhanced-ecommerce-goods-price')}]"
+    )
+    _X_PRICE_LOOSE = etree.XPath(f"//*[{_class_test('block-goods-price--price')}]")
+    _X_DEFAULT_PRICE = etree.XPath(f"//*[{_class_test('block-goods-price--default-price')}]")
+    _X_DISCOUNT = etree.XPath(f"//*[{_class_test('block-goods-price--sale-dratio')}]")
+    _X_COLOR_BOXES = etree.XPath(f"//*[{_class_test('block-goods-color-variation-box')}]")
+    _X_COLOR_NAME = etree.XPath(f".//*[{_class_test('block-goods-color-variation-name-text')}]")
+    _X_SIZE_BOXES = etree.XPath(f".//*[{_class_test('block-goods-color-variation-size-stock-box')}]")
+    _X_SIZE_VALUE = etree.XPath(f".//*[{_class_test('block-goods-color-variation-size-value')}]")
+    _X_STOCK = etree.XPath(".//*[starts-with(normalize-space(@class), 'block-goods-stockstatus')]")
+    _X_IMAGES = etree.XPath(f"//div[{_class_test('image-list')}]//img")
+    _X_MAIN_IMAGE = etree.XPath(f"//*[{_class_test('block-goods-color-variation-img')}]//img")
+    _X_SIZE_TABLE = etree.XPath(f"//*[{_class_test('block-goods-product-size-table')}]")
+    _X_TABLE = etree.XPath(".//table")
+    _X_TR = etree.XPath(".//tr")
+    _X_TH = etree.XPath(".//th")
+    _X_TD = etree.XPath(".//td")
+
+# BeautifulSoup 的 get_text() 不包含這些元素內的文字
+_NON_TEXT_TAGS = {"script", "style", "template"}
+
+
+def _first(node, *xpaths):
+    """依序嘗試各個 XPath，回傳第一個找到的元素"""
+    for xpath in xpaths:
+        found = xpath(node)
+        if found:
+            return found[0]
+    return None
+
+
+def _lxml_strings(el):
+    if not isinstance(el.tag, str) or el.tag in _NON_TEXT_TAGS:
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_text(el):
+    """與 BeautifulSoup 的 get_text(strip=True) 相同的結果"""
+    if el is None:
+        return ""
+    return "".join(part for part in (s.strip() for s in _lxml_strings(el)) if part)
+
+
+# 以下規則與 BeautifulSoup（html.parser）的 str(tag) 輸出一致，讓兩個後端的 size_table_html 完全相同
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+    "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex",
+    "nextid", "spacer",
+}
+_PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+_RAW_TEXT_TAGS = {"script", "style"}
+_MULTI_VALUED_ATTRS = {
+    "*": {"class", "accesskey", "dropzone"},
+    "a": {"rel", "rev"}, "link": {"rel", "rev"}, "td": {"headers"}, "th": {"headers"},
+    "form": {"accept-charset"}, "object": {"archive"}, "area": {"rel"}, "icon": {"sizes"},
+    "iframe": {"sandbox"}, "output": {"for"},
+}
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _quote_attr(value):
+    value = _escape(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', "&quot;") + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+def _serialize_text(text, preserve):
+    if not preserve and not text.strip(_ASCII_SPACES):
+        text = "\n" if "\n" in text else " "
+    return _escape(text)
+
+
+def _serialize(el, preserve=False):
+    if not isinstance(el.tag, str):
+        if el.tag is etree.Comment:
+            return f"<!--{el.text or ''}-->"
+        return ""
+    tag = el.tag
+    multi_valued = _MULTI_VALUED_ATTRS["*"] | _MULTI_VALUED_ATTRS.get(tag, set())
+    attrs = []
+    for key, value in sorted(el.attrib.items()):
+        if key in multi_valued:
+            value = " ".join(value.split())
+        attrs.append(f" {key}={_quote_attr(value)}")
+    if tag in _VOID_TAGS:
+        return f"<{tag}{''.join(attrs)}/>"
+
+    preserve = preserve or tag in _PRESERVE_WHITESPACE_TAGS
+    parts = [f"<{tag}{''.join(attrs)}>"]
+    if el.text:
+        parts.append(el.text if tag in _RAW_TEXT_TAGS else _serialize_text(el.text, preserve))
+    for child in el:
+        parts.append(_serialize(child, preserve))
+        if child.tail:
+            parts.append(_serialize_text(child.tail, preserve))
+    parts.append(f"</{tag}>")
+    return "".join(parts)
+
+
+def _read_size_table_lxml(container):
+    if container is None:
+        return [], []
+    table = container if container.tag == "table" else _first(container, _X_TABLE)
+    if table is None:
+        return [], []
+    trs = _X_TR(table)
+    if not trs:
+        return [], []
+    headers = [_lxml_text(th) for th in _X_TH(trs[0])]
+    rows = []
+    for tr in trs[1:]:
+        cols = [_lxml_text(td) for td in _X_TD(tr)]
+        if cols:
+            rows.append(cols)
+    return headers, rows
+
+
+def _parse_lxml_document(html):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # 含 XML 編碼宣告的字串需以 bytes 解析
+        return lxml.html.document_fromstring(
+            html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+        )
+
+
+def _extract_with_lxml(html):
+    doc = _parse_lxml_document(html)
+    raw = {}
+
+    raw["name"] = _lxml_text(_first(doc, _X_NAME))
+    raw["heading"] = raw["name"] or _lxml_text(_first(doc, _X_FIRST_H1))
+    raw["brand"] = _lxml_text(_first(doc, _X_BRAND))
+    raw["price_text"] = _lxml_text(_first(doc, _X_PRICE, _X_PRICE_LOOSE))
+    raw["default_price_text"] = _lxml_text(_first(doc, _X_DEFAULT_PRICE))
+    raw["discount_text"] = _lxml_text(_first(doc, _X_DISCOUNT))
+
+    variations = []
+    for color_block in _X_COLOR_BOXES(doc):
+        raw_color = _lxml_text(_first(color_block, _X_COLOR_NAME))
+        sizes = []
+        for box in _X_SIZE_BOXES(color_block):
+            size = _lxml_text(_first(box, _X_SIZE_VALUE))
+            stock_tag = _first(box, _X_STOCK)
+            sizes.append((size, _lxml_text(stock_tag) if stock_tag is not None else MISSING_STOCK))
+        variations.append((raw_color, sizes))
+    raw["variations"] = variations
+
+    raw["image_srcs"] = [img.get("src") for img in _X_IMAGES(doc)]
+    main_img_tag = _first(doc, _X_MAIN_IMAGE)
+    raw["has_main_image"] = main_img_tag is not None
+    raw["main_image_src"] = main_img_tag.get("src") if main_img_tag is not None else None
+
+    size_table_tag = _first(doc, _X_SIZE_TABLE)
+    raw["size_table_html"] = _serialize(size_table_tag) if size_table_tag is not None else ""
+    raw["size_table_headers"], raw["size_table_rows"] = _read_size_table_lxml(size_table_tag)
+    return raw
+
+
+# ---------- 解析前裁切 ----------
+
+# 商品資訊只出現在圖片列表與右側商品資訊兩個區塊，其餘大多是頁首、頁尾、推薦商品與 script
+TRIM_BLOCKS = ("image-list", "pane-goods-right-side")
+DETAIL_BLOCK = "block-goods-detail"
+
+# 計算 div 層數時略過註解、script 與 style 內容
+_DIV_TOKEN_PATTERN = re.compile(
+    r"<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>|<(/?)div\b[^>]*>",
+    re.S | re.I
+)
+
+
+def _find_div_block(html, class_name):
+    """找出第一個 class 含 class_name 的 div 的範圍 (start, end)，找不到或標籤不成對時回傳 None"""
+    opening = re.search(
+        rf'<div\b[^>]*\bclass=["\'](?:[^"\']*\s)?{re.escape(class_name)}(?=[\s"\'])', html, re.I
+    )
+    if opening is None:
+        return None
+    depth = 0
+    for token in _DIV_TOKEN_PATTERN.finditer(html, opening.start()):
+        if not token.group().lower().startswith(("<div", "</div")):
+            continue
+        depth += -1 if token.group(1) else 1
+        if depth == 0:
+            return opening.start(), token.end()
+    return None
+
+
+def trim_product_html(html):
+    """只保留商品資訊所在的區塊，交給解析器的 HTML 約為整頁的兩到三成（實測 22–26%）
+
+    找不到圖片列表或右側商品資訊時改用整個商品詳細區塊；連商品詳細區塊都找不到時回傳 None（解析整頁）。
+    """
+    if not html:
+        return None
+    blocks = [_find_div_block(html, name) for name in TRIM_BLOCKS]
+    if all(blocks):
+        blocks.sort()
+        if all(blocks[i][1] <= blocks[i + 1][0] for i in range(len(blocks) - 1)):
+            return "".join(html[start:end] for start, end in blocks)
+    detail = _find_div_block(html, DETAIL_BLOCK)
+    return html[detail[0]:detail[1]] if detail else None
+
+
+# ---------- 瀏覽器端擷取 ----------
+
+# 在頁面 DOM 中直接取出與 _extract_with_soup 相同的欄位，不必把整頁 HTML 傳回 Python 再解析。
+# text() 與 get_text(strip=True) 相同：略過 script/style/template，各段文字去除前後空白後相接。
+EXTRACT_PAGE_SCRIPT = """
+const NON_TEXT = new Set(['SCRIPT', 'STYLE', 'TEMPLATE']);
+function text(el) {
+    if (!el) return '';
+    const parts = [];
+    (function walk(node) {
+        for (const child of node.childNodes) {
+            if (child.nodeType === Node.TEXT_NODE) {
+                const t = child.nodeValue.trim();
+                if (t) parts.push(t);
+            } else if (child.nodeType === Node.ELEMENT_NODE && !NON_TEXT.has(child.tagName.toUpperCase())) {
+                walk(child);
+            }
+        }
+    })(el);
+    return parts.join('');
+}
+const one = (root, selector) => root.querySelector(selector);
+const all = (root, selector) => Array.from(root.querySelectorAll(selector));
+
+const sizeTable = one(document, '.block-goods-product-size-table');
+let headers = [], rows = [];
+if (sizeTable) {
+    const table = sizeTable.tagName === 'TABLE' ? sizeTable : one(sizeTable, 'table');
+    const trs = table ? all(table, 'tr') : [];
+    if (trs.length) {
+        headers = all(trs[0], 'th').map(text);
+        rows = trs.slice(1).map(tr => all(tr, 'td').map(text)).filter(cols => cols.length);
+    }
+}
+const mainImage = one(document, '.block-goods-color-variation-img img');
+
+const name = text(one(document, '.block-goods-name h1'));
+
+return {
+    name: name,
+    heading: name || text(one(document, 'h1')),
+    brand: text(one(document, '.block-goods-brand-name a')),
+    price_text: text(one(document, '.block-goods-price--price.price.js-enhanced-ecommerce-goods-price')
+                     || one(document, '.block-goods-price--price')),
+    default_price_text: text(one(document, '.block-goods-price--default-price')),
+    discount_text: text(one(document, '.block-goods-price--sale-dratio')),
+    variations: all(document, '.block-goods-color-variation-box').map(box => [
+        text(one(box, '.block-goods-color-variation-name-text')),
+        all(box, '.block-goods-color-variation-size-stock-box').map(sizeBox => {
+            const stock = one(sizeBox, '[class^="block-goods-stockstatus"]');
+            return [text(one(sizeBox, '.block-goods-color-variation-size-value')), stock ? text(stock) : null];
+        })
+    ]),
+    image_srcs: all(document, 'div.image-list img').map(img => img.getAttribute('src')),
+    has_main_image: Boolean(mainImage),
+    main_image_src: mainImage ? mainImage.getAttribute('src') : null,
+    size_table_html: sizeTable ? sizeTable.outerHTML : '',
+    size_table_headers: headers,
+    size_table_rows: rows
+};
+"""
+
+
+def extract_product_page(driver, url=None):
+    """在瀏覽器中執行 EXTRACT_PAGE_SCRIPT，回傳與 parse_product_page 相同格式的 dict；失敗時回傳 None
+
+    size_table_html 為瀏覽器的 outerHTML，屬性順序與跳脫方式可能與 parse_product_page 不同。
+    """
+    try:
+        raw = driver.execute_script(EXTRACT_PAGE_SCRIPT)
+    except Exception as e:
+        print(f"⚠️ 頁面內擷取商品資料失敗: {e}")
+        return None
+    if not isinstance(raw, dict):
+        return None
+    raw["variations"] = [
+        (raw_color, [(size, MISSING_STOCK if stock is None else stock) for size, stock in sizes])
+        for raw_color, sizes in raw.get("variations") or []
+    ]
+    return _build_page(raw, url or getattr(driver, "current_url", None))
+
+
+def read_product_page(driver, url=None):
+    """讀取瀏覽器目前的商品頁：預設在頁面中直接擷取，停用或擷取不到商品名稱時改為解析 page_source"""
+    if PARSER_SETTINGS.get("browser_extract", True):
+        page = extract_product_page(driver, url)
+        if page is not None and page["name"]:
+            return page
+    return parse_product_page(driver.page_source, url)
+
+
+# ---------- 共用 ----------
+
+def _extract(html, backend):
+    if get_parser_backend(backend) == "lxml" and html and html.strip():
+        return _extract_with_lxml(html)
+    return _extract_with_soup(html)
+
+
+def parse_product_page(html, url=None, backend=None, trim=None):
+    """解析商品頁，一次取出名稱、品牌、價格、折扣、顏色/尺寸/庫存、圖片與尺寸表
+
+    Args:
+        backend: "lxml" 或 "html.parser"，預設依 PARSER_SETTINGS；兩者結果相同（見 test_parser_parity.py）
+        trim: 是否只解析商品資訊區塊（trim_product_html），預設依 PARSER_SETTINGS
+
+    Returns:
+        dict:
+            name, brand
+            heading         商品名稱；頁面沒有 .block-goods-name 時為第一個 h1 的文字
+            price_text, default_price_text, discount_text   原始文字
+            price, default_price                            只保留數字的字串（「6296」）
+            current_price, original_price, discount_pct     數值（沒有時為 0）
+            variations      [{'raw_color', 'color', 'sizes': [(size, stock_status)]}]，依頁面順序
+            stocks          [(size, color, stock_status)]，依頁面順序，color 為中文顯示顏色
+            raw_colors      {中文顯示顏色: 原始日文顏色}
+            images, main_image
+            size_table_html, size_table_headers, size_table_rows
+            item_id
+    """
+    raw = None
+    if trim if trim is not None else PARSER_SETTINGS.get("trim", True):
+        trimmed = trim_product_html(html)
+        if trimmed:
+            raw = _extract(trimmed, backend)
+            if not raw["name"] or not raw["variations"]:
+                # 頁面結構與預期不同（裁切後缺少名稱或顏色/尺寸），改解析整頁
+                raw = None
+    if raw is None:
+        raw = _extract(html, backend)
+    return _build_page(raw, url)
+
+
+def _build_page(raw, url):
+    page = {
+        "name": raw["name"],
+        "heading": raw.get("heading") or raw["name"],
+        "brand": raw["brand"],
+        "price_text": raw["price_text"],
+        "default_price_text": raw["default_price_text"],
+        "discount_text": raw["discount_text"],
+    }
+    page["price"] = digits_only(page["price_text"])
+    page["default_price"] = digits_only(page["default_price_text"])
+    page["current_price"] = yen_amount(page["price_text"])
+    page["original_price"] = yen_amount(page["default_price_text"])
+    page["discount_pct"] = discount_percent(page["discount_text"])
+
+    variations = []
+    stocks = []
+    raw_colors = {}
+    for raw_color, sizes in raw["variations"]:
+        color = COLOR_DISPLAY_MAP.get(raw_color, raw_color)
+        raw_colors[color] = raw_color
+        variations.append({"raw_color": raw_color, "color": color, "sizes": sizes})
+        stocks.extend((size, color, stock_status) for size, stock_status in sizes)
+    page["variations"] = variations
+    page["stocks"] = stocks
+    page["raw_colors"] = raw_colors
+
+    page["images"] = [urljoin(BASE_URL, src) for src in raw["image_srcs"] if src]
+    page["main_image"] = urljoin(BASE_URL, raw["main_image_src"]) if raw["has_main_image"] else ""
+
+    page["size_table_html"] = raw["size_table_html"]
+    page["size_table_headers"] = raw["size_table_headers"]
+    page["size_table_rows"] = raw["size_table_rows"]
+
+    page["item_id"] = extract_item_id(url)
+    return page
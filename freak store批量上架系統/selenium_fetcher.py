@@ -1,139 +1,73 @@
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
 import random
 import os
 import base64
 
+from browser_pool import get_browser_pool, accept_cookie_consent
+from page_readiness import wait_for_product_page
+from html_parser import evaluate_page_quality
+from product_page import extract_product_page
+
+# WebDriver 預設的非同步腳本超時（秒），讀不到瀏覽器目前的設定時使用
+DEFAULT_SCRIPT_TIMEOUT = 30
+
 def fetch_html_from_url(url, save_path="page_source.html", wait_seconds=15):
     print("🧭 開始載入頁面：", url)
 
-    # 設定 Firefox 選項
-    options = Options()
-    #options.add_argument("--headless")  # 如果需要看到瀏覽器，註釋這行
-    
-    # 反反爬蟲設定
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--window-size=1920,1080")
-    
-    # 模擬真實瀏覽器
-    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    
-    # 禁用一些可能干擾的功能
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-plugins")
-    options.add_argument("--disable-images")  # 加快載入速度
-    
-    # 設定偏好
-    options.set_preference("dom.webdriver.enabled", False)
-    options.set_preference("useAutomationExtension", False)
-    options.set_preference("javascript.enabled", True)
-
+    # 從瀏覽器池借用已暖機的瀏覽器（Cookie 已在暖機時同意）
+    pool = get_browser_pool()
     driver = None
+    failed = False
     
     try:
-        # 初始化 WebDriver
-        print("🔧 初始化 Firefox WebDriver...")
-        driver = webdriver.Firefox(options=options)
-        
-        # 隱藏webdriver特徵
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        # 設定超時
-        driver.set_page_load_timeout(45)
-        driver.implicitly_wait(15)
+        driver = pool.acquire()
         
         # 直接訪問目標頁面
         print(f"🎯 直接訪問目標頁面: {url}")
         driver.get(url)
         
-        # 等待基本載入
-        time.sleep(5)
-        
         # 檢查是否被重定向
         current_url = driver.current_url
         print(f"📍 當前URL: {current_url}")
         
         if "daytona-park.com" not in current_url:
             print("⚠️ 頁面被重定向，可能遇到反爬蟲機制")
-            
-        # 處理Cookie同意
-        try:
-            print("🍪 尋找並點擊Cookie同意按鈕...")
-            
-            # 多種可能的Cookie按鈕選擇器
-            cookie_selectors = [
-                "#consentButton",
-                ".consent-button",
-                "[data-consent]",
-                "button[class*='consent']",
-                "button[class*='cookie']",
-                "button[class*='agree']"
-            ]
-            
-            for selector in cookie_selectors:
-                try:
-                    consent_button = WebDriverWait(driver, 3).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    driver.execute_script("arguments[0].click();", consent_button)
-                    print(f"✅ Cookie按鈕點擊成功: {selector}")
-                    time.sleep(2)
-                    break
-                except:
-                    continue
-                    
-        except:
-            print("🍪 未找到Cookie按鈕，繼續...")
 
-        # 等待頁面完全載入
-        print("⏳ 等待頁面完全載入...")
-        
-        # 使用多種方式等待
-        try:
-            WebDriverWait(driver, 20).until(
-                lambda d: d.execute_script("return document.readyState") == "complete"
-            )
-            print("✅ 頁面readyState完成")
-        except:
-            print("⚠️ 頁面readyState等待超時")
-        
-        # 額外等待動態內容
-        time.sleep(8)
-        
-        # 尋找商品內容
-        print("🔍 尋找商品內容...")
+        # 等待商品頁必要區塊出現（取代固定秒數等待與逐段捲動）
+        print("⏳ 等待商品區塊載入...")
         product_found = False
+        try:
+            wait_for_product_page(driver)
+            product_found = True
+        except TimeoutError as wait_error:
+            print(f"⚠️ {wait_error}")
+            print("🔍 尋找商品內容...")
         
-        # 多種商品名稱選擇器
-        name_selectors = [
-            ".block-goods-name",
-            ".goods-name",
-            ".product-name",
-            ".item-name",
-            ".product-title",
-            "h1",
-            ".title"
-        ]
+        if not product_found:
+            # 多種商品名稱選擇器
+            name_selectors = [
+                ".block-goods-name",
+                ".goods-name",
+                ".product-name",
+                ".item-name",
+                ".product-title",
+                "h1",
+                ".title"
+            ]
         
-        for selector in name_selectors:
-            try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for element in elements:
-                    text = element.text.strip()
-                    if text and len(text) > 5:  # 有意義的文字
-                        print(f"✅ 找到商品名稱 ({selector}): {text[:50]}...")
-                        product_found = True
+            for selector in name_selectors:
+                try:
+                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
+                    for element in elements:
+                        text = element.text.strip()
+                        if text and len(text) > 5:  # 有意義的文字
+                            print(f"✅ 找到商品名稱 ({selector}): {text[:50]}...")
+                            product_found = True
+                            break
+                    if product_found:
                         break
-                if product_found:
-                    break
-            except:
-                continue
+                except:
+                    continue
         
         if not product_found:
             print("⚠️ 未找到明確的商品名稱，檢查其他內容...")
@@ -158,36 +92,6 @@ def fetch_html_from_url(url, save_path="page_source.html", wait_seconds=15):
                 except:
                     continue
 
-        # 智能滾動載入更多內容
-        print("📜 滾動頁面載入完整內容...")
-        try:
-            # 模擬人類滾動行為
-            scroll_pause_time = 2
-            screen_height = driver.execute_script("return window.screen.height;")
-            
-            i = 1
-            while True:
-                # 滾動一個螢幕高度
-                driver.execute_script(f"window.scrollTo(0, {screen_height}*{i});")
-                i += 1
-                time.sleep(scroll_pause_time)
-                
-                # 檢查是否到達底部
-                scroll_height = driver.execute_script("return document.body.scrollHeight;")
-                if (screen_height) * i > scroll_height:
-                    break
-                    
-                # 最多滾動5次
-                if i > 5:
-                    break
-            
-            # 滾回頂部
-            driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(3)
-            
-        except Exception as scroll_error:
-            print(f"⚠️ 滾動失敗: {scroll_error}")
-
         # 獲取最終HTML
         page_source = driver.page_source
         
@@ -197,15 +101,7 @@ def fetch_html_from_url(url, save_path="page_source.html", wait_seconds=15):
         print(f"📄 頁面內容長度: {len(page_source):,} 字符")
         
         # 內容質量檢查
-        quality_indicators = {
-            'daytona': 'daytona' in page_source.lower(),
-            'product/item': any(word in page_source.lower() for word in ['product', 'item', 'goods']),
-            'price/cost': any(word in page_source.lower() for word in ['price', 'cost', 'yen', '円']),
-            'size': any(word in page_source.lower() for word in ['size', 'サイズ', 'cm']),
-            'image': 'img' in page_source.lower()
-        }
-        
-        quality_score = sum(quality_indicators.values())
+        quality_score, quality_indicators = evaluate_page_quality(page_source)
         print(f"📊 內容質量評分: {quality_score}/5")
         
         for indicator, found in quality_indicators.items():
@@ -223,6 +119,7 @@ def fetch_html_from_url(url, save_path="page_source.html", wait_seconds=15):
         return page_source
 
     except Exception as e:
+        failed = True
         print(f"❌ 爬取過程發生錯誤: {e}")
         
         # 錯誤時也嘗試獲取部分內容
@@ -242,11 +139,60 @@ def fetch_html_from_url(url, save_path="page_source.html", wait_seconds=15):
 
     finally:
         if driver:
-            try:
-                driver.quit()
-                print("🛑 頁面抓取完成，已自動關閉瀏覽器視窗 (driver.quit)")
-            except:
-                pass
+            # 出錯的瀏覽器狀態不明，丟棄；正常的歸還給下一個商品使用
+            pool.release(driver, discard=failed)
+            print("🔁 頁面抓取完成，瀏覽器已歸還瀏覽器池")
+
+def fetch_page_from_url(url, save_path="page_source.html"):
+    """在瀏覽器中載入商品頁並直接擷取商品資料（不傳回整頁 HTML）
+
+    Returns:
+        {'page': parse_product_page 格式的商品資料}；頁面內擷取不到商品名稱時改為回傳已載入頁面的
+        {'html': page_source}（不必再載入一次）；抓取失敗時回傳 None
+    """
+    print("🧭 開始載入頁面：", url)
+
+    pool = get_browser_pool()
+    driver = None
+    failed = False
+
+    try:
+        driver = pool.acquire()
+        driver.get(url)
+
+        current_url = driver.current_url
+        if "daytona-park.com" not in current_url:
+            print(f"⚠️ 頁面被重定向，可能遇到反爬蟲機制: {current_url}")
+
+        print("⏳ 等待商品區塊載入...")
+        try:
+            wait_for_product_page(driver)
+        except TimeoutError as wait_error:
+            print(f"⚠️ {wait_error}")
+
+        page = extract_product_page(driver, url)
+        if page is not None and page["name"]:
+            print(f"✅ 已在頁面中擷取商品資料: {page['name'][:50]}（{len(page['stocks'])} 個尺寸/顏色，{len(page['images'])} 張圖片）")
+            return {'page': page}
+
+        print("↪️ 頁面中找不到商品名稱，改為取得完整 HTML")
+        page_source = driver.page_source
+        if not page_source:
+            return None
+        with open(save_path, "w", encoding="utf-8") as f:
+            f.write(page_source)
+        print(f"💾 HTML已儲存至: {save_path}")
+        return {'html': page_source}
+
+    except Exception as e:
+        failed = True
+        print(f"❌ 爬取過程發生錯誤: {e}")
+        return None
+
+    finally:
+        if driver:
+            pool.release(driver, discard=failed)
+            print("🔁 頁面抓取完成，瀏覽器已歸還瀏覽器池")
 
 def download_images_via_selenium(driver, image_urls, save_folder, product_name, batch_size=10):
     """使用 Selenium session 並行下載圖片
@@ -382,55 +328,28 @@ def fetch_html_and_download_images(url, image_save_folder, product_name, save_pa
     """整合版：爬取 HTML 並下載圖片（不關閉瀏覽器直到完成）"""
     print("🧭 開始載入頁面並下載圖片：", url)
     
-    # 設定 Firefox 選項
-    options = Options()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    options.set_preference("dom.webdriver.enabled", False)
-    options.set_preference("useAutomationExtension", False)
-    options.set_preference("javascript.enabled", True)
-    
+    pool = get_browser_pool()
     driver = None
+    failed = False
     
     try:
-        print("🔧 初始化 Firefox WebDriver...")
-        driver = webdriver.Firefox(options=options)
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        driver.set_page_load_timeout(45)
-        driver.set_script_timeout(300)  # 增加腳本超時時間以支援大量圖片下載
-        driver.implicitly_wait(15)
+        driver = pool.acquire()
+        # 增加腳本超時時間以支援大量圖片下載，歸還前改回原本的設定
+        try:
+            script_timeout = driver.timeouts.script
+        except Exception:
+            script_timeout = DEFAULT_SCRIPT_TIMEOUT
+        driver.set_script_timeout(300)
         
         print(f"🎯 直接訪問目標頁面: {url}")
         driver.get(url)
-        time.sleep(5)
         
-        # 處理 Cookie 同意
-        try:
-            print("🍪 尋找並點擊Cookie同意按鈕...")
-            cookie_selectors = ["#consentButton", ".consent-button", "[data-consent]"]
-            for selector in cookie_selectors:
-                try:
-                    consent_button = WebDriverWait(driver, 3).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    driver.execute_script("arguments[0].click();", consent_button)
-                    print(f"✅ Cookie按鈕點擊成功: {selector}")
-                    time.sleep(2)
-                    break
-                except:
-                    continue
-        except:
-            print("🍪 未找到Cookie按鈕，繼續...")
+        # 暖機時通常已同意過 Cookie，這裡只做保險
+        accept_cookie_consent(driver, timeout=1)
         
-        # 等待頁面完全載入
-        print("⏳ 等待頁面完全載入...")
-        WebDriverWait(driver, 20).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
-        )
-        time.sleep(5)
+        # 等待商品頁必要區塊出現
+        print("⏳ 等待商品區塊載入...")
+        wait_for_product_page(driver)
         
         # 獲取 HTML
         page_source = driver.page_source
@@ -471,6 +390,7 @@ def fetch_html_and_download_images(url, image_save_folder, product_name, save_pa
             }
         
     except Exception as e:
+        failed = True
         print(f"❌ 錯誤: {e}")
         import traceback
         traceback.print_exc()
@@ -478,11 +398,14 @@ def fetch_html_and_download_images(url, image_save_folder, product_name, save_pa
 
     finally:
         if driver:
-            try:
-                driver.quit()
-                print("🛑 WebDriver已關閉")
-            except:
-                pass
+            if not failed:
+                try:
+                    driver.set_script_timeout(script_timeout)
+                except Exception:
+                    # 無法還原設定的瀏覽器不放回池中，避免下一個商品沿用 300 秒的腳本超時
+                    failed = True
+            pool.release(driver, discard=failed)
+            print("🔁 WebDriver已歸還瀏覽器池")
 
 # 測試函數
 def test_enhanced_crawl():
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+測試：lxml 與 html.parser 兩個解析後端、以及裁切前後，對同一個商品頁的結果必須完全相同
+
+用法：
+    python test_parser_parity.py [HTML 檔案 ...]
+預設使用 page_source.html 與折扣同步工具的 debug_product_page.html
+"""
+
+import os
+import sys
+import time
+
+# 添加模組路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import product_page
+from product_page import parse_product_page, get_parser_backend, trim_product_html
+from html_parser import parse_html_to_data
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = [
+    os.path.join(SCRIPT_DIR, "page_source.html"),
+    os.path.join(SCRIPT_DIR, "..", "freakstore折扣同步", "debug_product_page.html"),
+]
+TEST_URL = "https://www.daytona-park.com/item/3232375300006?color=33"
+
+
+def _timed(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def _diff_keys(expected, actual):
+    keys = set(expected) | set(actual)
+    return sorted(k for k in keys if expected.get(k) != actual.get(k))
+
+
+def check_fixture(path):
+    with open(path, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    print(f"📄 {os.path.basename(path)} ({len(html) // 1024} KB)")
+    ok = True
+
+    trimmed = trim_product_html(html)
+    if trimmed:
+        print(f"   ✂️ 裁切後 {len(trimmed) // 1024} KB（{len(trimmed) * 100 // len(html)}%）")
+    else:
+        print("   ⚠️ 找不到商品資訊區塊，解析整頁")
+
+    full_page, full_time = _timed(lambda: parse_product_page(html, TEST_URL, backend="html.parser", trim=False))
+    for backend in ("html.parser", "lxml"):
+        page, elapsed = _timed(lambda: parse_product_page(html, TEST_URL, backend=backend, trim=True))
+        diff = _diff_keys(full_page, page)
+        if diff:
+            ok = False
+            print(f"   ❌ parse_product_page（{backend}，裁切）不一致欄位: {diff}")
+        else:
+            print(f"   ✅ parse_product_page（{backend}，裁切）一致 {elapsed:.3f}s（整頁 html.parser {full_time:.3f}s）")
+
+    lxml_page = parse_product_page(html, TEST_URL, backend="lxml", trim=False)
+    diff = _diff_keys(full_page, lxml_page)
+    if diff:
+        ok = False
+        print(f"   ❌ parse_product_page（lxml，整頁）不一致欄位: {diff}")
+    else:
+        print("   ✅ parse_product_page（lxml，整頁）一致")
+
+    original_settings = dict(product_page.PARSER_SETTINGS)
+    try:
+        product_page.PARSER_SETTINGS["backend"] = "html.parser"
+        soup_data = parse_html_to_data(html)
+        product_page.PARSER_SETTINGS["backend"] = "lxml"
+        lxml_data = parse_html_to_data(html)
+    finally:
+        product_page.PARSER_SETTINGS.clear()
+        product_page.PARSER_SETTINGS.update(original_settings)
+    diff = _diff_keys(soup_data, lxml_data)
+    if diff:
+        ok = False
+        print(f"   ❌ parse_html_to_data 不一致欄位: {diff}")
+    else:
+        print("   ✅ parse_html_to_data 一致")
+    return ok
+
+
+def main():
+    if get_parser_backend("lxml") != "lxml":
+        print("⚠️ 未安裝 lxml，無法比對")
+        return 1
+
+    paths = sys.argv[1:] or [p for p in DEFAULT_FIXTURES if os.path.exists(p)]
+    if not paths:
+        print("⚠️ 找不到測試用的 HTML 檔案")
+        return 1
+
+    print("=" * 60)
+    print("🧪 測試：商品頁解析後端一致性")
+    print("=" * 60)
+    results = [check_fixture(path) for path in paths]
+    print()
+    if all(results):
+        print(f"✅ 全部 {len(results)} 個頁面一致")
+        return 0
+    print(f"❌ {results.count(False)} 個頁面不一致")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,7 @@ a = Analysis(
         # 如果有 config.py，也包含它
         ('/Users/chenyanxiang/Desktop/discount_update/config.py', '.'),
     ],
-    hiddenimports=['freak_stock_fetcher'],
+    hiddenimports=['freak_stock_fetcher', 'retry_policy', 'easystore_client', 'parallel_sync', 'session_cookies', 'mapping_cache', 'variant_catalog', 'sync_state', 'product_page', 'page_cache', 'lxml.etree', 'lxml.html'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
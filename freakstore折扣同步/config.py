@@ -10,3 +10,71 @@ API_HEADERS = {
     "Content-Type": "application/json"
 }
 BASE_API = f"https://{STORE_URL}.easy.co/api/3.0"
+
+# 重試設定（指數退避 + 隨機抖動，伺服器有 Retry-After 時以它為準）
+RETRY_SETTINGS = {
+    "attempts": 3,                # 總嘗試次數
+    "base_delay": 1.0,            # 第一次重試前最多等待秒數，之後每次加倍
+    "max_delay": 30.0,            # 單次等待上限（秒）
+    "max_retry_after": 120.0      # Retry-After 等待上限（秒）
+}
+
+# EasyStore API 設定（共用連線 + 令牌桶限流）
+EASYSTORE_API_SETTINGS = {
+    "requests_per_second": 4,     # 平均每秒請求數
+    "burst": 8,                   # 允許的突發請求數
+    "low_remaining": 2,           # 剩餘額度低於此值時主動等待重置
+    "pool_size": 10,              # 連線池大小
+    "timeout": 30                 # 請求超時（秒）
+}
+
+# 折扣同步設定
+DISCOUNT_SYNC_SETTINGS = {
+    "variant_workers": 6          # 同一商品同時更新的變體數（實際速率仍受上方限流控制）
+}
+
+# 會員頁 HTTP 抓取設定（使用瀏覽器匯出的 Cookie，失效時改回瀏覽器）
+MEMBER_HTTP_SETTINGS = {
+    "enabled": True,
+    "cookie_jar": "~/.freak_store_cache/freak_session_cookies.json",   # Cookie 檔位置（僅本人可讀）
+    "timeout": 20,                # HTTP 請求超時（秒）
+    "export_interval": 600        # 瀏覽器至少每隔幾秒才重新匯出一次 Cookie
+}
+
+# SKU 對照表快取（xlsx 沒變時直接載入編譯好的索引）
+MAPPING_CACHE_SETTINGS = {
+    "enabled": True,
+    "cache_dir": "cache"          # 快取資料夾
+}
+
+# EasyStore 變體索引（variant_catalog.py，SQLite）
+VARIANT_CATALOG_SETTINGS = {
+    "enabled": True,
+    "db_path": "variant_catalog.db",  # 索引資料庫位置
+    "page_size": 50,              # 每頁商品數
+    "workers": 4,                 # 同時抓取的頁數（實際速率仍受 EASYSTORE_API_SETTINGS 限流控制）
+    "full_sync_days": 7,          # 距上次完整同步超過此天數時改為完整同步，移除已刪除的商品/變體
+    "refresh_before_sync": True   # 每次批次同步前先增量更新
+}
+
+# 頁面變動偵測（sync_state.py）
+SYNC_STATE_SETTINGS = {
+    "path": "sync_state.json",    # 每個 URL 的頁面指紋
+    "max_age_hours": 168,         # 超過此時間沒有實際同步的 URL 即使未變動也重新同步
+    "flush_seconds": 30           # 同步紀錄每隔幾秒寫入一次檔案，批次結束時一定寫入
+}
+
+# 商品頁解析（product_page.py）
+PARSER_SETTINGS = {
+    "backend": "lxml",            # lxml（較快）或 html.parser；未安裝 lxml 時自動改用 html.parser
+    "trim": True,                 # 只解析圖片列表與商品資訊區塊，找不到時解析整頁
+    "browser_extract": True       # 瀏覽器抓取時直接在頁面中擷取商品資料，不傳回整頁 HTML
+}
+
+# 商品頁快取（page_cache.py，兩個工具共用同一個資料夾）
+PAGE_CACHE_SETTINGS = {
+    "enabled": True,
+    "cache_dir": "~/.freak_store_cache",
+    "ttl_hours": 12,              # 抓過的頁面在此時間內直接使用快取（只有批量上架系統使用）
+    "max_age_days": 7             # 超過此天數沒有更新的快取檔自動刪除
+}
@@ -4,15 +4,20 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
 import time
 import logging
 import os
 import tempfile
 import hashlib
+import threading
+
+from session_cookies import export_session_cookies
+from product_page import parse_product_page, read_product_page
+from page_cache import get_page_cache
 
 # 全域變數
 _driver = None
+_driver_create_lock = threading.Lock()
 
 # ===== 統一的顏色處理邏輯（以建檔系統為準） =====
 COLOR_MAP = {
@@ -26,18 +31,6 @@ COLOR_MAP = {
     "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN"
 }
 
-# 新增：日文顏色 → 中文顏色（與建檔系統一致）
-COLOR_DISPLAY_MAP = {
-    "ブラック": "黑色", "ホワイト": "白色", "グレー": "灰色", "チャコールグレー": "鐵灰",
-    "ネイビー": "深藍", "ブルー": "藍色", "ライトブルー": "天空藍", "ベージュ": "奶茶",
-    "ブラウン": "棕色", "カーキ": "卡其", "オリーブ": "軍綠", "グリーン": "綠色",
-    "ダークグリーン": "深綠", "イエロー": "黃色", "マスタード": "奶黃", "オレンジ": "橘色",
-    "レッド": "紅色", "ピンク": "淡粉", "パープル": "紫色", "ワイン": "酒紅",
-    "アイボリー": "象牙白", "シルバー": "銀色", "ゴールド": "金色", "ミント": "薄荷綠",
-    "サックス": "丹寧藍", "モカ": "摩卡", "テラコッタ": "TER", "ラベンダー": "薰衣草紫",
-    "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN",
-    "ライトグレー": "亮灰", "ワインレッド": "酒紅", "サックスブルー": "靛藍"
-}
 
 def simplify_product_name(name):
     return ''.join([c[0].upper() for c in name if '\u4e00' <= c <= '\u9fff' or c.isalpha()])
@@ -74,7 +67,20 @@ def setup_firefox_session():
             pass
     
     print("DEBUG: 創建新瀏覽器")
-    
+    _driver = create_browser_session()
+    return _driver
+
+def create_browser_session(profile_dir=None):
+    """啟動一個新的 Chrome 瀏覽器並導航到會員頁
+
+    Args:
+        profile_dir: 瀏覽器設定檔資料夾；並行同步時每個瀏覽器各自一個，Cookie 互不干擾
+    """
+    # undetected_chromedriver 啟動時會修補 driver 檔案，同時啟動多個會互相衝突
+    with _driver_create_lock:
+        return _create_chrome_driver(profile_dir)
+
+def _create_chrome_driver(profile_dir=None):
     try:
         # 創建 Chrome 選項 (修正版 - 根據建議)
         options = uc.ChromeOptions()
@@ -112,15 +118,16 @@ def setup_firefox_session():
         options.add_experimental_option('useAutomationExtension', False)
         
         # 創建 Chrome 驅動程式 (修正版)
-        _driver = uc.Chrome(
+        driver = uc.Chrome(
             options=options,
             version_main=137,        # 你目前使用的 Chrome 主版本
                     # ✅ 修正：不使用 headless（如果需要 headless，設為 True）
-            use_subprocess=True
+            use_subprocess=True,
+            user_data_dir=profile_dir
         )
         
         # 執行 JavaScript 來隱藏自動化特徵
-        _driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
             'source': '''
                 Object.defineProperty(navigator, 'webdriver', {
                     get: () => undefined
@@ -138,10 +145,10 @@ def setup_firefox_session():
         })
         
         # 設置等待時間
-        _driver.implicitly_wait(10)
+        driver.implicitly_wait(10)
         
         # 設置視窗大小
-        _driver.set_window_size(1200, 800)
+        driver.set_window_size(1200, 800)
         
         print("✅ Chrome 瀏覽器啟動成功")
         
@@ -149,10 +156,10 @@ def setup_firefox_session():
         try:
             login_url = "https://www.daytona-park.com/mypage"
             print(f"正在導航到登入頁面: {login_url}")
-            _driver.get(login_url)
+            driver.get(login_url)
             
             # 等待頁面載入
-            WebDriverWait(_driver, 10).until(
+            WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
@@ -164,7 +171,7 @@ def setup_firefox_session():
         except Exception as e:
             print(f"⚠️ 導航到登入頁面失敗: {e}")
         
-        return _driver
+        return driver
         
     except Exception as e:
         print(f"❌ Chrome 啟動失敗: {e}")
@@ -205,11 +212,13 @@ def setup_firefox_session():
                 "profile.password_manager_enabled": False
             }
             chrome_options.add_experimental_option("prefs", prefs)
+            if profile_dir:
+                chrome_options.add_argument(f'--user-data-dir={profile_dir}')
             
-            _driver = webdriver.Chrome(options=chrome_options)
+            driver = webdriver.Chrome(options=chrome_options)
             
             # 執行反偵測 JavaScript
-            _driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
                 'source': '''
                     Object.defineProperty(navigator, 'webdriver', {
                         get: () => undefined
@@ -217,22 +226,23 @@ def setup_firefox_session():
                 '''
             })
             
-            _driver.implicitly_wait(10)
-            _driver.set_window_size(1200, 800)
+            driver.implicitly_wait(10)
+            driver.set_window_size(1200, 800)
             
             # 導航到登入頁面
-            _driver.get("https://www.daytona-park.com/mypage")
+            driver.get("https://www.daytona-park.com/mypage")
             
             print("✅ 標準 Chrome WebDriver 啟動成功")
-            return _driver
+            return driver
             
         except Exception as e2:
             print(f"❌ 標準 Chrome 也失敗: {e2}")
             raise Exception(f"無法啟動 Chrome 瀏覽器: {e}")
 
-def login_with_credentials(email, password):
-    """使用帳號密碼自動登入 Freak Store"""
-    driver = setup_firefox_session()
+def login_with_credentials(email, password, driver=None):
+    """使用帳號密碼自動登入 Freak Store（未指定 driver 時使用全域瀏覽器）"""
+    if driver is None:
+        driver = setup_firefox_session()
     
     try:
         # 確保在登入頁面
@@ -322,6 +332,7 @@ def login_with_credentials(email, password):
         current_url = driver.current_url
         if "mypage" in current_url or "member" in current_url:
             print("✅ 登入成功")
+            export_session_cookies(driver, force=True)
             return True
         else:
             print("❌ 登入可能失敗，請檢查帳號密碼")
@@ -345,17 +356,36 @@ def cleanup_firefox_session():
         finally:
             _driver = None
 
-def get_freak_product_info(url):
-    """獲取 Freak Store 商品資訊 (使用與建檔系統相同的顏色處理邏輯)"""
-    driver = setup_firefox_session()
-    
-    if not _driver:
+def close_browser_session(driver):
+    """關閉非全域的瀏覽器（並行同步的工作瀏覽器）"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def refresh_session_cookies(credentials=None, driver=None):
+    """HTTP 抓取發現 Cookie 失效時呼叫：讓瀏覽器重新登入並匯出新的 Cookie"""
+    if driver is None:
         driver = setup_firefox_session()
-    else:
-        driver = _driver
-    
-    # 初始化商品資訊
-    product_info = {
+    if credentials:
+        return login_with_credentials(credentials[0], credentials[1], driver)
+
+    # 沒有帳密時，瀏覽器本身可能仍是登入狀態，重新整理會員頁後直接匯出
+    try:
+        driver.get("https://www.daytona-park.com/mypage")
+        WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+        if "login" in driver.current_url or "auth" in driver.current_url:
+            return False
+        return export_session_cookies(driver, force=True)
+    except Exception as e:
+        print(f"⚠️ 重新匯出 Cookie 失敗: {e}")
+        return False
+
+def new_product_info():
+    """空白的商品資訊結構"""
+    return {
         'product_name': '',
         'color': '',
         'size': '',
@@ -365,6 +395,68 @@ def get_freak_product_info(url):
         'stocks': [],
         'raw_colors': {}  # 新增：存储每个中文颜色对应的原始日文颜色
     }
+
+def parse_freak_product_html(html, url):
+    """從商品頁 HTML 解析商品資訊（HTTP 抓取使用）"""
+    # 共用解析器只解析一次 HTML，這裡只負責轉成折扣同步使用的格式；頁面內容未變時沿用快取的解析結果
+    cache = get_page_cache()
+    page = cache.parse(url, html) if cache is not None else parse_product_page(html, url)
+    return product_info_from_page(page)
+
+def product_info_from_page(page):
+    """把 parse_product_page / 瀏覽器端擷取的結果轉成折扣同步使用的格式"""
+    product_info = new_product_info()
+
+    # 1. 商品名稱（折扣同步只需要辨識商品，頁面結構改變時退回第一個 h1）
+    product_info['product_name'] = page['name'] or page.get('heading', '')
+
+    # 2. 價格資訊
+    discounted_price = page['current_price']
+    original_price = page['original_price']
+    # 如果沒有原價但有折扣後價格，則將原價設為折扣後價格
+    if original_price == 0 and discounted_price > 0:
+        original_price = discounted_price
+    discount_pct = page['discount_pct']
+    # 如果有原價和折扣價但沒有折扣率，從價差計算
+    if original_price > discounted_price and discount_pct == 0:
+        discount_pct = round((original_price - discounted_price) / original_price * 100, 1)
+    product_info['current_price'] = discounted_price
+    product_info['original_price'] = original_price
+    product_info['discount_pct'] = discount_pct
+
+    # 3. 顏色和庫存資訊 (使用與建檔系統相同的邏輯)
+    product_info['raw_colors'] = dict(page['raw_colors'])
+    product_info['stocks'] = list(page['stocks'])
+    # 如果有庫存資訊，使用第一個作為預設顏色和尺寸
+    if product_info['stocks']:
+        first_size, first_color, _ = product_info['stocks'][0]
+        product_info['size'] = first_size
+        product_info['color'] = first_color
+
+    # 4. 從URL提取商品ID作為SKU基礎
+    if page['item_id']:
+        product_info['item_id'] = page['item_id']
+
+    print("="*50)
+    print("📋 最終解析結果:")
+    for key, value in product_info.items():
+        print(f"   {key}: {value}")
+    print("="*50)
+
+    return product_info
+
+def get_freak_product_info(url, driver=None, credentials=None):
+    """獲取 Freak Store 商品資訊 (使用與建檔系統相同的顏色處理邏輯)
+
+    Args:
+        driver: 指定使用的瀏覽器（並行同步時每個工作執行緒各自一個），預設為全域瀏覽器
+        credentials: (email, password)；登入失效時自動重新登入，不等待手動輸入
+    """
+    if driver is None:
+        driver = setup_firefox_session()
+    
+    # 初始化商品資訊
+    product_info = new_product_info()
     
     try:
         print(f"正在訪問: {url}")
@@ -384,9 +476,12 @@ def get_freak_product_info(url):
         if "login" in driver.current_url or "auth" in driver.current_url:
             print("⚠️ 登入狀態已失效，需要重新登入")
             
-            # 嘗試等待使用者手動登入
-            print("請在瀏覽器中手動登入...")
-            input("登入完成後，按 Enter 繼續...")
+            if credentials:
+                login_with_credentials(credentials[0], credentials[1], driver)
+            else:
+                # 嘗試等待使用者手動登入
+                print("請在瀏覽器中手動登入...")
+                input("登入完成後，按 Enter 繼續...")
             
             # 重新訪問商品頁面
             driver.get(url)
@@ -404,133 +499,11 @@ def get_freak_product_info(url):
             # 找不到登入按鈕，可能已經登入
             pass
         
-        # 取得頁面 HTML
-        html = driver.page_source
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # 1. 解析商品名稱
-        try:
-            title_elem = soup.find('h1')
-            if title_elem:
-                product_info['product_name'] = title_elem.get_text().strip()
-                print(f"✅ 商品名稱: {product_info['product_name']}")
-        except Exception as e:
-            print(f"解析商品名稱失敗: {e}")
-        
-        # 2. 解析價格資訊
-        try:
-            price_tag = soup.select_one(".block-goods-price--price")
-            default_price_tag = soup.select_one(".block-goods-price--default-price")
-            discount_tag = soup.select_one(".block-goods-price--sale-dratio")
-            
-            def extract_price(text):
-                if not text:
-                    return 0
-                import re
-                match = re.search(r"([0-9,]+)\s*円", text)
-                if match:
-                    return int(match.group(1).replace(",", ""))
-                return 0
-            
-            # 解析折扣價（當前價格）
-            discounted_price = extract_price(price_tag.get_text(strip=True) if price_tag else "")
-            
-            # 解析原價
-            original_price = extract_price(default_price_tag.get_text(strip=True) if default_price_tag else "")
-            
-            # 如果沒有原價但有折扣後價格，則將原價設為折扣後價格
-            if original_price == 0 and discounted_price > 0:
-                original_price = discounted_price
-            
-            # 解析折扣率
-            discount_pct = 0
-            if discount_tag:
-                discount_text = discount_tag.get_text(strip=True)
-                import re
-                match = re.search(r"(\d+)%\s*OFF", discount_text)
-                if match:
-                    discount_pct = int(match.group(1))
-            
-            # 如果有原價和折扣價但沒有折扣率，從價差計算
-            if original_price > discounted_price and discount_pct == 0:
-                discount_pct = round((original_price - discounted_price) / original_price * 100, 1)
-            
-            # 設定解析結果
-            product_info['current_price'] = discounted_price
-            product_info['original_price'] = original_price
-            product_info['discount_pct'] = discount_pct
-            
-            print(f"✅ 原價: {product_info['original_price']}")
-            print(f"✅ 現價: {product_info['current_price']}")
-            print(f"✅ 折扣: {product_info['discount_pct']}%")
-                
-        except Exception as e:
-            print(f"解析價格失敗: {e}")
-            product_info['current_price'] = 0
-            product_info['original_price'] = 0
-            product_info['discount_pct'] = 0
-        
-        # 3. 解析顏色和庫存資訊 (使用與建檔系統相同的邏輯)
-        try:
-            print("🔍 開始解析顏色和庫存資訊...")
-            
-            # 使用與建檔系統完全相同的邏輯
-            color_blocks = soup.select(".block-goods-color-variation-box")
-            stocks = []
-            
-            for color_block in color_blocks:
-                color_tag = color_block.select_one(".block-goods-color-variation-name-text")
-                # 先讀出原始日文顏色
-                raw_color = color_tag.get_text(strip=True) if color_tag else ""
-                # 再對照映射表轉成中文，找不到就保留原文
-                display_color = COLOR_DISPLAY_MAP.get(raw_color, raw_color)
-                # 存储映射關係
-                product_info['raw_colors'][display_color] = raw_color
-                
-                size_boxes = color_block.select(".block-goods-color-variation-size-stock-box")
-                for box in size_boxes:
-                    size_tag = box.select_one(".block-goods-color-variation-size-value")
-                    stock_tag = box.select_one('[class^="block-goods-stockstatus"]')
-                    size = size_tag.get_text(strip=True) if size_tag else ""
-                    stock_status = stock_tag.get_text(strip=True) if stock_tag else "尚未擷取到資料"
-                    
-                    stocks.append((size, display_color, stock_status))
-            
-            product_info['stocks'] = stocks
-            
-            # 如果有庫存資訊，使用第一個作為預設顏色和尺寸
-            if stocks:
-                first_size, first_color, _ = stocks[0]
-                product_info['size'] = first_size
-                product_info['color'] = first_color
-                print(f"✅ 顏色: {first_color}")
-                print(f"✅ 尺寸: {first_size}")
-            
-            print(f"✅ 庫存組合: {stocks}")
-                
-        except Exception as e:
-            print(f"解析顏色和庫存失敗: {e}")
-            # 設定預設值
-            product_info['color'] = 'ブラック'
-            product_info['size'] = 'ONE SIZE'
-            product_info['stocks'] = [('ONE SIZE', 'ブラック', '')]
-        
-        # 4. 從URL提取商品ID作為SKU基礎
-        try:
-            import re
-            url_match = re.search(r'/item/(\d+)', url)
-            if url_match:
-                item_id = url_match.group(1)
-                print(f"✅ 商品ID: {item_id}")
-                product_info['item_id'] = item_id
-        except Exception as e:
-            print(f"提取商品ID失敗: {e}")
+        # 直接在頁面中擷取商品資料，不必傳回整頁 HTML 再解析
+        product_info = product_info_from_page(read_product_page(driver, url))
         
-        print("="*50)
-        print("📋 最終解析結果:")
-        for key, value in product_info.items():
-            print(f"   {key}: {value}")
-        print("="*50)
+        # 瀏覽器目前是登入狀態，順便更新 HTTP 抓取用的 Cookie
+        export_session_cookies(driver)
         
         return product_info
         
@@ -1,4 +1,3 @@
-import re
 import os
 import sys
 import time
@@ -6,9 +5,10 @@ import hashlib
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
-from bs4 import BeautifulSoup
 import warnings
 import requests
+from retry_policy import RetryPolicy
+from product_page import parse_product_page
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # ─── 判斷執行路徑 ───
@@ -54,52 +54,55 @@ def fetch_html_from_url(url, wait=10):
     opts.add_argument("--headless")
     opts.set_preference("intl.accept_languages","ja-JP,ja")
     driver = webdriver.Firefox(options=opts)
-    driver.get(url)
-    time.sleep(wait)
-    html = driver.page_source
-    driver.quit()
-    return html
+    try:
+        driver.get(url)
+        time.sleep(wait)
+        return driver.page_source
+    finally:
+        driver.quit()
+
+def fetch_html_with_retry(url, wait=10):
+    """抓取失敗（逾時、瀏覽器異常、空白頁）時依重試策略退避後再試"""
+    policy = RetryPolicy()
+    for attempt in range(policy.attempts):
+        try:
+            html = fetch_html_from_url(url, wait)
+            if html and "block-goods-name" in html:
+                return html
+            error = "頁面內容不完整"
+        except Exception as e:
+            error = e
+        if attempt == policy.attempts - 1:
+            raise RuntimeError(f"抓取失敗: {url} | {error}")
+        delay = policy.sleep(attempt)
+        print(f"🔁 抓取失敗（{error}），{delay:.1f} 秒後重試: {url}")
     
 def parse_html_to_data(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    page = parse_product_page(html)
     data = {}
     # 商品名称
-    name_tag = soup.select_one(".block-goods-name h1")
-    data["name"] = name_tag.get_text(strip=True) if name_tag else ""
+    data["name"] = page["name"]
     # 折后价
-    price_tag = soup.select_one(".block-goods-price--price.price.js-enhanced-ecommerce-goods-price")
-    data["price"] = re.sub(r"[^\d]", "", price_tag.get_text(strip=True)) if price_tag else ""
+    data["price"] = page["price"]
     # 原价
-    default_price_tag = soup.select_one(".block-goods-price--default-price")
-    data["default_price"] = re.sub(r"[^\d]", "", default_price_tag.get_text(strip=True)) if default_price_tag else ""
-    # SKU 列表
-    generated_skus = []
-    color_blocks = soup.select(".block-goods-color-variation-box")
-    for color_block in color_blocks:
-        color = color_block.select_one(".block-goods-color-variation-name-text").get_text(strip=True)
-        for box in color_block.select(".block-goods-color-variation-size-stock-box"):
-            size = box.select_one(".block-goods-color-variation-size-value").get_text(strip=True)
-            # 这里假设你已有 generate_sku() 方法
-            sku = generate_sku(data["name"], color, size)
-            generated_skus.append({"Freak SKU": sku})
-    data["skus"] = generated_skus
+    data["default_price"] = page["default_price"]
+    # SKU 列表（以原始日文顏色生成）
+    data["skus"] = [
+        {"Freak SKU": generate_sku(data["name"], variation["raw_color"], size)}
+        for variation in page["variations"]
+        for size, _ in variation["sizes"]
+    ]
     return data
 
 def parse_html_to_stock_table(html):
-    soup = BeautifulSoup(html,"html.parser")
-    pname = soup.select_one(".block-goods-name h1")
-    product_name = pname.get_text(strip=True) if pname else "UNKNOWN"
+    page = parse_product_page(html)
+    product_name = page["name"] or "UNKNOWN"
     rows = []
-    for color_block in soup.select(".block-goods-color-variation-box"):
-        color = (color_block.select_one(".block-goods-color-variation-name-text")
-                 .get_text(strip=True))
-        for box in color_block.select(".block-goods-color-variation-size-stock-box"):
-            size = box.select_one(".block-goods-color-variation-size-value").get_text(strip=True)
-            status = box.select_one('[class^="block-goods-stockstatus"]').get_text(strip=True)
-            qty = STOCK_MAP.get(status, "")
+    for variation in page["variations"]:
+        for size, status in variation["sizes"]:
             rows.append({
-                "Freak SKU": generate_sku(product_name, color, size),
-                "庫存數量": qty
+                "Freak SKU": generate_sku(product_name, variation["raw_color"], size),
+                "庫存數量": STOCK_MAP.get(status, "")
             })
     return rows
 
@@ -113,7 +116,7 @@ def fetch_all_stock(tracked_urls_path: str="tracked_urls.txt",
     # 2️⃣ 逐一抓取
     all_rows = []
     for url in urls:
-        html = fetch_html_from_url(url)
+        html = fetch_html_with_retry(url)
         rows = parse_html_to_stock_table(html)
         all_rows.extend(rows)
 
@@ -0,0 +1,127 @@
+# mapping_cache.py - SKU 對照表（xlsx）的編譯快取，啟動時不必每次用 openpyxl 解析
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+try:
+    from config import MAPPING_CACHE_SETTINGS
+except ImportError:
+    MAPPING_CACHE_SETTINGS = {}
+
+# 快取內容格式改變時加一，舊快取自動失效
+CACHE_VERSION = 2
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _cache_path(source_paths):
+    cache_dir = MAPPING_CACHE_SETTINGS.get("cache_dir", "cache")
+    key = hashlib.sha1("|".join(os.path.abspath(p) for p in source_paths).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"sku_mapping_{key}.pickle")
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _write_cache(cache_path, cached):
+    folder = os.path.dirname(cache_path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _sources_match(cached_sources, source_paths):
+    """檢查來源檔是否沒變
+
+    大小與修改時間都相同就直接採用；只有修改時間不同（例如重新複製檔案）時
+    再比對 sha256，內容相同仍可使用快取。
+
+    Returns:
+        (是否可用, 是否需要更新快取中的修改時間)
+    """
+    if len(cached_sources) != len(source_paths):
+        return False, False
+    touched = False
+    for cached, path in zip(cached_sources, source_paths):
+        current = _source_stat(path)
+        if cached['path'] != current['path'] or cached['size'] != current['size']:
+            return False, False
+        if cached['mtime_ns'] != current['mtime_ns']:
+            if _file_sha256(path) != cached['sha256']:
+                return False, False
+            cached['mtime_ns'] = current['mtime_ns']
+            touched = True
+    return True, touched
+
+
+def load_mapping_tables(source_paths, build):
+    """讀取 SKU 對照表，來源 xlsx 沒變時直接從快取載入
+
+    Args:
+        source_paths: 來源 xlsx 路徑列表
+        build: build(*source_paths) -> dict，實際解析 xlsx 並建立索引
+
+    Returns:
+        dict: build() 的結果
+    """
+    if not MAPPING_CACHE_SETTINGS.get("enabled", True):
+        return build(*source_paths)
+
+    cache_path = _cache_path(source_paths)
+    cached = _read_cache(cache_path)
+    if cached is not None:
+        try:
+            usable, touched = _sources_match(cached['sources'], source_paths)
+        except OSError:
+            usable, touched = False, False
+        if usable:
+            logging.info(f"從快取載入 SKU 對照表: {cache_path}")
+            if touched:
+                _write_cache(cache_path, cached)
+            return cached['tables']
+
+    # 先記錄來源狀態再解析，解析期間檔案被改動時下次會重新建立
+    sources = []
+    for path in source_paths:
+        stat = _source_stat(path)
+        stat['sha256'] = _file_sha256(path)
+        sources.append(stat)
+
+    tables = build(*source_paths)
+    try:
+        _write_cache(cache_path, {'version': CACHE_VERSION, 'sources': sources, 'tables': tables})
+        logging.info(f"已建立 SKU 對照表快取: {cache_path}")
+    except OSError as e:
+        logging.warning(f"無法寫入 SKU 對照表快取: {e}")
+    return tables
@@ -0,0 +1,101 @@
+# parallel_sync.py - 多個已登入瀏覽器並行同步折扣
+
+import queue
+import shutil
+import tempfile
+import threading
+
+from firefox_session import create_browser_session, login_with_credentials, close_browser_session
+
+
+class ParallelDiscountSync:
+    """以多個瀏覽器並行處理 URL 佇列
+
+    - 每個工作執行緒擁有自己的瀏覽器與設定檔資料夾（Cookie 互不干擾），各自登入
+    - 所有 URL 放進同一個佇列，哪個瀏覽器有空就處理下一個
+    - 某個瀏覽器啟動或登入失敗時，剩下的 URL 由其他瀏覽器接手
+    - 結果依原本的 URL 順序返回
+    """
+
+    def __init__(self, syncer, workers, email, password, on_result=None, on_log=None):
+        self.syncer = syncer
+        self.workers = max(1, int(workers))
+        self.credentials = (email, password)
+        self.on_result = on_result    # on_result(index, result)：每個 URL 完成時呼叫（工作執行緒上）
+        self.on_log = on_log or print
+
+        self._stop = threading.Event()
+
+    def stop(self):
+        """處理完目前的 URL 後停止"""
+        self._stop.set()
+
+    def _start_browser(self, worker_no):
+        profile_dir = tempfile.mkdtemp(prefix=f"freak_sync_worker{worker_no}_")
+        try:
+            driver = create_browser_session(profile_dir)
+        except Exception:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise
+        if not login_with_credentials(*self.credentials, driver=driver):
+            close_browser_session(driver)
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            raise RuntimeError("會員登入失敗")
+        return driver, profile_dir
+
+    def _worker(self, worker_no, jobs, results, apply_additional_discount, skip_unchanged):
+        try:
+            driver, profile_dir = self._start_browser(worker_no)
+        except Exception as e:
+            self.on_log(f"[瀏覽器 {worker_no}] 啟動失敗，改由其他瀏覽器處理: {e}")
+            return
+        self.on_log(f"[瀏覽器 {worker_no}] 已登入，開始處理")
+
+        try:
+            while not self._stop.is_set():
+                try:
+                    index, url = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    result = self.syncer.sync_discount(
+                        url, apply_additional_discount, driver=driver, credentials=self.credentials,
+                        skip_unchanged=skip_unchanged
+                    )
+                except Exception as e:
+                    result = {'success': False, 'url': url, 'error': str(e)}
+                results[index] = result
+                if self.on_result:
+                    self.on_result(index, result)
+        finally:
+            close_browser_session(driver)
+            shutil.rmtree(profile_dir, ignore_errors=True)
+
+    def run(self, urls, apply_additional_discount=False, skip_unchanged=False):
+        """同步所有 URL，全部完成後依原順序返回結果"""
+        jobs = queue.Queue()
+        for index, url in enumerate(urls):
+            jobs.put((index, url))
+        results = [None] * len(urls)
+
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(n + 1, jobs, results, apply_additional_discount, skip_unchanged),
+                name=f"discount-sync-{n + 1}",
+                daemon=True
+            )
+            for n in range(min(self.workers, len(urls)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 所有瀏覽器都無法啟動，或中途停止時，未處理的 URL 記為失敗
+        for index, url in enumerate(urls):
+            if results[index] is None:
+                results[index] = {'success': False, 'url': url, 'error': '未處理（沒有可用的瀏覽器或已停止）'}
+                if self.on_result:
+                    self.on_result(index, results[index])
+        return results
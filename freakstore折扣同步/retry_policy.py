@@ -0,0 +1,152 @@
+# retry_policy.py - 對外 HTTP 請求共用的重試策略（指數退避 + 隨機抖動 + Retry-After）
+#
+# 批量上架系統與折扣同步工具各有一份相同的檔案，修改時請兩邊一起更新。
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    from config import RETRY_SETTINGS
+except ImportError:
+    RETRY_SETTINGS = {}
+
+# 值得重試的狀態碼：逾時、限流與暫時性的伺服器錯誤
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# 非冪等請求（POST 建立商品）只在確定伺服器沒處理時重試
+NON_IDEMPOTENT_RETRYABLE_STATUS_CODES = {429}
+
+# 例外類別名稱（requests / httpx / urllib3 / 內建），避免強制依賴任一套件
+_CONNECT_ERROR_NAMES = {
+    "ConnectTimeout", "ConnectError", "NewConnectionError", "NameResolutionError",
+    "ConnectionRefusedError", "gaierror",
+}
+_TRANSIENT_ERROR_NAMES = _CONNECT_ERROR_NAMES | {
+    "ConnectionError", "Timeout", "ReadTimeout", "ReadError", "WriteTimeout", "WriteError",
+    "PoolTimeout", "RemoteProtocolError", "ProtocolError", "ChunkedEncodingError",
+    "ConnectionResetError", "TimeoutError", "TimeoutException", "NetworkError",
+}
+
+
+def _exception_chain(exc):
+    """列出例外本身與其 cause / context / reason（urllib3 會包好幾層）"""
+    seen = []
+    stack = [exc]
+    while stack:
+        current = stack.pop()
+        if current is None or any(current is s for s in seen):
+            continue
+        seen.append(current)
+        stack.extend([
+            getattr(current, "__cause__", None),
+            getattr(current, "__context__", None),
+            getattr(current, "reason", None) if isinstance(getattr(current, "reason", None), BaseException) else None,
+        ])
+        stack.extend(arg for arg in getattr(current, "args", ()) if isinstance(arg, BaseException))
+    return seen
+
+
+def _has_error_named(exc, names):
+    return any(
+        cls.__name__ in names
+        for err in _exception_chain(exc)
+        for cls in type(err).__mro__
+    )
+
+
+def is_connect_error(exc):
+    """請求尚未送達伺服器的錯誤（連線失敗、DNS 失敗、連線逾時）"""
+    return _has_error_named(exc, _CONNECT_ERROR_NAMES)
+
+
+def is_transient_error(exc):
+    """網路層的暫時性錯誤"""
+    return _has_error_named(exc, _TRANSIENT_ERROR_NAMES)
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時回傳 None"""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """重試策略
+
+    - 指數退避加上 full jitter：第 n 次重試等待 0 ~ min(max_delay, base_delay * 2^n) 秒
+    - 伺服器有給 Retry-After 時以它為準（上限 max_retry_after）
+    - idempotent=False 時只在 429 或連線根本沒建立時重試，避免重複建立商品
+    """
+
+    def __init__(self, attempts=None, base_delay=None, max_delay=None, max_retry_after=None,
+                 retry_statuses=None, idempotent=True):
+        self.attempts = max(1, int(attempts or RETRY_SETTINGS.get("attempts", 3)))
+        self.base_delay = RETRY_SETTINGS.get("base_delay", 1.0) if base_delay is None else base_delay
+        self.max_delay = RETRY_SETTINGS.get("max_delay", 30.0) if max_delay is None else max_delay
+        self.max_retry_after = RETRY_SETTINGS.get("max_retry_after", 120.0) if max_retry_after is None else max_retry_after
+        self.idempotent = idempotent
+        if retry_statuses is None:
+            retry_statuses = RETRYABLE_STATUS_CODES if idempotent else NON_IDEMPOTENT_RETRYABLE_STATUS_CODES
+        self.retry_statuses = set(retry_statuses)
+
+    def should_retry_status(self, status_code):
+        return status_code in self.retry_statuses
+
+    def should_retry_exception(self, exc):
+        if self.idempotent:
+            return is_transient_error(exc)
+        return is_connect_error(exc)
+
+    def compute_delay(self, attempt, retry_after=None):
+        """第 attempt 次（從 0 開始）失敗後應等待的秒數"""
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def sleep(self, attempt, retry_after=None):
+        delay = self.compute_delay(attempt, retry_after)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def async_sleep(self, attempt, retry_after=None):
+        delay = self.compute_delay(attempt, retry_after)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def call(self, send, description="請求"):
+        """執行 send()（回傳 requests / httpx 的 response），依策略重試
+
+        最後一次仍失敗時回傳最後的 response，或拋出最後的例外。
+        """
+        for attempt in range(self.attempts):
+            is_last = attempt == self.attempts - 1
+            try:
+                response = send()
+            except Exception as e:
+                if is_last or not self.should_retry_exception(e):
+                    raise
+                delay = self.sleep(attempt)
+                print(f"🔁 {description}失敗（{type(e).__name__}），{delay:.1f} 秒後重試 ({attempt + 2}/{self.attempts})")
+                continue
+
+            if is_last or not self.should_retry_status(response.status_code):
+                return response
+            delay = self.sleep(attempt, response.headers.get("Retry-After"))
+            print(f"🔁 {description}回應 HTTP {response.status_code}，{delay:.1f} 秒後重試 ({attempt + 2}/{self.attempts})")
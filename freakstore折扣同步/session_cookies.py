@@ -0,0 +1,186 @@
+# session_cookies.py - 把已登入瀏覽器的 Cookie 存成檔案，讓 HTTP 直接抓會員價頁面
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+
+from retry_policy import RetryPolicy
+
+try:
+    from config import MEMBER_HTTP_SETTINGS
+except ImportError:
+    MEMBER_HTTP_SETTINGS = {}
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
+LOGIN_PATH = "/auth/login"
+
+_export_lock = threading.Lock()
+_last_export = 0.0
+
+
+class SessionExpired(Exception):
+    """會員登入已失效（被導向登入頁）"""
+
+
+def get_cookie_jar_path():
+    # Cookie 等同登入憑證，預設放在使用者資料夾而不是工作目錄（專案資料夾）
+    return os.path.expanduser(MEMBER_HTTP_SETTINGS.get("cookie_jar", "~/.freak_store_cache/freak_session_cookies.json"))
+
+
+def export_session_cookies(driver, force=False):
+    """把瀏覽器目前的 Cookie 寫入 Cookie 檔
+
+    非 force 時最多每 export_interval 秒寫一次，避免每個商品都寫檔。
+    """
+    global _last_export
+    with _export_lock:
+        interval = MEMBER_HTTP_SETTINGS.get("export_interval", 600)
+        if not force and time.monotonic() - _last_export < interval:
+            return False
+        try:
+            cookies = driver.get_cookies()
+            try:
+                user_agent = driver.execute_script("return navigator.userAgent;")
+            except Exception:
+                user_agent = DEFAULT_USER_AGENT
+        except Exception as e:
+            print(f"⚠️ 無法讀取瀏覽器 Cookie: {e}")
+            return False
+
+        path = get_cookie_jar_path()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, mode=0o700, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        # 只有本人可讀寫
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "user_agent": user_agent, "cookies": cookies}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        _last_export = time.monotonic()
+        print(f"🍪 已匯出 {len(cookies)} 個會員 Cookie")
+        return True
+
+
+def load_cookie_jar(path=None):
+    """讀取 Cookie 檔，不存在或格式錯誤時回傳 None"""
+    path = path or get_cookie_jar_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_login_redirect(response):
+    """回應（含重定向過程）是否落在登入頁"""
+    for r in list(response.history) + [response]:
+        if urlparse(r.url).path.startswith(LOGIN_PATH):
+            return True
+        if LOGIN_PATH in (r.headers.get("Location") or ""):
+            return True
+    return False
+
+
+class MemberPageFetcher:
+    """使用瀏覽器匯出的 Cookie，以 HTTP 直接抓取會員價商品頁
+
+    發現登入失效時，透過 relogin() 讓瀏覽器重新登入並重新匯出 Cookie；
+    同一時間只會有一個執行緒重新登入，且每次抓取最多重新登入一次。
+    """
+
+    def __init__(self, relogin=None, cookie_jar_path=None, timeout=None):
+        self.relogin = relogin    # relogin() -> bool：讓瀏覽器重新登入並匯出 Cookie
+        self.cookie_jar_path = cookie_jar_path or get_cookie_jar_path()
+        self.timeout = timeout or MEMBER_HTTP_SETTINGS.get("timeout", 20)
+
+        self._lock = threading.Lock()
+        self._generation = 0      # 每次重新載入 Cookie 加一，避免多個執行緒重複重新登入
+        self._session = None
+        self._jar_mtime = None
+
+    def available(self):
+        """有 Cookie 檔時才走 HTTP"""
+        return os.path.exists(self.cookie_jar_path)
+
+    def _build_session(self):
+        jar = load_cookie_jar(self.cookie_jar_path)
+        if not jar or not jar.get("cookies"):
+            return None
+        session = requests.Session()
+        session.headers.update({
+            "User-Agent": jar.get("user_agent") or DEFAULT_USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "ja-JP,ja;q=0.9",
+        })
+        for cookie in jar["cookies"]:
+            session.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain"), path=cookie.get("path", "/")
+            )
+        return session
+
+    def _current_session(self):
+        """取得目前的 session；Cookie 檔被其他流程更新時自動重新載入"""
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self.cookie_jar_path)
+            except OSError:
+                mtime = None
+            if self._session is None or mtime != self._jar_mtime:
+                self._session = self._build_session()
+                self._jar_mtime = mtime
+                self._generation += 1
+            return self._session, self._generation
+
+    def _relogin_once(self, seen_generation, relogin):
+        """重新登入（若其他執行緒已經處理過就直接使用新的 Cookie）"""
+        with self._lock:
+            if self._generation != seen_generation:
+                return True
+            if not relogin:
+                return False
+            print("🔑 會員 Cookie 已失效，重新登入瀏覽器...")
+            try:
+                ok = relogin()
+            except Exception as e:
+                print(f"⚠️ 重新登入失敗: {e}")
+                ok = False
+            self._session = self._build_session() if ok else None
+            self._jar_mtime = os.path.getmtime(self.cookie_jar_path) if ok and os.path.exists(self.cookie_jar_path) else None
+            self._generation += 1
+            return ok and self._session is not None
+
+    def _get(self, session, url):
+        return RetryPolicy().call(
+            lambda: session.get(url, timeout=self.timeout, allow_redirects=True),
+            description="會員頁面 HTTP 抓取"
+        )
+
+    def fetch(self, url, relogin=None):
+        """抓取商品頁 HTML；登入失效且重新登入後仍失效時拋出 SessionExpired
+
+        relogin 可指定這次要用哪個瀏覽器重新登入（並行同步時各工作執行緒不同）。
+        """
+        session, generation = self._current_session()
+        if session is None:
+            raise SessionExpired("沒有可用的會員 Cookie")
+
+        response = self._get(session, url)
+        if is_login_redirect(response):
+            if not self._relogin_once(generation, relogin or self.relogin):
+                raise SessionExpired("會員登入已失效")
+            session, _ = self._current_session()
+            response = self._get(session, url)
+            if is_login_redirect(response):
+                raise SessionExpired("重新登入後仍被導向登入頁")
+
+        response.raise_for_status()
+        return response.text
@@ -10,6 +10,28 @@ import os
 import config
 import hashlib
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from easystore_client import get_easystore_client
+from session_cookies import MemberPageFetcher, SessionExpired
+from mapping_cache import load_mapping_tables
+from variant_catalog import get_variant_catalog
+from sync_state import SyncStateStore, product_fingerprint
+from product_page import extract_item_id
+
+try:
+    from config import DISCOUNT_SYNC_SETTINGS
+except ImportError:
+    DISCOUNT_SYNC_SETTINGS = {}
+
+try:
+    from config import MEMBER_HTTP_SETTINGS
+except ImportError:
+    MEMBER_HTTP_SETTINGS = {}
+
+try:
+    from config import VARIANT_CATALOG_SETTINGS
+except ImportError:
+    VARIANT_CATALOG_SETTINGS = {}
 
 # 如果是 PyInstaller/Frozen 打包后运行，文件会被解到 sys._MEIPASS
 if getattr(sys, 'frozen', False):
@@ -66,6 +88,29 @@ def generate_sku(product_name, color, size):
     hash_part = short_hash(f"{product_name}-{color}-{size}")
     return f"{prefix}-{hash_part}-{color_code}-{size}"
 
+# 依庫存組合猜不到 SKU 時，用主要顏色搭配的常用尺寸
+COMMON_SIZES = ["S", "M", "L", "XL", "ONE SIZE"]
+
+def normalize_product_name(name):
+    """比對用的商品名稱：忽略大小寫、空白與連字號"""
+    return re.sub(r"[\s\-_]+", "", str(name or "")).lower()
+
+def generate_sku_candidates(product_info):
+    """依建檔系統規則一次產生所有候選 SKU（依優先順序、不重複）
+
+    先用每個庫存組合的原始日文顏色，再用主要顏色搭配常用尺寸。
+    """
+    name = product_info['product_name']
+    raw_colors = product_info.get('raw_colors', {})
+    candidates = [
+        generate_sku(name, raw_colors.get(display_color, display_color), size)
+        for size, display_color, _ in product_info.get('stocks', [])
+    ]
+    main_color = product_info['color']
+    raw_main_color = raw_colors.get(main_color, main_color)
+    candidates += [generate_sku(name, raw_main_color, size) for size in COMMON_SIZES]
+    return list(dict.fromkeys(candidates))
+
 def resource_path(relative_path):
     """ 获取资源的绝对路径 """
     # 打印出当前工作目录和相对路径
@@ -100,99 +145,254 @@ def resource_path(relative_path):
 
 class FreakDiscountSyncer:
     def __init__(self, sku_mapping_file='sku_variant_mapping.xlsx', sku_reference_file='sku_reference-2.xlsx'):
+        # 共用連線與限流的 EasyStore API 客戶端
+        self.easystore = get_easystore_client()
+
+        # 以瀏覽器匯出的會員 Cookie 直接用 HTTP 抓商品頁，失敗時才交給瀏覽器
+        self.member_fetcher = MemberPageFetcher() if MEMBER_HTTP_SETTINGS.get("enabled", True) else None
+
+        # 從 EasyStore 同步下來的變體索引（variant_catalog.py），優先於手動維護的 xlsx
+        self.catalog = get_variant_catalog()
+        # 本次執行成功更新過索引時，索引中的售價才能用來判斷變體價格是否未變動
+        self.catalog_fresh = False
+
+        # 每個 URL 上次同步成功時的頁面指紋，頁面沒變動時可略過
+        self.sync_state = SyncStateStore()
+
         # 讀取主要 SKU 映射
         # 使用 resource_path 获取文件路径
         sku_mapping_path = resource_path(sku_mapping_file)
         sku_reference_path = resource_path(sku_reference_file)
-        
-        # 使用绝对路径读取文件
-        logging.info(f"读取映射文件: {sku_mapping_path}")
-        self.variant_df = pd.read_excel(sku_mapping_path, engine='openpyxl')
+
+        # xlsx 沒變時直接從快取載入，不必每次用 openpyxl 解析
+        tables = load_mapping_tables([sku_mapping_path, sku_reference_path], self._build_mapping_tables)
+        self.variant_df = tables['variant_df']
+        self.ref_df = tables['ref_df']
+        self.sku_map = tables['sku_map']
+        self.sku_index = tables['sku_index']
+        self.item_skus = tables['item_skus']
+        self.name_skus = tables['name_skus']
         logging.info(f"variant mapping 列名: {self.variant_df.columns.tolist()}")
-        
-        logging.info(f"读取参考文件: {sku_reference_path}")
-        self.ref_df = pd.read_excel(sku_reference_path, engine='openpyxl')
         logging.info(f"reference mapping 列名: {self.ref_df.columns.tolist()}")
-        
-        
-        # 首先从 sku_reference-2.xlsx 创建映射
-        self.sku_map = dict(zip(
-          self.ref_df['Freak SKU（請填入）'].astype(str).str.strip(),
-          self.ref_df['EasyStore SKU'].astype(str).str.strip()
-        ))
-        
-        # 然后从 variant_df 添加映射 (如果 SKU 列同时作为 Freak SKU 和 Easy SKU)
-        for _, row in self.variant_df.iterrows():
-            if pd.notna(row.get('SKU')):
-                sku = str(row['SKU']).strip()
-                self.sku_map[sku] = sku  # 同一个 SKU 直接映射到自己
-        
         logging.info(f"已載入 {len(self.sku_map)} 個 Freak→Easy SKU 映射")
+        logging.info(f"已建立 {len(self.sku_index)} 個 SKU 索引")
         
         print(">>> sku_variant_mapping.xlsx dtypes:\n", self.variant_df.dtypes)
         print(">>> sku_variant_mapping.xlsx SKU head(10):\n", self.variant_df['SKU'].astype(str).head(10))
 
-    def get_freak_product_info(self, url):
-        """從 Freak Store 網頁抓取商品資訊 (使用 Firefox 會員模式)"""
-        from firefox_session import get_freak_product_info
-        return get_freak_product_info(url)
+    def get_freak_product_info(self, url, driver=None, credentials=None):
+        """從 Freak Store 網頁抓取商品資訊 (使用 Firefox 會員模式)
+
+        有會員 Cookie 時先以 HTTP 抓取（不必等瀏覽器渲染），
+        Cookie 失效、抓取失敗或解析不到庫存時改用瀏覽器。
+        """
+        from firefox_session import get_freak_product_info, parse_freak_product_html, refresh_session_cookies
+
+        if self.member_fetcher and self.member_fetcher.available():
+            try:
+                html = self.member_fetcher.fetch(
+                    url, relogin=lambda: refresh_session_cookies(credentials, driver)
+                )
+                product_info = parse_freak_product_html(html, url)
+                if product_info.get('product_name') and product_info.get('stocks'):
+                    return product_info
+                print("⚠️ HTTP 抓取的頁面缺少商品資料，改用瀏覽器")
+            except SessionExpired as e:
+                print(f"⚠️ {e}，改用瀏覽器")
+            except Exception as e:
+                print(f"⚠️ HTTP 抓取失敗（{type(e).__name__}: {e}），改用瀏覽器")
+
+        return get_freak_product_info(url, driver=driver, credentials=credentials)
             
     def calculate_easy_discount(self, freak_discount_pct):
         """根據規則計算Easy Store折扣百分比"""
         return freak_discount_pct
 
+    @classmethod
+    def _build_mapping_tables(cls, sku_mapping_path, sku_reference_path):
+        """解析兩個 xlsx 並建立 SKU 映射與索引（結果會被快取）"""
+        # 使用绝对路径读取文件
+        logging.info(f"读取映射文件: {sku_mapping_path}")
+        variant_df = pd.read_excel(sku_mapping_path, engine='openpyxl')
+
+        logging.info(f"读取参考文件: {sku_reference_path}")
+        ref_df = pd.read_excel(sku_reference_path, engine='openpyxl')
+
+        # 首先从 sku_reference-2.xlsx 创建映射
+        sku_map = dict(zip(
+          ref_df['Freak SKU（請填入）'].astype(str).str.strip(),
+          ref_df['EasyStore SKU'].astype(str).str.strip()
+        ))
+
+        # 然后从 variant_df 添加映射 (如果 SKU 列同时作为 Freak SKU 和 Easy SKU)
+        # 同一个 SKU 直接映射到自己
+        if 'SKU' in variant_df:
+            for sku in variant_df['SKU'].dropna().astype(str).str.strip():
+                sku_map[sku] = sku
+
+        return {
+            'variant_df': variant_df,
+            'ref_df': ref_df,
+            'sku_map': sku_map,
+            # SKU → 變體資料的雜湊索引，只建一次，之後每次查詢都是 O(1)
+            'sku_index': cls._build_sku_index(variant_df),
+            # 反向索引：商品編號 / 商品名稱 → 已知的 SKU
+            'item_skus': cls._build_item_index(variant_df),
+            'name_skus': cls._build_name_index(variant_df, ref_df),
+        }
+
+    @staticmethod
+    def _build_sku_index(variant_df):
+        """把 variant_df 轉成 {正規化 SKU: (product_id, variant_id, price, compare_at_price)}
+
+        同一 SKU 出現多次時以第一筆為準（與原本逐列比對的結果相同）。
+        """
+        rows = len(variant_df)
+        skus = variant_df['SKU'].astype(str).str.strip()
+        # mapping 表沒有 price/compare_at_price 欄位時回傳 0
+        prices = variant_df['price'] if 'price' in variant_df else [0] * rows
+        compares = variant_df['compare_at_price'] if 'compare_at_price' in variant_df else [0] * rows
+
+        index = {}
+        for sku, pid, vid, price, compare in zip(
+            skus, variant_df['product_id'], variant_df['Variant ID'], prices, compares
+        ):
+            index.setdefault(sku, (pid, vid, price, compare))
+        return index
+
+    @staticmethod
+    def _build_item_index(variant_df):
+        """{daytona 商品編號: [SKU, ...]}，從 mapping 表的頁面URL 欄位建立"""
+        index = {}
+        if '頁面URL' not in variant_df or 'SKU' not in variant_df:
+            return index
+        rows = variant_df[variant_df['頁面URL'].notna() & variant_df['SKU'].notna()]
+        for url, sku in zip(rows['頁面URL'], rows['SKU'].astype(str).str.strip()):
+            item_id = extract_item_id(url)
+            if item_id:
+                index.setdefault(item_id, []).append(sku)
+        return index
+
+    @staticmethod
+    def _build_name_index(variant_df, ref_df):
+        """{正規化商品名稱: [SKU, ...]}，variant 表用 SKU、reference 表用 Freak SKU"""
+        index = {}
+        for df, sku_column in ((variant_df, 'SKU'), (ref_df, 'Freak SKU（請填入）')):
+            if '商品名稱' not in df or sku_column not in df:
+                continue
+            rows = df[df['商品名稱'].notna() & df[sku_column].notna()]
+            for name, sku in zip(rows['商品名稱'], rows[sku_column].astype(str).str.strip()):
+                index.setdefault(normalize_product_name(name), []).append(sku)
+        return index
+
+    def known_skus(self, skus):
+        """一次比對：回傳 skus 中存在於 SKU 映射、本地 variant 表或變體索引的集合"""
+        skus = set(skus)
+        found = skus & (self.sku_map.keys() | self.sku_index.keys())
+        if self.catalog and skus - found:
+            found |= self.catalog.known_skus(skus - found)
+        return found
+
+    def match_sku(self, url, product_info):
+        """找出商品頁對應的 Freak SKU 與 Easy SKU
+
+        1. 依建檔規則產生的候選 SKU 與已知 SKU 做一次集合交集，取優先順序最前面的
+        2. 頁面上的名稱改過導致雜湊不同時，改用商品編號 / 商品名稱反向索引找同一商品的 SKU，
+           並優先選顏色代碼與尺寸相同的
+
+        Returns:
+            (matched_sku, easy_sku, candidates)；找不到時 matched_sku 為 None
+        """
+        candidates = generate_sku_candidates(product_info)
+        hits = self.known_skus(candidates)
+        for sku in candidates:
+            if sku in hits:
+                return sku, self.sku_map.get(sku, sku), candidates
+
+        related = self.item_skus.get(extract_item_id(url)) or \
+            self.name_skus.get(normalize_product_name(product_info['product_name'])) or []
+        related_hits = self.known_skus(related)
+        related = [sku for sku in dict.fromkeys(related) if sku in related_hits]
+        if related:
+            # FS-xxxx-BLK-M → BLK-M
+            suffixes = {sku.split('-', 2)[-1] for sku in candidates}
+            related.sort(key=lambda sku: sku.split('-', 2)[-1] not in suffixes)
+            sku = related[0]
+            logging.info(f"依商品編號/名稱反向索引找到 SKU: {sku}")
+            return sku, self.sku_map.get(sku, sku), candidates
+
+        return None, None, candidates
+
+    def refresh_variant_catalog(self, on_log=print):
+        """批次同步前增量更新變體索引；失敗時沿用現有索引查詢 ID，但變體售價改由 API 即時取得"""
+        if not self.catalog or not VARIANT_CATALOG_SETTINGS.get("refresh_before_sync", True):
+            return None
+        try:
+            stats = self.catalog.sync(on_log=on_log)
+        except Exception as e:
+            self.catalog_fresh = False
+            on_log(f"⚠️ 變體索引更新失敗，沿用現有索引（變體售價改由 API 即時取得）: {e}")
+            return None
+        self.catalog_fresh = True
+        return stats
+
     def get_variant_id_by_sku(self, easy_sku):
         """
-        只從本地 variant_df 查一次，立刻回傳 PID/VID/price/compare_at_price，
-        不再做全站掃描。
+        只查本地索引，立刻回傳 PID/VID/price/compare_at_price，
+        不再做全站掃描。先查從 EasyStore 同步的變體索引，再查 xlsx。
         """
         easy_sku_str = str(easy_sku).strip()
 
-        # 1) EasyStore SKU -> 本地 variant_df
-        row = self.variant_df[
-            self.variant_df['SKU'].astype(str).str.strip() == easy_sku_str
-        ]
-        if not row.empty:
-            pid = int(row['product_id'].iat[0])
-            vid = int(row['Variant ID'].iat[0])
+        # 1) EasyStore SKU -> 變體索引（與 EasyStore 同步，不會過時）
+        if self.catalog:
+            found = self.catalog.lookup_sku(easy_sku_str)
+            if found:
+                logging.info(f"從變體索引找到: {easy_sku_str} -> PID={found['product_id']}, VID={found['variant_id']}")
+                return found
+
+        # 2) EasyStore SKU -> 本地 SKU 索引
+        entry = self.sku_index.get(easy_sku_str)
+        if entry is not None:
+            pid, vid, price, compare_at_price = entry
+            pid = int(pid)
+            vid = int(vid)
             logging.info(f"從本地 variant 表找到: {easy_sku_str} -> PID={pid}, VID={vid}")
 
             return {
                 "product_id": pid,
                 "variant_id": vid,
-                # 如果你的 mapping 表也有 price/compare_at_price 欄位，可以直接拿，
-                # 否則這裡會回傳 None
-                "price": row.get('price', [0]).iat[0] if 'price' in row else 0,
-                "compare_at_price": row.get('compare_at_price', [0]).iat[0] if 'compare_at_price' in row else 0
+                "price": price,
+                "compare_at_price": compare_at_price
             }
 
-        # 2) 本地找不到，就直接報錯
+        # 3) 本地找不到，就直接報錯
         logging.error(f"找不到對應的 Variant ID (只查本地表): {easy_sku_str}")
         raise ValueError(f"找不到對應的 Variant ID: {easy_sku_str}")
 
     def update_variant_price(self, product_id, variant_id, new_price):
         """更新EasyStore商品變體的價格"""
         try:
-            url = f"{config.BASE_API}/products/{product_id}/variants/{variant_id}.json"
-            payload = {"variant": {"price": new_price}}
-            # （也可以改用 PUT，看你庫存更新那邊用的是 PUT）
-            resp = requests.put(url, headers=config.API_HEADERS, json=payload)
-            resp.raise_for_status()
+            resp = self.easystore.update_variant_price(product_id, variant_id, new_price)
+            if self.catalog:
+                self.catalog.update_variant_price(variant_id, new_price)
             return resp.json()
             
         except Exception as e:
             logging.error(f"更新變體價格失敗: {variant_id} => {e}")
+            self._forget_if_deleted(product_id, e)
             raise
             
     def get_all_product_variants(self, product_id):
-        """獲取指定商品的所有變體"""
+        """獲取指定商品的所有變體（本次已成功更新變體索引且有資料時不呼叫 API）
+
+        索引沒有更新成功時售價可能已過時（例如在後台手動改價），改由 API 取得目前售價，
+        避免 apply_variant_prices 把實際價格不同的變體誤判為未變動。
+        """
         try:
-            url = f"{config.BASE_API}/products/{product_id}.json"
-            resp = requests.get(url, headers=config.API_HEADERS)
-            resp.raise_for_status()
-            
-            product_data = resp.json().get("product", {})
-            variants = product_data.get("variants", [])
+            variants = self.catalog.get_product_variants(product_id) if self.catalog and self.catalog_fresh else []
+            if not variants:
+                product_data = self.easystore.get_product(product_id)
+                variants = product_data.get("variants", [])
             
             
             # 确保价格字段是数值类型
@@ -213,14 +413,78 @@ class FreakDiscountSyncer:
             logging.error(f"獲取商品變體失敗: {product_id} => {e}")
             raise
 
-    def sync_discount(self, url, apply_additional_discount=False):
-        """同步單一URL的折扣到EasyStore所有變體的售價（使用建檔系統的SKU生成邏輯）"""
+    def _update_one_variant(self, product_id, plan):
+        """更新單一變體價格，失敗時記錄錯誤而不中斷其他變體"""
+        entry = dict(plan)
+        try:
+            resp = self.easystore.update_variant_price(product_id, plan["variant_id"], plan["final_price"])
+            logging.info(f"已更新變體 {plan['variant_id']} 價格: {plan['original_price']} → {plan['final_price']} (HTTP {resp.status_code})")
+            entry.update(status="updated", error=None)
+            if self.catalog:
+                self.catalog.update_variant_price(plan["variant_id"], plan["final_price"])
+        except Exception as e:
+            logging.error(f"更新變體價格失敗: {plan['variant_id']} => {e}")
+            self._forget_if_deleted(product_id, e)
+            entry.update(status="failed", error=str(e))
+        return entry
+
+    def _forget_if_deleted(self, product_id, error):
+        """寫入回應 404 時，商品已在 EasyStore 刪除，從變體索引移除，避免之後一直解析到舊的 ID"""
+        response = getattr(error, "response", None)
+        if self.catalog and response is not None and response.status_code == 404:
+            logging.warning(f"商品 {product_id} 在 EasyStore 已不存在，從變體索引移除")
+            self.catalog.forget_product(product_id)
+
+    def apply_variant_prices(self, product_id, price_plans):
+        """以有上限的執行緒池並行送出變體價格更新
+
+        目前售價已等於目標價格的變體不送出請求。速率由共用的 EasyStore 客戶端控制；
+        回傳的結果與 price_plans 順序相同，每筆帶有 status（updated / unchanged / failed）與 error。
+        """
+        changed = [plan for plan in price_plans if plan.get("current_price") != plan["final_price"]]
+        written = {}
+        if changed:
+            workers = min(len(changed), DISCOUNT_SYNC_SETTINGS.get("variant_workers", 6))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for entry in executor.map(lambda plan: self._update_one_variant(product_id, plan), changed):
+                    written[entry["variant_id"]] = entry
+
+        results = []
+        for plan in price_plans:
+            entry = written.get(plan["variant_id"])
+            if entry is None:
+                entry = dict(plan, status="unchanged", error=None)
+            results.append(entry)
+        return results
+
+    def sync_discount(self, url, apply_additional_discount=False, driver=None, credentials=None,
+                      skip_unchanged=False):
+        """同步單一URL的折扣到EasyStore所有變體的售價（使用建檔系統的SKU生成邏輯）
+
+        driver / credentials 供並行同步使用：每個工作執行緒傳入自己的瀏覽器與登入資料
+        skip_unchanged: 頁面的價格、折扣、庫存與上次成功同步時相同就不再比對 SKU 與寫入 EasyStore
+        """
         try:
             # 1. 獲取 Freak Store 商品信息
-            product_info = self.get_freak_product_info(url)
+            product_info = self.get_freak_product_info(url, driver=driver, credentials=credentials)
+
+            fingerprint = product_fingerprint(product_info, apply_additional_discount)
+            if skip_unchanged and product_info.get('product_name'):
+                previous = self.sync_state.unchanged_result(url, fingerprint)
+                if previous is not None:
+                    logging.info(f"頁面未變動，略過同步: {url}")
+                    return dict(
+                        previous,
+                        success=True,
+                        unchanged=True,
+                        url=url,
+                        updated_variants_count=0,
+                        failed_variants_count=0,
+                        skipped_variants_count=0,
+                        updated_variants=[]
+                    )
             
             # 2. 使用建檔系統的邏輯生成 SKU
-            tried_skus = set()
             matched_sku = None
             easy_sku = None
             
@@ -243,83 +507,15 @@ class FreakDiscountSyncer:
                     easy_sku = self.sku_map[freak_sku]
                     logging.info(f"從 URL 映射表找到 SKU: {freak_sku} -> {easy_sku}")
             
-            # 如果沒有映射，使用建檔系統的邏輯生成 SKU
-            if not matched_sku:
-                print("🔍 開始使用建檔系統邏輯生成 SKU...")
-                
-                # 策略 1: 對每個庫存組合使用原始日文顏色生成 SKU
-                for size, display_color, stock_status in product_info.get('stocks', []):
-                    # 獲取對應的原始日文顏色
-                    raw_color = product_info.get('raw_colors', {}).get(display_color, display_color)
-                    
-                    # 使用原始日文顏色生成 SKU（與建檔系統一致）
-                    freak_sku = generate_sku(
-                        product_info['product_name'],
-                        raw_color,  # 使用原始日文顏色
-                        size
-                    )
-                    
-                    print(f"  嘗試 SKU: {freak_sku} (商品={product_info['product_name']}, 顏色={raw_color}, 尺寸={size})")
-                    tried_skus.add(freak_sku)
-                    
-                    if freak_sku in self.sku_map:
-                        matched_sku = freak_sku
-                        easy_sku = self.sku_map[freak_sku]
-                        print(f"✅ 找到匹配的 SKU: {freak_sku} -> {easy_sku}")
-                        break
-                    else:
-                        # 也嘗試直接從 variant_df 查找
-                        variant_match = self.variant_df[self.variant_df['SKU'].astype(str).str.strip() == freak_sku.strip()]
-                        if not variant_match.empty:
-                            matched_sku = freak_sku
-                            easy_sku = freak_sku  # 使用 SKU 作为 easy_sku
-                            print(f"✅ 直接从 variant_df 找到 SKU: {freak_sku}")
-                            break
-            
-            # 如果還是找不到，嘗試其他策略
+            # 如果沒有映射，一次產生所有候選 SKU 並與已知 SKU 比對
+            tried_skus = []
             if not matched_sku:
-                print("🔍 嘗試其他策略...")
-                
-                # 策略 2: 使用主要顏色和不同尺寸的組合
-                main_color = product_info['color']
-                raw_main_color = product_info.get('raw_colors', {}).get(main_color, main_color)
-                
-                common_sizes = ["S", "M", "L", "XL", "ONE SIZE"]
-                for common_size in common_sizes:
-                    size_sku = generate_sku(
-                        product_info['product_name'],
-                        raw_main_color,
-                        common_size
-                    )
-                    
-                    if size_sku not in tried_skus:
-                        tried_skus.add(size_sku)
-                        print(f"  嘗試常用尺寸 SKU: {size_sku}")
-                        
-                        if size_sku in self.sku_map:
-                            matched_sku = size_sku
-                            easy_sku = self.sku_map[size_sku]
-                            print(f"✅ 從常用尺寸找到 SKU: {size_sku} -> {easy_sku}")
-                            break
-                        else:
-                            # 也嘗試直接從 variant_df 查找
-                            variant_match = self.variant_df[self.variant_df['SKU'].astype(str).str.strip() == size_sku.strip()]
-                            if not variant_match.empty:
-                                matched_sku = size_sku
-                                easy_sku = size_sku
-                                print(f"✅ 直接从 variant_df 找到常用尺寸 SKU: {size_sku}")
-                                break
+                matched_sku, easy_sku, tried_skus = self.match_sku(url, product_info)
+                if matched_sku:
+                    print(f"✅ 找到匹配的 SKU: {matched_sku} -> {easy_sku}")
             
             if not matched_sku:
-                logging.error(f"嘗試了 {len(tried_skus)} 種 SKU 組合，仍找不到匹配:")
-                for i, sku in enumerate(tried_skus):
-                    logging.error(f"  {i+1}. {sku}")
-                    
-                # 列出前幾個現有的 SKU 作為參考
-                logging.error("參考現有 SKU:")
-                for i, sku in enumerate(list(self.sku_map.keys())[:5]):
-                    logging.error(f"  {i+1}. {sku}")
-                
+                logging.error(f"嘗試了 {len(tried_skus)} 種 SKU 組合，仍找不到匹配: {', '.join(tried_skus)}")
                 raise ValueError(f"找不到對應的 Easy Store SKU")
             
             # 3. 計算 Easy Store 折扣
@@ -336,15 +532,11 @@ class FreakDiscountSyncer:
             # 5. 獲取此商品的所有變體
             all_variants = self.get_all_product_variants(product_id)
             
-            # 記錄更新結果
-            updated_variants = []
             need_additional_discount = False
-            final_price = 0
             
-            # 6. 對所有變體應用相同折扣
+            # 6. 對所有變體應用相同折扣：先算出每個變體的目標價格
+            price_plans = []
             for variant in all_variants:
-                variant_id = variant["id"]
-
                 # —— 1) 先把 price / compare_at_price 轉成整數 ——
                 try:
                     price = int(float(variant.get("price", 0)))
@@ -362,24 +554,28 @@ class FreakDiscountSyncer:
                 else:
                     final_price = discounted_price
 
-                # —— 3) 用 PUT 更新價格，並確保 URL 帶 .json ——
-                url = f"{config.BASE_API}/products/{product_id}/variants/{variant_id}.json"
-                resp = requests.put(url, headers=config.API_HEADERS, json={"variant": {"price": final_price}})
-                resp.raise_for_status()
-                logging.info(f"已更新變體 {variant_id} 價格: {compare} → {final_price} (HTTP {resp.status_code})")
-
-                # 記錄結果
-                updated_variants.append({
-                    "variant_id": variant_id,
+                price_plans.append({
+                    "variant_id": variant["id"],
                     "sku": variant.get("sku", ""),
+                    "current_price": price,
                     "original_price": compare,
                     "discounted_price": discounted_price,
                     "final_price": final_price
                 })
 
+            # —— 3) 只更新價格有變動的變體（並行），結果依變體順序排列 ——
+            updated_variants = self.apply_variant_prices(product_id, price_plans)
+            failed_variants = [v for v in updated_variants if v["status"] == "failed"]
+            succeeded_count = sum(1 for v in updated_variants if v["status"] == "updated")
+            skipped_count = sum(1 for v in updated_variants if v["status"] == "unchanged")
+            if failed_variants and succeeded_count == 0:
+                raise RuntimeError(f"所有變體價格更新失敗（{len(failed_variants)} 個）: {failed_variants[0]['error']}")
+            if skipped_count:
+                logging.info(f"商品 {product_id}: {skipped_count} 個變體價格未變動，略過更新")
+            final_price = price_plans[-1]["final_price"] if price_plans else 0
             
             # 7. 返回結果
-            return {
+            result = {
                 'success': True,
                 'sku': matched_sku,
                 'easy_sku': easy_sku,
@@ -393,9 +589,16 @@ class FreakDiscountSyncer:
                 'additional_discount_applied': need_additional_discount and apply_additional_discount,
                 'product_id': product_id,
                 'variant_id': reference_variant_id,
-                'updated_variants_count': len(updated_variants),
+                'updated_variants_count': succeeded_count,
+                'failed_variants_count': len(failed_variants),
+                'skipped_variants_count': skipped_count,
                 'updated_variants': updated_variants
             }
+
+            # 全部變體都成功才記錄指紋，有失敗的下次會重新處理
+            if not failed_variants:
+                self.sync_state.record(url, fingerprint, result)
+            return result
         except Exception as e:
             logging.error(f"同步折扣失敗: {url} => {e}")
             return {
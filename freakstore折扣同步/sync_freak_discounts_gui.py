@@ -9,6 +9,7 @@ import sys
 import json
 import base64
 from sync_freak_discounts import FreakDiscountSyncer
+from parallel_sync import ParallelDiscountSync
 # 引入 Firefox 瀏覽器模組
 # 正確的導入
 from firefox_session import setup_firefox_session, cleanup_firefox_session
@@ -70,7 +71,9 @@ class DiscountSyncApp:
                     'password': '',
                     'remember_credentials': False,
                     'auto_login': False,
-                    'high_price_discount': False
+                    'high_price_discount': False,
+                    'parallel_workers': 1,
+                    'skip_unchanged': True
                 }
         except Exception as e:
             print(f"載入設定檔失敗: {e}")
@@ -79,7 +82,9 @@ class DiscountSyncApp:
                 'password': '',
                 'remember_credentials': False,
                 'auto_login': False,
-                'high_price_discount': False
+                'high_price_discount': False,
+                'parallel_workers': 1,
+                'skip_unchanged': True
             }
 
     def save_config(self):
@@ -164,6 +169,15 @@ class DiscountSyncApp:
             variable=self.high_price_var
         ).pack(anchor='w', padx=10, pady=5)
         
+        # 頁面價格、折扣、庫存與上次成功同步時相同的 URL 不再寫入 EasyStore
+        self.skip_unchanged_var = tk.BooleanVar(value=self.config.get('skip_unchanged', True))
+        ttk.Checkbutton(
+            discount_frame,
+            text="略過頁面未變動的商品（只同步有變動的 URL）",
+            variable=self.skip_unchanged_var,
+            command=self.save_skip_unchanged_setting
+        ).pack(anchor='w', padx=10, pady=5)
+        
         # 新增登入區域
         login_frame = ttk.Frame(discount_frame)  # 這裡定義了login_frame
         login_frame.pack(fill='x', padx=10, pady=5)
@@ -216,6 +230,20 @@ class DiscountSyncApp:
         )
         self.login_status_label.pack(pady=2)
         
+        # 並行瀏覽器數量（大於 1 時每個瀏覽器各自登入，同時處理不同 URL）
+        workers_frame = ttk.Frame(discount_frame)
+        workers_frame.pack(fill='x', padx=10, pady=2)
+        ttk.Label(workers_frame, text="並行瀏覽器數:").pack(side='left', padx=5)
+        self.workers_var = tk.IntVar(value=self.config.get('parallel_workers', 1))
+        ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=8,
+            width=5,
+            textvariable=self.workers_var,
+            command=self.save_parallel_setting
+        ).pack(side='left', padx=5)
+        
         # 同步按鈕
         ttk.Button(
             discount_frame,
@@ -313,6 +341,9 @@ class DiscountSyncApp:
                     # 更新價格為原價
                     update_result = self.syncer.update_variant_price(product_id, variant_id, original_price)
                     
+                    # 價格已被改回原價，下次同步折扣不能因頁面未變動而略過
+                    self.syncer.sync_state.forget(url)
+                    
                     # 儲存結果
                     result = {
                         'success': True,
@@ -354,6 +385,22 @@ class DiscountSyncApp:
         self.config['high_price_discount'] = self.high_price_var.get()
         self.save_config()
 
+    def save_skip_unchanged_setting(self):
+        """儲存略過未變動商品設定"""
+        self.config['skip_unchanged'] = self.skip_unchanged_var.get()
+        self.save_config()
+
+    def save_parallel_setting(self):
+        """儲存並行瀏覽器數量設定"""
+        self.config['parallel_workers'] = self.get_parallel_workers()
+        self.save_config()
+
+    def get_parallel_workers(self):
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+
     def update_credentials_settings(self):
         """更新帳號密碼相關設定"""
         # 更新配置
@@ -628,6 +675,7 @@ class DiscountSyncApp:
         
         # 詢問是否對高價商品額外折扣
         apply_additional_discount = self.high_price_var.get()
+        skip_unchanged = self.skip_unchanged_var.get()
         
         # 禁用按鈕，防止重複點擊
         self.disable_buttons()
@@ -635,12 +683,21 @@ class DiscountSyncApp:
         # 啟動同步線程
         threading.Thread(
             target=self.sync_worker,
-            args=(urls, apply_additional_discount),
+            args=(urls, apply_additional_discount, skip_unchanged),
             daemon=True
         ).start()
 
-    def sync_worker(self, urls, apply_additional_discount):
+    def sync_worker(self, urls, apply_additional_discount, skip_unchanged=False):
         """同步處理線程"""
+        # 先把 EasyStore 上有更新的商品同步進變體索引
+        self.syncer.refresh_variant_catalog(on_log=self.log)
+        
+        workers = min(self.get_parallel_workers(), len(urls))
+        if workers > 1:
+            if self.email_var.get() and self.password_var.get():
+                return self.parallel_sync_worker(urls, apply_additional_discount, workers, skip_unchanged)
+            self.log("⚠️ 並行同步需要會員帳號密碼讓每個瀏覽器各自登入，改用單一瀏覽器依序同步")
+        
         total = len(urls)
         completed = 0
         success_count = 0
@@ -657,29 +714,16 @@ class DiscountSyncApp:
                     
                     # 同步折扣
                     self.log(f"處理 [{completed}/{total}] {url}")
-                    result = self.syncer.sync_discount(url, apply_additional_discount)
+                    result = self.syncer.sync_discount(url, apply_additional_discount, skip_unchanged=skip_unchanged)
                     
                     # 儲存結果
                     self.sync_results.append(result)
                     
                     # 更新日誌
-                    if result['success']:
+                    if self.log_sync_result(result):
                         success_count += 1
-                        freak_discount = result['freak_discount']
-                        easy_discount = result['easy_discount']
-                        original_price = result.get('original_price', 0)
-                        final_price = result.get('final_price', 0)
-                        updated_variants_count = result.get('updated_variants_count', 1)
-                        
-                        additional_info = ""
-                        if result.get('additional_discount_applied'):
-                            additional_info = f" + 高價商品額外15%折扣，最終價格: {final_price}"
-                            
-                        self.log(f"[成功] {result['sku']} → {result['easy_sku']} - Freak折扣: {freak_discount}% → Easy折扣: {easy_discount}%，原價: {original_price} → 新價格: {final_price}{additional_info}")
-                        self.log(f"   -- 已更新該商品的 {updated_variants_count} 個變體")
                     else:
                         fail_count += 1
-                        self.log(f"[失敗] {url} - {result.get('error', '未知錯誤')}")
                         
                     # 更新進度條
                     self.progress_var.set(completed)
@@ -698,6 +742,7 @@ class DiscountSyncApp:
         except Exception as e:
             self.log(f"[嚴重錯誤] 同步過程中斷: {e}")
         finally:
+            self.syncer.sync_state.flush()
             # 完成處理
             self.log(f"同步完成! 共處理 {total} 個URL")
             
@@ -707,6 +752,75 @@ class DiscountSyncApp:
             # 恢復按鈕
             self.root.after(0, self.enable_buttons)
 
+    def log_sync_result(self, result):
+        """記錄單一 URL 的同步結果，回傳是否成功"""
+        if result['success'] and result.get('unchanged'):
+            self.log(f"[未變動] {result.get('sku') or result.get('url', '')} - 頁面價格與庫存和上次同步相同，已略過")
+            return True
+        if result['success']:
+            freak_discount = result['freak_discount']
+            easy_discount = result['easy_discount']
+            original_price = result.get('original_price', 0)
+            final_price = result.get('final_price', 0)
+            updated_variants_count = result.get('updated_variants_count', 1)
+            
+            additional_info = ""
+            if result.get('additional_discount_applied'):
+                additional_info = f" + 高價商品額外15%折扣，最終價格: {final_price}"
+                
+            self.log(f"[成功] {result['sku']} → {result['easy_sku']} - Freak折扣: {freak_discount}% → Easy折扣: {easy_discount}%，原價: {original_price} → 新價格: {final_price}{additional_info}")
+            self.log(f"   -- 已更新該商品的 {updated_variants_count} 個變體")
+            skipped_variants_count = result.get('skipped_variants_count', 0)
+            if skipped_variants_count:
+                self.log(f"   -- {skipped_variants_count} 個變體價格未變動，已略過")
+            failed_variants_count = result.get('failed_variants_count', 0)
+            if failed_variants_count:
+                self.log(f"   -- ⚠️ {failed_variants_count} 個變體更新失敗:")
+                for variant in result.get('updated_variants', []):
+                    if variant.get('status') == 'failed':
+                        self.log(f"      {variant['sku'] or variant['variant_id']}: {variant['error']}")
+            return True
+        else:
+            self.log(f"[失敗] {result.get('url', '')} - {result.get('error', '未知錯誤')}")
+            return False
+
+    def parallel_sync_worker(self, urls, apply_additional_discount, workers, skip_unchanged=False):
+        """並行同步：多個已登入的瀏覽器同時處理 URL 佇列"""
+        total = len(urls)
+        completed = [0]
+        self.log(f"啟動並行同步：{workers} 個瀏覽器，共 {total} 個URL")
+        
+        def on_result(index, result):
+            # 在主線程更新日誌與進度條
+            def update():
+                completed[0] += 1
+                self.log(f"完成 [{completed[0]}/{total}] {result.get('url', urls[index])}")
+                self.log_sync_result(result)
+                self.progress_var.set(completed[0])
+            self.root.after(0, update)
+        
+        def on_log(msg):
+            self.root.after(0, lambda: self.log(msg))
+        
+        success_count = fail_count = 0
+        try:
+            runner = ParallelDiscountSync(
+                self.syncer, workers,
+                self.email_var.get(), self.password_var.get(),
+                on_result=on_result, on_log=on_log
+            )
+            results = runner.run(urls, apply_additional_discount, skip_unchanged)
+            self.sync_results = results
+            success_count = sum(1 for r in results if r.get('success'))
+            fail_count = total - success_count
+        except Exception as e:
+            on_log(f"[嚴重錯誤] 並行同步過程中斷: {e}")
+        finally:
+            self.syncer.sync_state.flush()
+            self.root.after(0, lambda: self.log(f"同步完成! 共處理 {total} 個URL"))
+            self.root.after(0, lambda: messagebox.showinfo("完成", f"所有商品折扣同步已結束！\n成功: {success_count}\n失敗: {fail_count}"))
+            self.root.after(0, self.enable_buttons)
+
     def disable_buttons(self):
         """禁用按鈕"""
         for widget in self.root.winfo_children():
@@ -747,7 +861,7 @@ class DiscountSyncApp:
                 for r in self.sync_results:
                     if r.get('success', False):
                         export_data.append({
-                            '同步狀態': '成功',
+                            '同步狀態': '未變動' if r.get('unchanged') else '成功',
                             'Freak SKU': r.get('sku', ''),
                             'Easy SKU': r.get('easy_sku', ''),
                             'URL': r.get('url', ''),
@@ -758,6 +872,9 @@ class DiscountSyncApp:
                             '是否高價商品': '是' if r.get('high_price', False) else '否',
                             '是否套用額外折扣': '是' if r.get('additional_discount_applied', False) else '否',
                             '最終價格': r.get('final_price', ''),
+                            '更新變體數': r.get('updated_variants_count', ''),
+                            '失敗變體數': r.get('failed_variants_count', 0),
+                            '略過變體數（價格未變動）': r.get('skipped_variants_count', 0),
                             'Product ID': r.get('product_id', ''),
                             'Variant ID': r.get('variant_id', '')
                         })
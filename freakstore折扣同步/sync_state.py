@@ -0,0 +1,119 @@
+# sync_state.py - 記錄每個 URL 上次同步時的頁面指紋，頁面沒變動就不必再寫入 EasyStore
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from config import SYNC_STATE_SETTINGS
+except ImportError:
+    SYNC_STATE_SETTINGS = {}
+
+# 同步結果中要保留下來、略過時沿用的欄位
+SUMMARY_FIELDS = (
+    'sku', 'easy_sku', 'freak_discount', 'easy_discount', 'original_price', 'discounted_price',
+    'final_price', 'high_price', 'additional_discount_applied', 'product_id', 'variant_id',
+)
+
+
+def _json_default(value):
+    # pandas / numpy 的數值型別
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def product_fingerprint(product_info, apply_additional_discount=False):
+    """商品頁上影響售價的資料（價格、折扣、庫存）的雜湊"""
+    payload = {
+        'product_name': product_info.get('product_name', ''),
+        'original_price': product_info.get('original_price', 0),
+        'current_price': product_info.get('current_price', 0),
+        'discount_pct': product_info.get('discount_pct', 0),
+        'stocks': sorted(list(map(str, stock)) for stock in product_info.get('stocks', [])),
+        'apply_additional_discount': bool(apply_additional_discount),
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class SyncStateStore:
+    """每個 URL 的同步狀態（JSON 檔）
+
+    只有同步成功才記錄指紋，失敗的 URL 下次一定會重新處理。
+    超過 max_age_hours 沒有實際寫入過的 URL 也會重新處理，避免 EasyStore 端被手動改價後一直沒修正。
+    record() 只更新記憶體，每隔 flush_seconds 秒寫一次檔，批次結束時呼叫 flush() 寫入剩下的紀錄；
+    中途當掉最多只會讓最後幾個 URL 下次再同步一次。
+    """
+
+    def __init__(self, path=None, max_age_hours=None, flush_seconds=None):
+        self.path = path or SYNC_STATE_SETTINGS.get("path", "sync_state.json")
+        max_age_hours = SYNC_STATE_SETTINGS.get("max_age_hours", 168) if max_age_hours is None else max_age_hours
+        self.max_age = max_age_hours * 3600
+        self.flush_seconds = SYNC_STATE_SETTINGS.get("flush_seconds", 30) if flush_seconds is None else flush_seconds
+        self._lock = threading.Lock()
+        self._states = self._load()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        """寫入狀態檔（寫入失敗不影響同步，只是下次可能重新同步這些 URL）"""
+        self._saved_at = time.monotonic()
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._states, f, ensure_ascii=False, indent=1, default=_json_default)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            # 保留 _dirty，下次 record / flush 時再試
+            print(f"⚠️ 無法寫入同步狀態檔: {e}")
+            return
+        self._dirty = False
+
+    def unchanged_result(self, url, fingerprint):
+        """頁面指紋與上次成功同步時相同時，回傳上次的結果摘要；否則回傳 None"""
+        with self._lock:
+            state = self._states.get(url)
+        if not state or state.get('fingerprint') != fingerprint:
+            return None
+        if self.max_age and time.time() - state.get('synced_at', 0) > self.max_age:
+            return None
+        return dict(state.get('summary', {}))
+
+    def record(self, url, fingerprint, result):
+        """記錄同步成功的 URL"""
+        with self._lock:
+            self._states[url] = {
+                'fingerprint': fingerprint,
+                'synced_at': time.time(),
+                'summary': {key: result.get(key) for key in SUMMARY_FIELDS},
+            }
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.flush_seconds:
+                self._save()
+
+    def flush(self):
+        """把尚未寫入的紀錄寫到檔案（批次結束時呼叫）"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def forget(self, url):
+        with self._lock:
+            if self._states.pop(url, None) is not None:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._states = {}
+            self._save()
@@ -0,0 +1,281 @@
+# variant_catalog.py - EasyStore 商品變體的本地索引（SQLite），取代手動維護的 sku_variant_mapping.xlsx
+#
+# 命令列用法：
+#   python variant_catalog.py          # 增量同步（只抓上次同步後有更新的商品）
+#   python variant_catalog.py --full   # 完整重建
+
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from easystore_client import get_easystore_client
+
+try:
+    from config import VARIANT_CATALOG_SETTINGS
+except ImportError:
+    VARIANT_CATALOG_SETTINGS = {}
+
+
+def _to_number(value):
+    """API 的價格可能是字串或空值"""
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class VariantCatalog:
+    """EasyStore 變體索引
+
+    - 以多個執行緒分頁抓取 products API（實際速率由 EasyStoreClient 的令牌桶控制）
+    - 記錄最新的 updated_at，之後只抓有更新的商品
+    - 提供 SKU → 商品/變體/價格 查詢，以及單一商品的所有變體
+    """
+
+    def __init__(self, db_path=None, client=None):
+        self.db_path = db_path or VARIANT_CATALOG_SETTINGS.get("db_path", "variant_catalog.db")
+        self.client = client or get_easystore_client()
+
+        folder = os.path.dirname(self.db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS variants (
+                variant_id INTEGER PRIMARY KEY,
+                product_id INTEGER NOT NULL,
+                sku TEXT,
+                price REAL,
+                compare_at_price REAL,
+                product_updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_variants_sku ON variants(sku);
+            CREATE INDEX IF NOT EXISTS idx_variants_product ON variants(product_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self._db.commit()
+
+    # ---------- 查詢 ----------
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM variants").fetchone()[0]
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def lookup_sku(self, sku):
+        """依 SKU 查詢變體，找不到時回傳 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT product_id, variant_id, price, compare_at_price FROM variants WHERE sku = ? LIMIT 1",
+                (str(sku).strip(),)
+            ).fetchone()
+        if row is None:
+            return None
+        product_id, variant_id, price, compare_at_price = row
+        return {
+            "product_id": product_id,
+            "variant_id": variant_id,
+            "price": price,
+            "compare_at_price": compare_at_price
+        }
+
+    def known_skus(self, skus):
+        """回傳 skus 中存在於索引的集合（一次查詢）"""
+        skus = [str(sku).strip() for sku in skus]
+        if not skus:
+            return set()
+        placeholders = ",".join("?" * len(skus))
+        with self._lock:
+            rows = self._db.execute(f"SELECT DISTINCT sku FROM variants WHERE sku IN ({placeholders})", skus).fetchall()
+        return {row[0] for row in rows}
+
+    def get_product_variants(self, product_id):
+        """取得商品的所有變體（格式與 API 的 variants 相同的欄位子集）"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT variant_id, sku, price, compare_at_price FROM variants WHERE product_id = ? ORDER BY variant_id",
+                (int(product_id),)
+            ).fetchall()
+        return [
+            {"id": variant_id, "sku": sku or "", "price": price, "compare_at_price": compare_at_price}
+            for variant_id, sku, price, compare_at_price in rows
+        ]
+
+    def update_variant_price(self, variant_id, price):
+        """價格寫入 EasyStore 成功後同步更新本地索引"""
+        with self._lock:
+            self._db.execute("UPDATE variants SET price = ? WHERE variant_id = ?", (price, int(variant_id)))
+            self._db.commit()
+
+    def forget_product(self, product_id):
+        """EasyStore 回應 404（商品或變體已刪除）時移除該商品，下次改查 API 或 xlsx"""
+        with self._lock:
+            self._db.execute("DELETE FROM variants WHERE product_id = ?", (int(product_id),))
+            self._db.commit()
+
+    # ---------- 同步 ----------
+
+    def _fetch_page(self, page, page_size, updated_since):
+        params = {"page": page, "limit": page_size}
+        if updated_since:
+            params["updated_at_min"] = updated_since
+        response = self.client.get("products.json", params=params, description=f"讀取商品列表第 {page} 頁")
+        response.raise_for_status()
+        return response.json()
+
+    def _store_products(self, products):
+        """寫入一頁商品：先刪除該商品舊的變體，避免已刪除的變體殘留"""
+        rows = []
+        for product in products:
+            for variant in product.get("variants") or []:
+                rows.append((
+                    int(variant["id"]),
+                    int(product["id"]),
+                    str(variant.get("sku") or "").strip(),
+                    _to_number(variant.get("price")),
+                    _to_number(variant.get("compare_at_price")),
+                    product.get("updated_at"),
+                ))
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM variants WHERE product_id = ?",
+                [(int(p["id"]),) for p in products]
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO variants (variant_id, product_id, sku, price, compare_at_price, product_updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+        return len(rows)
+
+    def sync(self, full=False, workers=None, page_size=None, on_log=print):
+        """從 EasyStore 同步變體索引
+
+        Args:
+            full: True 時重抓全部商品並移除已不存在的商品；否則只抓 updated_at 之後有更新的商品。
+                  增量同步無法得知已刪除的商品，因此距上次完整同步超過 full_sync_days 時自動改為完整同步
+
+        Returns:
+            dict: {'products', 'variants', 'pages', 'seconds', 'full'}
+        """
+        workers = workers or VARIANT_CATALOG_SETTINGS.get("workers", 4)
+        page_size = page_size or VARIANT_CATALOG_SETTINGS.get("page_size", 50)
+        if not full:
+            full_sync_days = VARIANT_CATALOG_SETTINGS.get("full_sync_days", 7)
+            last_full = self.get_meta("last_full_sync_at")
+            if full_sync_days and (last_full is None or time.time() - float(last_full) > full_sync_days * 86400):
+                full = True
+        updated_since = None if full else self.get_meta("last_updated_at")
+        full = full or updated_since is None
+        started = time.time()
+
+        seen_products = set()
+        stats = {'products': 0, 'variants': 0, 'pages': 0}
+        latest = [updated_since]
+
+        def handle(data):
+            products = data.get("products") or []
+            stats['pages'] += 1
+            stats['products'] += len(products)
+            stats['variants'] += self._store_products(products)
+            for product in products:
+                seen_products.add(int(product["id"]))
+                updated_at = product.get("updated_at")
+                if updated_at and (latest[0] is None or updated_at > latest[0]):
+                    latest[0] = updated_at
+            return len(products)
+
+        first = self._fetch_page(1, page_size, updated_since)
+        first_count = handle(first)
+
+        page_count = first.get("page_count")
+        if page_count is None and first.get("total_count") is not None:
+            page_count = math.ceil(int(first["total_count"]) / page_size)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if page_count is not None:
+                # 已知總頁數：其餘頁面一次並行抓取
+                for data in executor.map(lambda p: self._fetch_page(p, page_size, updated_since),
+                                         range(2, int(page_count) + 1)):
+                    handle(data)
+            elif first_count >= page_size:
+                # 不知道總頁數：每次並行抓 workers 頁，直到出現不滿一頁的結果
+                next_page = 2
+                while True:
+                    pages = range(next_page, next_page + workers)
+                    counts = [handle(data) for data in executor.map(
+                        lambda p: self._fetch_page(p, page_size, updated_since), pages
+                    )]
+                    next_page += workers
+                    if min(counts) < page_size:
+                        break
+
+        with self._lock:
+            if full and seen_products:
+                # 完整同步時移除 EasyStore 上已不存在的商品
+                placeholders = ",".join("?" * len(seen_products))
+                self._db.execute(
+                    f"DELETE FROM variants WHERE product_id NOT IN ({placeholders})", tuple(seen_products)
+                )
+            if latest[0]:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_updated_at', ?)", (latest[0],))
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_synced_at', ?)", (str(time.time()),))
+            if full:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_full_sync_at', ?)", (str(started),))
+            self._db.commit()
+
+        stats['seconds'] = round(time.time() - started, 1)
+        stats['full'] = full
+        on_log(f"📚 變體索引{'完整' if full else '增量'}同步完成：{stats['products']} 個商品、"
+               f"{stats['variants']} 個變體（{stats['pages']} 頁，{stats['seconds']} 秒），索引共 {self.count()} 個變體")
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_shared_catalog = None
+_shared_catalog_lock = threading.Lock()
+
+
+def get_variant_catalog():
+    """取得全域共用的變體索引，設定停用時回傳 None"""
+    global _shared_catalog
+    if not VARIANT_CATALOG_SETTINGS.get("enabled", True):
+        return None
+    with _shared_catalog_lock:
+        if _shared_catalog is None:
+            _shared_catalog = VariantCatalog()
+        return _shared_catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步 EasyStore 變體索引")
+    parser.add_argument("--full", action="store_true", help="重抓全部商品（預設只抓有更新的商品）")
+    parser.add_argument("--workers", type=int, default=None, help="同時抓取的頁數")
+    args = parser.parse_args()
+
+    catalog = VariantCatalog()
+    catalog.sync(full=args.full, workers=args.workers)
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()